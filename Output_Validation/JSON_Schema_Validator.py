@@ -4,6 +4,7 @@ from typing import Dict, Any, List, Optional
 from datetime import date
 from pydantic import BaseModel, Field, ValidationError
 from typing_extensions import Literal # Used for enums and constants
+from fast_validator import invoice_errors, validate_batch
 
 # --- 1. Pydantic Models for Golden Invoice JSON v0.1 ---
 # (Models remain the same, providing the validation contract)
@@ -129,12 +130,16 @@ class GoldenInvoice(BaseModel):
 
 # --- 2. Pydantic-based Validation Function ---
 
-def validate_invoice(json_data: Dict[str, Any]) -> Dict[str, Any]:
+def validate_invoice(json_data: Dict[str, Any], fast: bool = False) -> Dict[str, Any]:
     """
     Validates a dictionary against the GoldenInvoice Pydantic model.
 
     Args:
         json_data: The invoice data (as a Python dictionary) to validate.
+        fast: Check the dict in place against the precompiled JSON schema
+            instead of building the Pydantic model tree. It accepts the same
+            input as the model, but nothing is coerced, so 'validated_data'
+            is the input dict itself.
 
     Returns:
         A dictionary containing the validation status and any errors found,
@@ -146,6 +151,16 @@ def validate_invoice(json_data: Dict[str, Any]) -> Dict[str, Any]:
         "message": "Validation SUCCESSFUL"
     }
 
+    if fast:
+        errors = invoice_errors(json_data)
+        if errors:
+            results["is_valid"] = False
+            results["message"] = f"Validation FAILED: Found {len(errors)} error(s)."
+            results["errors"] = errors
+        else:
+            results["validated_data"] = json_data
+        return results
+
     try:
         # Attempt to parse and validate the data. 
         validated_invoice = GoldenInvoice.model_validate(json_data)
@@ -162,6 +177,16 @@ def validate_invoice(json_data: Dict[str, Any]) -> Dict[str, Any]:
 
     return results
 
+def validate_invoices(invoices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validates a batch of invoice dicts on the fast path in one call.
+
+    Returns:
+        One {index, invoice_id, errors} entry per invoice that failed;
+        an empty list means the whole batch is valid.
+    """
+    return validate_batch(invoices)
+
 # --- 3. Interactive Console Runner ---
 
 if __name__ == '__main__':
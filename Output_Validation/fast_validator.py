@@ -0,0 +1,188 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# --- Precompiled JSON Schema validator for Golden Invoice dicts ---
+# Compiles the subset of JSON Schema used by schema/golden-invoice-0-1.schema.json
+# (type, enum, const, minLength/maxLength, pattern, minimum/maximum, properties,
+# required, additionalProperties, items) into nested closures once, then checks
+# extractor output in place: no model tree is built and nothing is re-dumped.
+# It accepts what the GoldenInvoice model in JSON_Schema_Validator accepts in
+# Pydantic's lax mode: numbers may arrive as numeric strings (or bools), a property
+# with a schema default is not required, and an optional property without one
+# (Optional[...] = None on the model) may be null.
+
+DEFAULT_SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema" / "golden-invoice-0-1.schema.json"
+
+
+
+def _as_number(value):
+    """ value as Pydantic's lax float would read it, or None when it is no number. """
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, (str, bytes)):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+_TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: _as_number(v) is not None,
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "null": lambda v: v is None,
+}
+
+Check = Callable[[Any, tuple, List[Dict[str, Any]]], None]
+
+
+def _error(errors, loc, error_type, msg, value):
+    errors.append({"type": error_type, "loc": loc, "msg": msg, "input": value})
+
+
+def compile_schema(schema: Dict[str, Any]) -> Check:
+    """
+    Compile a JSON Schema node into check(value, loc, errors), which appends
+    pydantic-style error dicts ({type, loc, msg, input}) for every violation.
+    """
+    checks: List[Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        type_names = (types,) if isinstance(types, str) else tuple(types)
+        type_checks = tuple(_TYPE_CHECKS[name] for name in type_names)
+        expected = " or ".join(type_names)
+
+        def check_type(value, loc, errors):
+            for type_check in type_checks:
+                if type_check(value):
+                    return True
+            _error(errors, loc, "type_error", f"Input should be {expected}", value)
+            return False
+    else:
+        check_type = None
+
+    if "const" in schema:
+        const = schema["const"]
+
+        def check_const(value, loc, errors):
+            if value != const:
+                _error(errors, loc, "literal_error", f"Input should be {const!r}", value)
+        checks.append(check_const)
+
+    if "enum" in schema:
+        allowed = tuple(schema["enum"])
+
+        def check_enum(value, loc, errors):
+            if value not in allowed:
+                _error(errors, loc, "literal_error", f"Input should be one of {list(allowed)}", value)
+        checks.append(check_enum)
+
+    min_length = schema.get("minLength")
+    max_length = schema.get("maxLength")
+    pattern = re.compile(schema["pattern"]) if "pattern" in schema else None
+    if min_length is not None or max_length is not None or pattern is not None:
+        def check_string(value, loc, errors):
+            if not isinstance(value, str):
+                return
+            if min_length is not None and len(value) < min_length:
+                _error(errors, loc, "string_too_short", f"String should have at least {min_length} characters", value)
+            if max_length is not None and len(value) > max_length:
+                _error(errors, loc, "string_too_long", f"String should have at most {max_length} characters", value)
+            if pattern is not None and not pattern.search(value):
+                _error(errors, loc, "string_pattern_mismatch", f"String should match pattern '{pattern.pattern}'", value)
+        checks.append(check_string)
+
+    minimum = schema.get("minimum")
+    maximum = schema.get("maximum")
+    if minimum is not None or maximum is not None:
+        def check_range(value, loc, errors):
+            value = _as_number(value)
+            if value is None:
+                return
+            if minimum is not None and value < minimum:
+                _error(errors, loc, "greater_than_equal", f"Input should be greater than or equal to {minimum}", value)
+            if maximum is not None and value > maximum:
+                _error(errors, loc, "less_than_equal", f"Input should be less than or equal to {maximum}", value)
+        checks.append(check_range)
+
+    properties = schema.get("properties")
+    if properties is not None or "required" in schema:
+        properties = properties or {}
+        property_checks = {name: compile_schema(sub) for name, sub in properties.items()}
+        required = tuple(name for name in schema.get("required", ()) if "default" not in properties.get(name, {}))
+        nullable = frozenset(name for name, sub in properties.items() if name not in required and "default" not in sub)
+        closed = schema.get("additionalProperties", True) is False
+
+        def check_object(value, loc, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    _error(errors, loc + (name,), "missing", "Field required", value)
+            for name, item in value.items():
+                property_check = property_checks.get(name)
+                if item is None and name in nullable:
+                    continue
+                if property_check is not None:
+                    property_check(item, loc + (name,), errors)
+                elif closed:
+                    _error(errors, loc + (name,), "extra_forbidden", "Extra inputs are not permitted", item)
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_check = compile_schema(schema["items"])
+
+        def check_items(value, loc, errors):
+            if not isinstance(value, list):
+                return
+            for i, item in enumerate(value):
+                item_check(item, loc + (i,), errors)
+        checks.append(check_items)
+
+    checks = tuple(checks)
+
+    def check(value, loc, errors):
+        if check_type is not None and not check_type(value, loc, errors):
+            return
+        for sub_check in checks:
+            sub_check(value, loc, errors)
+
+    return check
+
+
+@lru_cache(maxsize=None)
+def load_fast_validator(schema_path: str = None) -> Check:
+    """ Compile (once per path) the validator for the Golden Invoice schema. """
+    path = Path(schema_path) if schema_path else DEFAULT_SCHEMA_PATH
+    return compile_schema(json.loads(path.read_text()))
+
+
+def invoice_errors(json_data: Any, schema_path: str = None) -> List[Dict[str, Any]]:
+    """ All schema violations for one invoice dict; empty when it is valid. """
+    errors: List[Dict[str, Any]] = []
+    load_fast_validator(schema_path)(json_data, (), errors)
+    return errors
+
+
+def validate_batch(invoices: List[Any], schema_path: str = None) -> List[Dict[str, Any]]:
+    """
+    Validate a list of invoice dicts in one call.
+    Returns an entry {index, invoice_id, errors} only for invoices that failed.
+    """
+    check = load_fast_validator(schema_path)
+    failures = []
+    for index, invoice in enumerate(invoices):
+        errors: List[Dict[str, Any]] = []
+        check(invoice, (), errors)
+        if errors:
+            invoice_id = invoice.get("invoice_id") if isinstance(invoice, dict) else None
+            failures.append({"index": index, "invoice_id": invoice_id, "errors": errors})
+    return failures
@@ -0,0 +1,75 @@
+"""
+Ingestion cost: decoding the upload to str first vs tokenizing the raw bytes.
+
+    python benchmarks/bench_bytes.py [--mb 10] [--charges 10]
+
+The str path is what /parse did before: body.decode('utf-8') and then parse.
+The bytes path hands the body straight to parse_invoice, which only decodes
+the segments the profile actually reads. Both are run over the same synthetic
+interchange (>= --mb megabytes) and report wall time plus the peak memory
+traced by tracemalloc, including the decoded copy on the str path.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+
+
+def parse_as_str(edi_bytes):
+    return parse_invoice(edi_bytes.decode("utf-8"))
+
+
+def parse_as_bytes(edi_bytes):
+    return parse_invoice(edi_bytes)
+
+
+def measure(label, fn, edi_bytes, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        invoices, _ = fn(edi_bytes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    fn(edi_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mb = len(edi_bytes) / (1024 * 1024)
+    print(f"{label:8s} {best:8.3f} s  {mb / best:8.2f} MB/s  {len(invoices) / best:10.1f} invoices/sec"
+          f"  peak {peak / (1024 * 1024):8.2f} MB")
+    return invoices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=10.0, help="minimum interchange size in megabytes")
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    probe = generate_interchange(100, args.charges)
+    sets = max(1, int(args.mb * 1024 * 1024 / len(probe) * 100 * 1.05))
+    edi_bytes = generate_interchange(sets, args.charges).encode("utf-8")
+    print(f"{len(edi_bytes) / (1024 * 1024):.1f} MB, {sets} transaction sets x {args.charges} charges")
+
+    from_str = measure("str", parse_as_str, edi_bytes, args.repeat)
+    from_bytes = measure("bytes", parse_as_bytes, edi_bytes, args.repeat)
+    if from_str != from_bytes:
+        sys.exit("str and bytes paths produced different invoices")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Incremental re-extraction vs re-parsing everything after a profile change.
+
+    python benchmarks/bench_incremental.py [--sets N] [--charges M]
+
+Records a synthetic interchange into a scratch ExtractionStore, then changes one
+partner's profile the way a typical fix does (an extra `contains` keyword on an
+l1_rules entry) and compares:
+
+  full parse        mapper.parse_invoice over the whole interchange, nothing stored
+  full re-record    ExtractionStore.record again: parse, run every group, store everything
+  reextract         incremental.reextract: only the changed partner's charges group runs
+
+The re-extracted invoices must equal a full parse with the new profile; the script
+exits non-zero otherwise.
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_edi import generate_interchange  # noqa: E402
+from incremental import ExtractionStore, reextract  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def report(label, elapsed, count, baseline=None):
+    relative = f" {elapsed / baseline:8.2f}x of full re-record" if baseline else ""
+    print(f"{label:20s} {elapsed * 1000:10.2f} ms {count / elapsed:14.1f} sets/sec{relative}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=4000)
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--partner", default="CARRIERX/004010", help="profile to change, as PARTNER/VERSION")
+    args = parser.parse_args()
+
+    scratch = Path(tempfile.mkdtemp(prefix="bench_incremental_"))
+    try:
+        profiles = scratch / "profiles"
+        shutil.copytree(ROOT / "profiles", profiles)
+        load_profiles(str(profiles))
+        edi_text = generate_interchange(args.sets, args.charges)
+
+        store = ExtractionStore(str(scratch / "store.sqlite"))
+        elapsed, count = timed(lambda: store.record(edi_text))
+        report("initial record", elapsed, count)
+
+        profile_path = profiles / args.partner / "profile.json"
+        profile = json.loads(profile_path.read_text())
+        rules = profile["segments"]["charges"]["l1_rules"]
+        next(rule for rule in rules if "DETENTION" in rule.get("contains", ()))["contains"].append("LIFTGATE")
+        profile_path.write_text(json.dumps(profile, indent=2))
+        load_profiles()
+
+        elapsed, (invoices, warnings) = timed(lambda: parse_invoice(edi_text))
+        report("full parse", elapsed, count)
+        rerecord_store = ExtractionStore(str(scratch / "rerecord.sqlite"))
+        baseline, _ = timed(lambda: rerecord_store.record(edi_text))
+        report("full re-record", baseline, count)
+        rerecord_store.close()
+        elapsed, result = timed(lambda: reextract(store))
+        report("reextract", elapsed, count, baseline)
+        print(f"re-extracted {result['reextracted']} of {result['checked']} sets "
+              f"(groups {result['groups_run']}), {result['changed']} changed")
+
+        stored = store._db.execute("SELECT invoice, warnings FROM transaction_sets ORDER BY rowid").fetchall()
+        store.close()
+        if [json.loads(row[0]) for row in stored] != invoices or [json.loads(row[1]) for row in stored] != warnings:
+            sys.exit("re-extracted invoices differ from a full parse with the new profile")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
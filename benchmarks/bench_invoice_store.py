@@ -0,0 +1,109 @@
+"""
+Golden-invoice store: bulk insert, indexed lookups and duplicate detection.
+
+    python benchmarks/bench_invoice_store.py [--sets N] [--charges M] [--lookups K]
+
+Parses a synthetic interchange once, then against a scratch InvoiceStore measures:
+
+  insert batched       InvoiceStore.insert, one transaction per batch_size rows
+  insert per row       the same rows with batch_size=1 (one commit per invoice)
+  lookup indexed       find(bol=...) / find(invoice_id=..., trading_partner=...)
+  lookup scan          the same BOL match via json_extract over the stored JSON, no index
+  re-insert            the same parse result again; every invoice must come back
+                       as an exact duplicate and nothing may be stored
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_edi import generate_interchange  # noqa: E402
+from invoice_store import InvoiceStore  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def report_rate(label, elapsed, count):
+    print(f"{label:20s} {elapsed * 1000:10.2f} ms {count / elapsed:14.1f} invoices/sec")
+
+
+def report_latency(label, samples):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:20s} p50 {p50 * 1e6:10.1f} us   p99 {p99 * 1e6:10.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=20000)
+    parser.add_argument("--charges", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--per-row-sets", type=int, default=2000,
+                        help="invoices for the per-row insert run (it is slow)")
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    invoices, warnings = parse_invoice(generate_interchange(args.sets, args.charges))
+    scratch = Path(tempfile.mkdtemp(prefix="bench_invoice_store_"))
+    try:
+        store = InvoiceStore(str(scratch / "store.sqlite"))
+        elapsed, result = timed(lambda: store.insert(invoices, warnings, "bench"))
+        report_rate("insert batched", elapsed, result["inserted"])
+
+        per_row = InvoiceStore(str(scratch / "per_row.sqlite"), batch_size=1)
+        count = min(args.per_row_sets, len(invoices))
+        elapsed, _ = timed(lambda: per_row.insert(invoices[:count], warnings[:count], "bench"))
+        report_rate("insert per row", elapsed, count)
+        per_row.close()
+
+        rng = random.Random(210)
+        with_bol = [invoice for invoice in invoices if invoice["refs"]["bol"] != "null"]
+        picks = [rng.choice(with_bol) for _ in range(args.lookups)]
+        samples = []
+        for invoice in picks:
+            elapsed, found = timed(lambda: store.find(bol=invoice["refs"]["bol"]))
+            assert found, invoice["refs"]["bol"]
+            samples.append(elapsed)
+        report_latency("lookup bol", samples)
+        samples = []
+        for invoice in picks:
+            elapsed, found = timed(lambda: store.find(invoice_id=invoice["invoice_id"],
+                                                      trading_partner=invoice["metadata"]["trading_partner"]))
+            assert found, invoice["invoice_id"]
+            samples.append(elapsed)
+        report_latency("lookup invoice_id", samples)
+        samples = []
+        for invoice in picks[:max(1, args.lookups // 10)]:
+            elapsed, _ = timed(lambda: store._db.execute(
+                "SELECT id FROM invoices WHERE json_extract(invoice, '$.refs.bol') = ?",
+                (invoice["refs"]["bol"],)).fetchall())
+            samples.append(elapsed)
+        report_latency("lookup scan", samples)
+
+        elapsed, result = timed(lambda: store.insert(invoices, warnings, "bench-resend"))
+        report_rate("re-insert", elapsed, len(invoices))
+        exact = sum(1 for duplicate in result["duplicates"] if duplicate["kind"] == "exact")
+        print(f"re-insert: {exact} exact duplicates of {len(invoices)}, {result['inserted']} stored")
+        store.close()
+        if exact != len(invoices) or result["inserted"]:
+            sys.exit("re-inserting the same invoices was not detected as exact duplicates")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
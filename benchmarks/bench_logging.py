@@ -0,0 +1,58 @@
+"""
+Invoices/sec for parse_invoice with partner debug tracing disabled vs enabled.
+
+    python benchmarks/bench_logging.py [--iterations N] [--fixture PATH]
+"""
+import argparse
+import io
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+
+from edi_logging import LOGGER_NAME, set_partner_debug  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+
+
+def run(edi_text: str, iterations: int):
+    invoices = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        parsed, _ = parse_invoice(edi_text)
+        invoices += len(parsed)
+    return invoices / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--fixture", default=str(ROOT / "tests" / "fixtures" / "sample_l1.edi"))
+    parser.add_argument("--partner", default="CARRIERX")
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    edi_text = Path(args.fixture).read_text()
+
+    # Traces go to an in-memory stream so the numbers measure formatting, not the terminal.
+    root = logging.getLogger(LOGGER_NAME)
+    root.addHandler(logging.StreamHandler(io.StringIO()))
+    root.propagate = False
+    root.setLevel(logging.WARNING)
+
+    run(edi_text, min(args.iterations, 100))
+    disabled = run(edi_text, args.iterations)
+    set_partner_debug(args.partner)
+    enabled = run(edi_text, args.iterations)
+    set_partner_debug(args.partner, False)
+
+    print(f"debug disabled: {disabled:10.1f} invoices/sec")
+    print(f"debug enabled:  {enabled:10.1f} invoices/sec ({args.partner})")
+    print(f"speedup:        {disabled / enabled:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Invoices/sec for parse_invoice with /metrics instrumentation off vs on.
+
+    python benchmarks/bench_metrics.py [--sets N] [--charges M] [--repeat R]
+
+Off should match an uninstrumented build: call sites test METRICS.enabled once
+per transaction set and never read the clock. Compare the "off" figure with the
+parse stage of run_benchmarks.py from before instrumentation to confirm.
+"""
+import argparse
+import gc
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+from metrics import configure_metrics  # noqa: E402
+
+
+def run(edi_text: str, repeat: int):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        parsed, _ = parse_invoice(edi_text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(parsed) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=5000)
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    edi_text = generate_interchange(args.sets, args.charges)
+
+    configure_metrics(False)
+    run(edi_text, 1)
+    disabled = run(edi_text, args.repeat)
+    configure_metrics(True)
+    enabled = run(edi_text, args.repeat)
+    configure_metrics(False)
+
+    print(f"metrics off: {disabled:10.1f} invoices/sec")
+    print(f"metrics on:  {enabled:10.1f} invoices/sec")
+    print(f"overhead:    {disabled / enabled - 1:10.2%}")
+
+
+if __name__ == "__main__":
+    main()
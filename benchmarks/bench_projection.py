@@ -0,0 +1,93 @@
+"""
+Field projection: full golden invoices vs only the fields a caller asked for.
+
+    python benchmarks/bench_projection.py [--sets N] [--charges M] [--fields invoice_id,total,charges]
+
+Three comparisons on the same synthetic interchange, full invoice vs --fields
+(by default the reconciliation projection, invoice_id,total,charges):
+
+  extract      extract_elements_with_rules over pre-tokenized transaction sets
+  end-to-end   mapper.parse_invoice
+  serialize    json.dumps of the result, and the size of the response body
+
+The projected invoices must equal the matching keys of the full ones; the
+script exits non-zero otherwise.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from extract_elements_with_rules import extract_elements_with_rules  # noqa: E402
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import iter_prepared, parse_invoice  # noqa: E402
+from projection import compile_projection  # noqa: E402
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(label, elapsed, count, baseline=None):
+    saving = f" {100 * (1 - elapsed / baseline):6.1f}% less time" if baseline else ""
+    print(f"{label:28s} {elapsed * 1000:10.2f} ms {count / elapsed:14.1f} invoices/sec{saving}")
+
+
+def extract_all(prepared, projection):
+    return [extract_elements_with_rules(plan, segments, partner, edi_version, projection=projection)[0]
+            for plan, segments, partner, edi_version in prepared]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=5000)
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--fields", default="invoice_id,total,charges")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    projection = compile_projection(args.fields)
+    if projection is None:
+        sys.exit("--fields selects every field; nothing to compare")
+    edi_text = generate_interchange(args.sets, args.charges)
+    prepared = list(iter_prepared(edi_text))
+    print(f"{len(prepared)} transaction sets, projection: {projection.key}")
+
+    full_time, full = best_of(lambda: extract_all(prepared, None), args.repeat)
+    report("extract: full", full_time, len(prepared))
+    elapsed, projected = best_of(lambda: extract_all(prepared, projection), args.repeat)
+    report("extract: projected", elapsed, len(prepared), full_time)
+    expected = [{name: invoice[name] for name in invoice if name in projection.fields} for invoice in full]
+    if projected != expected:
+        sys.exit("projected invoices differ from the same fields of the full invoices")
+
+    full_time, (full, _) = best_of(lambda: parse_invoice(edi_text), args.repeat)
+    report("parse_invoice: full", full_time, len(prepared))
+    elapsed, (projected, _) = best_of(lambda: parse_invoice(edi_text, fields=projection), args.repeat)
+    report("parse_invoice: projected", elapsed, len(prepared), full_time)
+
+    full_time, full_body = best_of(lambda: json.dumps(full), args.repeat)
+    report("serialize: full", full_time, len(prepared))
+    elapsed, projected_body = best_of(lambda: json.dumps(projected), args.repeat)
+    report("serialize: projected", elapsed, len(prepared), full_time)
+    print(f"response body: {len(full_body) / len(prepared):.0f} -> {len(projected_body) / len(prepared):.0f} "
+          f"bytes/invoice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Charge reconciliation: per-invoice loop vs columnar, vectorized batch check.
+
+    python benchmarks/bench_reconcile.py [--sets N] [--charges M]
+
+Two comparisons on the same synthetic interchange:
+
+  end-to-end   mapper.parse_invoice (sum and check inside each extraction) vs
+               reconcile.parse_invoice_columnar (charge lines appended to columns,
+               summed and checked once for the batch)
+  reconcile    only the summing/L3 comparison: a Python loop over each invoice's
+               charge lines in cents vs ChargeColumns.sums() + one vectorized compare
+
+Both paths must produce identical golden invoices; the script exits non-zero otherwise.
+"""
+import argparse
+import gc
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np  # noqa: E402
+
+from charge_totals import BUCKETS  # noqa: E402
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+from reconcile import ChargeColumns, parse_invoice_columnar  # noqa: E402
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(label, elapsed, count):
+    print(f"{label:28s} {elapsed * 1000:10.2f} ms {count / elapsed:14.1f} invoices/sec")
+
+
+def collect_columns(edi_text):
+    """ Run the columnar extractor once and keep its columns (without reconciling). """
+    from mapper import iter_invoices
+    columns = ChargeColumns()
+    for _ in iter_invoices(edi_text, columns):
+        pass
+    return columns
+
+
+def loop_reconcile(lines, totals, has_total, tolerance):
+    mismatched = []
+    width = len(BUCKETS)
+    for index, (charge_lines, total, present) in enumerate(zip(lines, totals, has_total)):
+        sums = [0] * width
+        for bucket, cents in charge_lines:
+            sums[bucket] += cents
+        if present and abs(sum(sums) - total) > tolerance:
+            mismatched.append(index)
+    return mismatched
+
+
+def vector_reconcile(columns, totals, has_total, tolerance):
+    sum_cents = columns.sums().sum(axis=1)
+    return np.flatnonzero(has_total & (np.abs(sum_cents - totals) > tolerance)).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=5000)
+    parser.add_argument("--charges", type=int, default=20)
+    parser.add_argument("--tolerance", type=int, default=0, help="allowed drift in cents")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    edi_text = generate_interchange(args.sets, args.charges)
+
+    elapsed, per_invoice = best_of(lambda: parse_invoice(edi_text), args.repeat)
+    report("parse_invoice", elapsed, args.sets)
+    elapsed, columnar = best_of(lambda: parse_invoice_columnar(edi_text, args.tolerance), args.repeat)
+    report("parse_invoice_columnar", elapsed, args.sets)
+    if per_invoice != columnar:
+        sys.exit("per-invoice and columnar paths produced different golden invoices")
+
+    columns = collect_columns(edi_text)
+    lines = [[] for _ in range(len(columns))]
+    for invoice, bucket, cents in zip(columns.invoice, columns.bucket, columns.cents):
+        lines[invoice].append((bucket, cents))
+    totals = np.frombuffer(columns.total, dtype=np.int64)
+    has_total = np.frombuffer(columns.has_total, dtype=np.int8).astype(bool)
+    print(f"{len(columns.cents)} charge lines across {len(columns)} invoices")
+
+    elapsed, looped = best_of(lambda: loop_reconcile(lines, columns.total, columns.has_total, args.tolerance),
+                              args.repeat)
+    report("reconcile: per-invoice loop", elapsed, len(columns))
+    elapsed, vectorized = best_of(lambda: vector_reconcile(columns, totals, has_total, args.tolerance), args.repeat)
+    report("reconcile: vectorized", elapsed, len(columns))
+    if looped != vectorized:
+        sys.exit("per-invoice and vectorized reconciliation flagged different invoices")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Segment layout: str.split element lists vs the compact Segment view.
+
+    python benchmarks/bench_segments.py [--sets N] [--charges M] [--repeat R]
+
+"list" is the default SegmentIndex layout: each segment read becomes the list
+str.split gives, one Python string per element including empty fillers. "compact"
+(SEGMENT_LAYOUT=compact) reads through Segment views instead: the shared buffer
+and the segment's offsets, with each element found, sliced and stripped when read.
+
+Reports, for str and bytes input:
+
+  bytes/segment    memory held per segment once every segment of the interchange
+                   has been read (tracemalloc, segment objects only, buffer excluded)
+  parse            best-of-R mapper.parse_invoice wall time, runs interleaved
+
+Both layouts must produce the same invoices; the script exits non-zero otherwise.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import mapper  # noqa: E402
+import segment_index  # noqa: E402
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from segment_index import SegmentIndex  # noqa: E402
+from tokenizer import iter_transaction_sets, sniff_delimiters  # noqa: E402
+
+
+LAYOUTS = {"list": False, "compact": True}
+
+
+def bytes_per_segment(compact, edi_text):
+    """ Memory held by the read segments of every transaction set, per segment. """
+    delimiters = sniff_delimiters(edi_text)
+    raw = delimiters if isinstance(edi_text, str) else delimiters.encoded()
+    indexes = [SegmentIndex.build(edi_text, envelope + transaction, delimiters.element, compact)
+               for envelope, transaction in iter_transaction_sets(edi_text, raw.element, raw.segment)]
+    count = sum(len(index) for index in indexes)
+    gc.collect()
+    tracemalloc.start()
+    for index in indexes:
+        for row in range(len(index)):
+            index.segment(row)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held / count
+
+
+def parse_with(compact, edi_text):
+    default = segment_index.COMPACT_SEGMENTS
+    segment_index.COMPACT_SEGMENTS = compact
+    try:
+        gc.collect()
+        start = time.perf_counter()
+        result = mapper.parse_invoice(edi_text)
+        return time.perf_counter() - start, result
+    finally:
+        segment_index.COMPACT_SEGMENTS = default
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=3000)
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    text = generate_interchange(args.sets, args.charges)
+    for input_label, edi_text in (("str", text), ("bytes", text.encode("utf-8"))):
+        best = dict.fromkeys(LAYOUTS, float("inf"))
+        results = {}
+        for _ in range(args.repeat):
+            for label, compact in LAYOUTS.items():
+                elapsed, results[label] = parse_with(compact, edi_text)
+                best[label] = min(best[label], elapsed)
+        if results["list"] != results["compact"]:
+            sys.exit(f"{input_label}: compact segments give different invoices than split lists")
+        for label, compact in LAYOUTS.items():
+            size = bytes_per_segment(compact, edi_text)
+            print(f"{input_label:6s} {label:8s} {size:8.1f} bytes/segment   parse {best[label] * 1000:9.2f} ms"
+                  f"  {args.sets / best[label]:10.1f} sets/sec")
+
+
+if __name__ == "__main__":
+    main()
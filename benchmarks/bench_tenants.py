@@ -0,0 +1,93 @@
+"""
+Invoices/sec for parse_invoice per tenant, and the per-tenant throughput report.
+
+    python benchmarks/bench_tenants.py [--sets N] [--charges M] [--repeat R]
+
+Three tenants parse the same interchange, runs interleaved:
+
+  default    the default tenant: shared profiles, BROKER_ID
+  broker     its own broker ID, no profile namespace
+  namespace  its own broker ID and a namespace overriding CARRIERX/004010 (a copy of
+             the shared profile with another default currency), so the resolver
+             works on the merged snapshot
+
+All three should be within noise of each other: a tenant only changes which resolver
+and broker ID the parse uses. The report at the end is Tenant.stats(), as served by
+/admin/tenants, and counts every run above.
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+from tenants import DEFAULT_TENANT, configure_tenants, get_tenant  # noqa: E402
+
+OVERRIDE = ("CARRIERX", "004010")
+
+
+def write_namespace(directory: Path):
+    """ A namespace overriding one shared profile. """
+    profile = json.loads((ROOT / "profiles" / OVERRIDE[0] / OVERRIDE[1] / "profile.json").read_text())
+    profile["currency"] = {"default": "CAD"}
+    target = directory / OVERRIDE[0] / OVERRIDE[1]
+    target.mkdir(parents=True)
+    (target / "profile.json").write_text(json.dumps(profile))
+
+
+def run_once(edi_text: str, tenant_id: str):
+    gc.collect()
+    start = time.perf_counter()
+    parsed, _ = parse_invoice(edi_text, tenant=tenant_id)
+    return time.perf_counter() - start, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=3000)
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    text = generate_interchange(args.sets, args.charges)
+    with tempfile.TemporaryDirectory() as namespace:
+        write_namespace(Path(namespace))
+        configure_tenants({
+            "broker": {"broker_id": "BENCHBROKER"},
+            "namespace": {"broker_id": "BENCHBROKER", "profiles": namespace},
+        })
+        tenant_ids = (DEFAULT_TENANT, "broker", "namespace")
+        best = dict.fromkeys(tenant_ids, float("inf"))
+        results = {}
+        for _ in range(args.repeat):
+            for tenant_id in tenant_ids:
+                elapsed, results[tenant_id] = run_once(text, tenant_id)
+                best[tenant_id] = min(best[tenant_id], elapsed)
+
+    sides = {tenant_id: {invoice["side"] for invoice in parsed} for tenant_id, parsed in results.items()}
+    overridden = sum(invoice["currency"] == "CAD" for invoice in results["namespace"])
+    print(f"sides: {sides}   namespace invoices with the overridden currency: {overridden}/{args.sets}")
+    baseline = args.sets / best[DEFAULT_TENANT]
+    for tenant_id in tenant_ids:
+        rate = args.sets / best[tenant_id]
+        print(f"{tenant_id:10s} {best[tenant_id] * 1000:9.2f} ms  {rate:10.1f} invoices/sec"
+              f"  {(rate / baseline - 1) * 100:+6.1f}% vs default")
+    print()
+    for tenant_id in tenant_ids:
+        stats = get_tenant(tenant_id).stats()
+        print(f"{tenant_id:10s} parses {stats['parses']:3d}  invoices {stats['invoices']:7d}"
+              f"  {stats['invoices_per_sec']:10.1f} invoices/sec  {stats['mb_per_sec']:6.2f} MB/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Validation throughput: Pydantic model path vs the precompiled fast path.
+
+    python benchmarks/bench_validation.py [--sets N] [--charges M]
+
+The Pydantic path builds a GoldenInvoice per record and dumps it back to JSON;
+the fast path checks the extractor's dicts in place, and the batch API does the
+whole list in one call.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(ROOT / "Output_Validation"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fast_validator import invoice_errors, validate_batch  # noqa: E402
+from generate_edi import generate_interchange  # noqa: E402
+from loader import load_profiles  # noqa: E402
+from mapper import parse_invoice  # noqa: E402
+
+
+def timed(label, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {count / elapsed:12.1f} invoices/sec")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=5000)
+    parser.add_argument("--charges", type=int, default=10)
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    invoices, _ = parse_invoice(generate_interchange(args.sets, args.charges))
+    count = len(invoices)
+
+    try:
+        from JSON_Schema_Validator import validate_invoice
+    except ImportError as exc:
+        validate_invoice = None
+        print(f"{'pydantic model':28s} skipped: {exc}")
+    if validate_invoice is not None:
+        timed("pydantic model", lambda: [validate_invoice(inv) for inv in invoices], count)
+    timed("fast path (per invoice)", lambda: [invoice_errors(inv) for inv in invoices], count)
+    timed("fast path (batch)", lambda: validate_batch(invoices), count)
+
+
+if __name__ == "__main__":
+    main()
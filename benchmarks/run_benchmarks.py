@@ -0,0 +1,206 @@
+"""
+Reproducible throughput/latency/memory benchmark for the EDI 210 pipeline.
+
+Generates a synthetic interchange (see generate_edi.py), then measures each stage:
+
+  parse_invoice   end-to-end: tokenize, index, resolve profile, extract
+  extract         extract_elements_with_rules on pre-built segment indexes
+  validate        Output_Validation.validate_invoice on the extracted invoices
+  validate_fast   the precompiled fast-path validator on the same invoices
+
+For each stage it reports invoices/sec, p50/p99 per-invoice latency and peak
+traced memory. Results are written as JSON; pass --baseline to compare against
+an earlier run and exit non-zero when throughput drops by more than --tolerance.
+
+    python benchmarks/run_benchmarks.py --sets 2000 --charges 10 -o benchmarks/results/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(ROOT / "Output_Validation"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_edi import TEMPLATES, generate_interchange  # noqa: E402
+from extract_elements_with_rules import extract_elements_with_rules  # noqa: E402
+from loader import get_profile, load_profiles, profile_snapshot  # noqa: E402
+from mapper import iter_invoices  # noqa: E402
+from segment_index import SegmentIndex  # noqa: E402
+from tokenizer import iter_transaction_sets  # noqa: E402
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summary(latencies, elapsed, peak_bytes):
+    return {
+        "invoices": len(latencies),
+        "invoices_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "peak_mem_mb": peak_bytes / (1024 * 1024),
+    }
+
+
+def _measure(stage, repeat):
+    """
+    Run stage() -> per-invoice latencies `repeat` times and keep the fastest run,
+    then once more under tracemalloc for peak memory (tracing skews timings).
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        latencies = stage()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[1]:
+            best = (latencies, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return _summary(best[0], best[1], peak)
+
+
+def bench_parse(edi_text):
+    def stage():
+        latencies = []
+        last = time.perf_counter()
+        for _ in iter_invoices(edi_text):
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+        return latencies
+    return stage
+
+
+def bench_extract(edi_text):
+    profiles = profile_snapshot()
+    prepared = []
+    for envelope, transaction in iter_transaction_sets(edi_text):
+        segments = SegmentIndex.build(edi_text, envelope + transaction)
+        gs = segments.first('GS')
+        partner, edi_version = gs[2].strip(), gs[8].strip()
+        prepared.append((get_profile(partner, edi_version, profiles), segments, partner, edi_version))
+
+    def stage():
+        latencies = []
+        for plan, segments, partner, edi_version in prepared:
+            start = time.perf_counter()
+            extract_elements_with_rules(plan, segments, partner, edi_version)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    return stage
+
+
+def bench_validate(invoices):
+    from JSON_Schema_Validator import validate_invoice
+
+    def stage():
+        latencies = []
+        for invoice in invoices:
+            start = time.perf_counter()
+            validate_invoice(invoice)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    return stage
+
+
+def bench_validate_fast(invoices):
+    from fast_validator import invoice_errors
+
+    def stage():
+        latencies = []
+        for invoice in invoices:
+            start = time.perf_counter()
+            invoice_errors(invoice)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    return stage
+
+
+def compare(results, baseline, tolerance):
+    """ Print per-stage throughput deltas; return the stages that regressed. """
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "invoices_per_sec" not in previous or "invoices_per_sec" not in current:
+            continue
+        ratio = current["invoices_per_sec"] / previous["invoices_per_sec"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            regressions.append(stage)
+            flag = "  REGRESSION"
+        print(f"{stage:13s} {previous['invoices_per_sec']:12.1f} -> {current['invoices_per_sec']:12.1f} inv/s ({ratio:6.2%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=2000)
+    parser.add_argument("--charges", type=int, default=10)
+    parser.add_argument("--partners", default=",".join(TEMPLATES))
+    parser.add_argument("--seed", type=int, default=210)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage; the fastest is kept")
+    parser.add_argument("--stages", default="parse,extract,validate,validate_fast")
+    parser.add_argument("-o", "--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput drop vs baseline")
+    args = parser.parse_args()
+
+    load_profiles(str(ROOT / "profiles"))
+    partners = [p.strip().upper() for p in args.partners.split(",") if p.strip()]
+    edi_text = generate_interchange(args.sets, args.charges, partners, args.seed)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+
+    results = {
+        "config": {"sets": args.sets, "charges": args.charges, "partners": partners, "seed": args.seed,
+                   "bytes": len(edi_text)},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "stages": {},
+    }
+    if "parse" in stages:
+        results["stages"]["parse"] = _measure(bench_parse(edi_text), args.repeat)
+    if "extract" in stages:
+        results["stages"]["extract"] = _measure(bench_extract(edi_text), args.repeat)
+    invoices = [invoice for invoice, _ in iter_invoices(edi_text)]
+    if "validate" in stages:
+        try:
+            results["stages"]["validate"] = _measure(bench_validate(invoices), args.repeat)
+        except ImportError as exc:
+            results["stages"]["validate"] = {"skipped": str(exc)}
+    if "validate_fast" in stages:
+        results["stages"]["validate_fast"] = _measure(bench_validate_fast(invoices), args.repeat)
+
+    for stage, summary in results["stages"].items():
+        if "skipped" in summary:
+            print(f"{stage:13s} skipped: {summary['skipped']}")
+            continue
+        print(f"{stage:13s} {summary['invoices_per_sec']:12.1f} inv/s  p50 {summary['p50_ms']:8.3f} ms"
+              f"  p99 {summary['p99_ms']:8.3f} ms  peak {summary['peak_mem_mb']:8.2f} MB")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,15 +8,15 @@ st.title("EDI 210 Parser Demo")
 uploaded = st.file_uploader("Upload EDI 210 file", type=["edi", "txt"])
 
 if uploaded:
-    edi_text = uploaded.read().decode("utf-8")
+    edi_bytes = uploaded.getvalue()
 
-    st.code(edi_text, language="text")
+    st.code(edi_bytes.decode("utf-8", errors="replace"), language="text")
 
     if st.button("Parse EDI"):
         response = requests.post(
             API_URL,
             headers={"Content-Type": "text/plain"},
-            data=edi_text
+            data=edi_bytes
         )
 
         if response.status_code == 200:
@@ -0,0 +1,380 @@
+"""
+Bulk backfill: parse archived EDI 210 files straight from disk, without the HTTP route.
+
+    python parser/backfill.py ARCHIVE_DIR [MORE_DIRS_OR_FILES ...] -o invoices.ndjson
+    python parser/backfill.py ARCHIVE_DIR -o invoices_parquet/ --format parquet --workers 8
+    python parser/backfill.py ARCHIVE_DIR -o invoices.sqlite --format sqlite
+
+Each file is memory-mapped and handed to mapper.parse_invoice as raw bytes inside a
+worker process. Every transaction set becomes one output row. A checkpoint file
+(default: <output>.checkpoint) lists the files whose rows are safely written;
+rerunning the same command skips them and picks up where a crashed run stopped.
+
+NDJSON output is a single file. Each run appends to it, after cutting it back to the
+last checkpointed offset. Parquet output is a directory of part files. Parts that no
+checkpoint entry refers to are left over from a crash and are deleted on resume.
+SQLite output is an invoice store (see invoice_store.py) that the API can query; each
+flush is one numbered batch, and rows from batches after the last checkpoint are
+deleted on resume.
+
+--tenant parses as that tenant (broker ID and profile namespace, see tenants.py) and
+stores SQLite rows under it; the default checkpoint is then <output>.<tenant>.checkpoint.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from pathlib import Path
+
+from edi_logging import LOGGER_NAME, configure_logging
+from invoice_store import InvoiceStore
+from loader import REGISTRY, load_profiles
+from mapper import parse_invoice
+from parallel import get_pool, shutdown_pool
+from tenants import DEFAULT_TENANT, configure_tenants, get_tenant
+
+logger = logging.getLogger(f"{LOGGER_NAME}.backfill")
+
+DEFAULT_PATTERNS = ("*.edi", "*.x12", "*.210")
+
+
+def iter_input_files(inputs, patterns=DEFAULT_PATTERNS):
+    """ Yield input files in a stable order; directories are searched recursively. """
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            found = set()
+            for pattern in patterns:
+                found.update(p for p in path.rglob(pattern) if p.is_file())
+            yield from sorted(found)
+        elif path.is_file():
+            yield path
+        else:
+            logger.warning("Skipping %s: not a file or directory", path)
+
+
+def _file_key(path: Path):
+    stat = path.stat()
+    return str(path.resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def parse_file(path: str, tenant_id: str = None):
+    """
+    Worker task: mmap one file and parse it as tenant_id (None for the default tenant).
+    Returns (path, rows, error). rows is a list of (golden_invoice, warnings).
+    """
+    try:
+        with open(path, "rb") as handle:
+            if os.fstat(handle.fileno()).st_size == 0:
+                return path, [], "empty file"
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                invoices, warnings = parse_invoice(buffer, tenant=tenant_id)
+    except Exception as exc:
+        return path, [], f"{type(exc).__name__}: {exc}"
+    return path, list(zip(invoices, warnings)), None
+
+
+class Checkpoint:
+    """
+    Append-only JSON-lines record of finished files. Each line is one flush: where
+    the output stood after it (NDJSON offset or Parquet part) and, per file, its
+    size, mtime, row count and any error. A line is only appended once its rows are
+    flushed, and a torn last line is discarded whole, so the checkpoint never claims
+    rows that are not on disk. A file that changed since its entry is parsed again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done = {}
+        self.last = None
+        self.parts = set()
+        valid_bytes = 0
+        if path.exists():
+            with open(path, "rb") as handle:
+                for line in handle:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write.
+                        break
+                    self._apply(batch)
+                    valid_bytes += len(line)
+        self._handle = open(path, "a", encoding="utf-8")
+        self._handle.truncate(valid_bytes)
+
+    def is_done(self, key, retry_errors: bool = False):
+        entry = self.done.get(key[0])
+        if entry is None or (entry["size"], entry["mtime_ns"]) != key[1:]:
+            return False
+        return not (retry_errors and entry.get("error"))
+
+    def _apply(self, batch):
+        for entry in batch["files"]:
+            self.done[entry["file"]] = entry
+        if batch.get("part"):
+            self.parts.add(batch["part"])
+        self.last = batch
+
+    def record(self, files, position):
+        batch = dict(position, files=files)
+        self._handle.write(json.dumps(batch) + "\n")
+        self._apply(batch)
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+    def close(self):
+        self._handle.close()
+
+
+class NdjsonSink:
+    """ One JSON line per transaction set: {file, set_index, invoice, warnings}. """
+
+    def __init__(self, path: Path, checkpoint: Checkpoint, tenant: str = DEFAULT_TENANT):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        offset = checkpoint.last.get("offset", 0) if checkpoint.last else 0
+        self._handle = open(path, "ab")
+        # Drop rows written after the last checkpoint; those files will be parsed again.
+        self._handle.truncate(offset)
+        self._handle.seek(offset)
+
+    def write(self, file: str, rows):
+        for set_index, (invoice, warnings) in enumerate(rows):
+            line = {"file": file, "set_index": set_index, "invoice": invoice, "warnings": warnings}
+            self._handle.write(json.dumps(line, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def flush(self):
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        return {"offset": self._handle.tell()}
+
+    def close(self):
+        self._handle.close()
+
+
+class ParquetSink:
+    """
+    Parquet part files, one per flush. Flat columns for the fields reconciliation
+    usually filters on, plus the whole invoice and its warnings as JSON.
+    """
+
+    def __init__(self, path: Path, checkpoint: Checkpoint, tenant: str = DEFAULT_TENANT):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as exc:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from exc
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        path.mkdir(parents=True, exist_ok=True)
+        for part in path.glob("part-*.parquet"):
+            if part.name not in checkpoint.parts:
+                part.unlink()
+        for tmp in path.glob("part-*.parquet.tmp"):
+            tmp.unlink()
+        self._next_part = len(list(path.glob("part-*.parquet")))
+        self._columns = {name: [] for name in (
+            "file", "set_index", "invoice_id", "trading_partner", "edi_version", "bol", "pro",
+            "invoice_date", "currency", "total", "confidence", "invoice", "warnings",
+        )}
+
+    def write(self, file: str, rows):
+        columns = self._columns
+        for set_index, (invoice, warnings) in enumerate(rows):
+            metadata = invoice.get("metadata", {})
+            refs = invoice.get("refs", {})
+            columns["file"].append(file)
+            columns["set_index"].append(set_index)
+            columns["invoice_id"].append(invoice.get("invoice_id"))
+            columns["trading_partner"].append(metadata.get("trading_partner"))
+            columns["edi_version"].append(metadata.get("edi_version"))
+            columns["bol"].append(refs.get("bol"))
+            columns["pro"].append(refs.get("pro"))
+            columns["invoice_date"].append(invoice.get("dates", {}).get("invoice"))
+            columns["currency"].append(invoice.get("currency"))
+            columns["total"].append(str(invoice.get("total")))
+            columns["confidence"].append(float(metadata.get("confidence", 0.0)))
+            columns["invoice"].append(json.dumps(invoice, separators=(",", ":")))
+            columns["warnings"].append(json.dumps(warnings, separators=(",", ":")))
+
+    def flush(self):
+        if not self._columns["file"]:
+            return {"part": None}
+        name = f"part-{self._next_part:05d}.parquet"
+        tmp = self.path / (name + ".tmp")
+        self._pq.write_table(self._pa.table(self._columns), tmp)
+        os.replace(tmp, self.path / name)
+        self._next_part += 1
+        for values in self._columns.values():
+            values.clear()
+        return {"part": name}
+
+    def close(self):
+        pass
+
+
+class SqliteSink:
+    """
+    Golden-invoice store rows, deduplicated per InvoiceStore's on_duplicate policy
+    (INVOICE_STORE_ON_DUPLICATE, default skip), stored under tenant. Rows are buffered
+    and inserted on flush.
+    """
+
+    def __init__(self, path: Path, checkpoint: Checkpoint, tenant: str = DEFAULT_TENANT):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._store = InvoiceStore(str(path), on_duplicate=os.environ.get("INVOICE_STORE_ON_DUPLICATE", "skip"))
+        self._tenant = tenant
+        self._batch = checkpoint.last.get("batch", 0) if checkpoint.last else 0
+        # Drop rows written after the last checkpoint; those files will be parsed again.
+        self._store.delete_batches_after(self._batch, tenant)
+        self._invoices = []
+        self._warnings = []
+        self._sources = []
+
+    def write(self, file: str, rows):
+        for invoice, warnings in rows:
+            self._invoices.append(invoice)
+            self._warnings.append(warnings)
+            self._sources.append(file)
+
+    def flush(self):
+        self._batch += 1
+        result = self._store.insert(self._invoices, self._warnings, self._sources, batch=self._batch,
+                                    tenant=self._tenant)
+        if result["duplicates"]:
+            logger.info("Backfill batch %d: %d duplicate invoices (%d skipped, %d replaced)", self._batch,
+                        len(result["duplicates"]), result["skipped"], result["replaced"])
+        self._invoices.clear()
+        self._warnings.clear()
+        self._sources.clear()
+        return {"batch": self._batch}
+
+    def close(self):
+        self._store.close()
+
+
+SINKS = {"ndjson": NdjsonSink, "parquet": ParquetSink, "sqlite": SqliteSink}
+
+
+def run_backfill(inputs, output: str, fmt: str = "ndjson", workers: int = None, checkpoint_path: str = None,
+                 flush_every: int = 200, retry_errors: bool = False, profiles_dir: str = None,
+                 progress_interval: float = 10.0, tenant_id: str = None):
+    """
+    Parse every input file into output and return a report dict with counts and throughput.
+    """
+    load_profiles(profiles_dir)
+    # Before the pool starts, so its workers get the tenants too.
+    configure_tenants()
+    tenant_id = get_tenant(tenant_id).tenant_id
+    output = Path(output)
+    if not checkpoint_path:
+        suffix = ".checkpoint" if tenant_id == DEFAULT_TENANT else f".{tenant_id}.checkpoint"
+        checkpoint_path = output.with_name(output.name + suffix)
+    checkpoint = Checkpoint(Path(checkpoint_path))
+    sink = SINKS[fmt](output, checkpoint, tenant_id)
+
+    pending = []
+    skipped = 0
+    for path in iter_input_files(inputs):
+        key = _file_key(path)
+        if checkpoint.is_done(key, retry_errors):
+            skipped += 1
+        else:
+            pending.append(key)
+    logger.info("Backfill: %d files to parse, %d already in checkpoint", len(pending), skipped)
+
+    report = {"files": 0, "skipped": skipped, "failed": 0, "transaction_sets": 0, "bytes": 0}
+    started = last_progress = time.perf_counter()
+    pool = get_pool(workers, profiles_dir or str(REGISTRY.base_path))
+    # Keep a bounded window in flight so a huge archive does not queue every file at once.
+    window = max(4, (workers or os.cpu_count() or 1) * 4)
+    keys = {}
+    unflushed = []
+    queue = iter(pending)
+    in_flight = set()
+    try:
+        while True:
+            while len(in_flight) < window:
+                key = next(queue, None)
+                if key is None:
+                    break
+                future = pool.submit(parse_file, key[0], tenant_id)
+                keys[future] = key
+                in_flight.add(future)
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file, size, mtime_ns = keys.pop(future)
+                _, rows, error = future.result()
+                if error:
+                    report["failed"] += 1
+                    logger.warning("Failed to parse %s: %s", file, error)
+                sink.write(file, rows)
+                report["files"] += 1
+                report["transaction_sets"] += len(rows)
+                report["bytes"] += size
+                unflushed.append({"file": file, "size": size, "mtime_ns": mtime_ns, "sets": len(rows), "error": error})
+            if len(unflushed) >= flush_every:
+                _commit(sink, checkpoint, unflushed)
+            now = time.perf_counter()
+            if now - last_progress >= progress_interval:
+                last_progress = now
+                logger.info("Backfill progress: %d/%d files, %d transaction sets, %.1f files/sec",
+                            report["files"], len(pending), report["transaction_sets"],
+                            report["files"] / (now - started))
+        _commit(sink, checkpoint, unflushed)
+    finally:
+        sink.close()
+        checkpoint.close()
+        shutdown_pool()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_sec"] = elapsed
+    report["files_per_sec"] = report["files"] / elapsed if elapsed else 0.0
+    report["sets_per_sec"] = report["transaction_sets"] / elapsed if elapsed else 0.0
+    report["mb_per_sec"] = report["bytes"] / (1024 * 1024) / elapsed if elapsed else 0.0
+    return report
+
+
+def _commit(sink, checkpoint: Checkpoint, unflushed: list):
+    """ Make buffered rows durable, then record their files in the checkpoint. """
+    if not unflushed:
+        return
+    checkpoint.record(list(unflushed), sink.flush())
+    unflushed.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="EDI files or directories to search recursively")
+    parser.add_argument("-o", "--output", required=True, help="NDJSON file, directory for Parquet parts, or SQLite file")
+    parser.add_argument("--format", choices=sorted(SINKS), default="ndjson")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: PARSE_WORKERS or CPU count)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--flush-every", type=int, default=200, help="files per output flush + checkpoint")
+    parser.add_argument("--retry-errors", action="store_true", help="re-parse files that failed in an earlier run")
+    parser.add_argument("--profiles", help="profiles directory (default: PROFILES_PATH or profiles)")
+    parser.add_argument("--report", help="also write the final report as JSON here")
+    parser.add_argument("--tenant", help="tenant to parse and store as (default: the default tenant)")
+    args = parser.parse_args(argv)
+
+    # Progress lines are logged at INFO, so default to it unless EDI_LOG_LEVEL says otherwise.
+    configure_logging(os.environ.get("EDI_LOG_LEVEL", "INFO"))
+    report = run_backfill(args.inputs, args.output, args.format, args.workers, args.checkpoint,
+                          args.flush_every, args.retry_errors, args.profiles, tenant_id=args.tenant)
+    print(f"files {report['files']} (skipped {report['skipped']}, failed {report['failed']})  "
+          f"transaction sets {report['transaction_sets']}  {report['elapsed_sec']:.1f} s  "
+          f"{report['files_per_sec']:.1f} files/sec  {report['sets_per_sec']:.1f} sets/sec  "
+          f"{report['mb_per_sec']:.2f} MB/sec", file=sys.stderr)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over (keyword, rank) pairs.
+    best() scans a text once and returns the lowest rank of any keyword it contains.
+    """
+    __slots__ = ('_goto', '_fail', '_out')
+
+    def __init__(self, patterns):
+        goto = [{}]
+        out = [None]
+        for keyword, rank in patterns:
+            if not keyword:
+                continue
+            node = 0
+            for ch in keyword:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(None)
+                node = nxt
+            if out[node] is None or rank < out[node]:
+                out[node] = rank
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                # Inherit matches that end at the fallback state (shorter keywords).
+                inherited = out[fail[nxt]]
+                if inherited is not None and (out[nxt] is None or inherited < out[nxt]):
+                    out[nxt] = inherited
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def best(self, text: str):
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        best = None
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            rank = out[node]
+            if rank is not None and (best is None or rank < best):
+                best = rank
+                if best == 0:
+                    break
+        return best
+
+
+class ChargeClassifier:
+    """
+    Precompiled L1/SAC charge matcher for one profile.
+
+    L1 descriptions are matched against every rule's `contains` keywords in a
+    single automaton pass; SAC codes are a dict lookup over `codeIn`. When several
+    rules match, the one listed first in the profile wins.
+    """
+    __slots__ = ('l1_rules', 'sac_rules', '_l1_automaton', '_sac_codes')
+
+    def __init__(self, l1_rules, sac_rules):
+        self.l1_rules = l1_rules
+        self.sac_rules = sac_rules
+        self._l1_automaton = KeywordAutomaton(
+            (keyword, rank) for rank, rule in enumerate(l1_rules) for keyword in rule.contains
+        )
+        sac_codes = {}
+        for rule in sac_rules:
+            for code in rule.code_in:
+                sac_codes.setdefault(code, rule)
+        self._sac_codes = sac_codes
+
+    def classify_l1(self, description: str):
+        """ ChargeRule whose keywords appear in the L1 description, or None. """
+        rank = self._l1_automaton.best(description)
+        return None if rank is None else self.l1_rules[rank]
+
+    def classify_sac(self, code: str):
+        """ ChargeRule listing the SAC02 code, or None. """
+        return self._sac_codes.get(code)
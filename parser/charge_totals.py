@@ -0,0 +1,47 @@
+import os
+
+# Order of the charge buckets in per-invoice totals and in ChargeColumns.bucket.
+BUCKETS = ("base_freight", "fuel_surcharge", "detention", "other")
+BUCKET_INDEX = {name: i for i, name in enumerate(BUCKETS)}
+OTHER = BUCKET_INDEX["other"]
+
+_TOLERANCE_CENTS = int(os.environ.get("TOTAL_TOLERANCE_CENTS", 0))
+
+
+def configure_total_tolerance(cents: int = None):
+    """
+    Set how far (in cents) the sum of charges may drift from the L3 total before the
+    invoice is flagged. Defaults to TOTAL_TOLERANCE_CENTS, or 0 for an exact match.
+    """
+    global _TOLERANCE_CENTS
+    if cents is None:
+        cents = int(os.environ.get("TOTAL_TOLERANCE_CENTS", 0))
+    _TOLERANCE_CENTS = cents
+    return _TOLERANCE_CENTS
+
+
+def get_total_tolerance():
+    return _TOLERANCE_CENTS
+
+
+def to_cents(amount) -> int:
+    """
+    Amount (EDI decimal string or float) as integer cents, rounded to the nearest cent.
+    """
+    return int(round(float(amount) * 100))
+
+
+class InvoiceCharges:
+    """
+    Running charge totals in cents for one invoice, one slot per bucket in BUCKETS.
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self):
+        self.cents = [0] * len(BUCKETS)
+
+    def add(self, bucket: int, cents: int):
+        self.cents[bucket] += cents
+
+    def total(self):
+        return sum(self.cents)
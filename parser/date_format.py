@@ -0,0 +1,107 @@
+from datetime import date
+from functools import lru_cache
+
+# --- Fixed-width EDI date converters compiled from profile `fmt` strings ---
+# "yyyyMMdd" / "CCYYMMDD" (X12 DT 8) and "yyMMdd" / "YYMMDD" (DT 6) become slice
+# positions once, when the profile loads; converting a value is then a memo lookup,
+# or three slices and a calendar check the first time a date is seen.
+# Several layouts may be given as alternatives, "CCYYMMDD|YYMMDD", picked by width.
+
+_YEAR4 = ("yyyy", "CCYY", "ccyy", "YYYY")
+_YEAR2 = ("yy", "YY")
+_MONTH = ("MM",)
+_DAY = ("dd", "DD")
+# Two-digit years below the pivot are 20xx, the rest 19xx.
+CENTURY_PIVOT = 70
+MEMO_SIZE = 4096
+
+
+def _layout(fmt: str):
+    """ "yyyyMMdd" -> (width, year slice, month slice, day slice, two-digit year) """
+    year = month = day = None
+    two_digit = False
+    pos = 0
+    while pos < len(fmt):
+        for tokens, width in ((_YEAR4, 4), (_YEAR2, 2), (_MONTH, 2), (_DAY, 2)):
+            token = next((t for t in tokens if fmt.startswith(t, pos)), None)
+            if token is None:
+                continue
+            span = (pos, pos + width)
+            if tokens is _YEAR4 or tokens is _YEAR2:
+                if year is not None:
+                    raise ValueError(f"Date format '{fmt}' has more than one year")
+                year, two_digit = span, tokens is _YEAR2
+            elif tokens is _MONTH:
+                if month is not None:
+                    raise ValueError(f"Date format '{fmt}' has more than one month")
+                month = span
+            else:
+                if day is not None:
+                    raise ValueError(f"Date format '{fmt}' has more than one day")
+                day = span
+            pos += width
+            break
+        else:
+            if fmt[pos].isalnum():
+                raise ValueError(f"Unsupported date format '{fmt}' at '{fmt[pos:]}'")
+            pos += 1  # literal separator, e.g. the dashes in yyyy-MM-dd
+    if year is None or month is None or day is None:
+        raise ValueError(f"Date format '{fmt}' needs a year, month and day")
+    return len(fmt), year, month, day, two_digit
+
+
+class DateFormat:
+    """
+    Converter for one profile `fmt`: raw EDI date string -> ISO 8601 "YYYY-MM-DD",
+    or None when the value does not fit any layout or is not a calendar date.
+    Results are memoized, since a batch repeats the same few dates many times.
+    """
+    __slots__ = ('fmt', '_layouts', '_memo')
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        layouts = {}
+        for variant in fmt.split("|"):
+            layout = _layout(variant.strip())
+            if layouts.setdefault(layout[0], layout) is not layout:
+                raise ValueError(f"Date format '{fmt}' has two layouts of width {layout[0]}")
+        self._layouts = layouts
+        self._memo = {}
+
+    def __call__(self, value: str):
+        try:
+            return self._memo[value]
+        except KeyError:
+            pass
+        iso = self._convert(value)
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[value] = iso
+        return iso
+
+    def _convert(self, value: str):
+        layout = self._layouts.get(len(value))
+        if layout is None:
+            return None
+        _, (y0, y1), (m0, m1), (d0, d1), two_digit = layout
+        year, month, day = value[y0:y1], value[m0:m1], value[d0:d1]
+        if not (year.isdigit() and month.isdigit() and day.isdigit()):
+            return None
+        year = int(year)
+        if two_digit:
+            year += 2000 if year < CENTURY_PIVOT else 1900
+        try:
+            return date(year, int(month), int(day)).isoformat()
+        except ValueError:
+            return None
+
+    def __repr__(self):
+        return f"DateFormat({self.fmt!r})"
+
+
+@lru_cache(maxsize=None)
+def compile_date_format(fmt: str) -> DateFormat:
+    """
+    Shared converter for fmt; raises ValueError for a format it cannot compile.
+    """
+    return DateFormat(fmt)
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+from profile_registry import GLOBAL_PROFILE_KEY
+
+LOGGER_NAME = "edi210"
+EXTRACT_LOGGER_NAME = f"{LOGGER_NAME}.extract"
+
+# partner -> logger; only ever keyed by partners named in profiles or in configuration.
+_PARTNER_LOGGERS = {}
+
+
+class LazyJson:
+    """
+    Defers json.dumps until a handler actually formats the record.
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=2)
+
+
+def get_partner_logger(partner: str):
+    """
+    Logger for extraction traces of one trading partner (edi210.extract.<PARTNER>).
+    """
+    logger = _PARTNER_LOGGERS.get(partner)
+    if logger is None:
+        logger = logging.getLogger(f"{EXTRACT_LOGGER_NAME}.{partner}")
+        _PARTNER_LOGGERS[partner] = logger
+    return logger
+
+
+def get_plan_logger(plan):
+    """
+    Logger for extraction traces of a transaction set served by plan: the profile's
+    partner logger, or the shared edi210.extract logger for sets that fell back to the
+    global profile. GS02 is whatever the sender wrote, so it never names a logger;
+    the logging module keeps every logger for the life of the process.
+    """
+    partner = plan.partner
+    if not partner or partner.upper() == GLOBAL_PROFILE_KEY[0]:
+        return logging.getLogger(EXTRACT_LOGGER_NAME)
+    return get_partner_logger(partner)
+
+
+def set_partner_debug(partner: str, enabled: bool = True):
+    """
+    Turn debug traces on or off for a single trading partner.
+    """
+    get_partner_logger(partner).setLevel(logging.DEBUG if enabled else logging.NOTSET)
+
+
+def configure_logging(level: str = None, debug_partners: str = None):
+    """
+    Configure the edi210 logger tree.
+
+    level defaults to EDI_LOG_LEVEL (WARNING). debug_partners is a comma-separated
+    list of partners to trace at DEBUG, defaulting to EDI_DEBUG_PARTNERS.
+    """
+    level = (level or os.environ.get("EDI_LOG_LEVEL", "WARNING")).upper()
+    debug_partners = debug_partners if debug_partners is not None else os.environ.get("EDI_DEBUG_PARTNERS", "")
+
+    root = logging.getLogger(LOGGER_NAME)
+    root.setLevel(level)
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root.addHandler(handler)
+        root.propagate = False
+
+    for partner in filter(None, (p.strip() for p in debug_partners.split(","))):
+        set_partner_debug(partner)
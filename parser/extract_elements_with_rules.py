@@ -1,337 +1,270 @@
-import json
+import logging
+import os
+from charge_totals import BUCKET_INDEX, OTHER, InvoiceCharges, get_total_tolerance, to_cents
+from edi_logging import LazyJson, get_plan_logger
 
-def extract_elements_with_rules(profile: dict, segments: dict, partner: str, edi_version: str):
+# Rule groups in the order they run. Each one maps to the profile sections it reads
+# and the golden invoice keys it fills; see run_rule_group.
+RULE_GROUPS = ("header", "parties", "dates", "charges")
+# Confidence of an invoice without an invoice date, whatever else was found before it.
+NO_INVOICE_DATE_CONFIDENCE = 0.1
+# GS03 receiver ID that marks an invoice as addressed to the default tenant (side "Buy").
+# Other tenants bring their own; see tenants.py.
+DEFAULT_BROKER_ID = os.environ.get("BROKER_ID", "OURBROKER")
+
+def _read(segments, rule):
     """
-    Retrieve parsing rules from the profile and extract golden invoice data.
+    Read the element a FieldRule points at, or None if the segment or element is absent.
+    """
+    if rule.qual is None:
+        seg = segments.first(rule.seg)
+    else:
+        seg = segments.qualified(rule.seg, rule.qual)
+    if seg is None or rule.idx >= len(seg):
+        return None
+    return seg[rule.idx].strip()
+
+
+def _not_found(segments, rule):
+    """
+    Warning for a rule _read returned None for: the segment is absent, or it is
+    there but too short to hold the element.
+    """
+    seg = segments.first(rule.seg) if rule.qual is None else segments.qualified(rule.seg, rule.qual)
+    if seg is None:
+        return f"{rule.seg} not found."
+    return f"{rule.seg} element {rule.idx} missing."
+
+
+def _read_date(segments, rule, warnings: list, penalties: list):
+    """
+    _read for a date rule, converted to ISO 8601 when the rule has a fmt.
+    A value that does not match fmt is kept as sent, with a warning and a penalty.
+    """
+    value = _read(segments, rule)
+    if value is None or rule.date is None:
+        return value
+    iso = rule.date(value)
+    if iso is None:
+        warnings.append(f"{rule.seg} date '{value}' does not match format {rule.fmt}.")
+        penalties.append(0.05)
+        return value
+    return iso
+
+
+def fold_confidence(penalties: list):
+    """
+    Confidence from the penalties the rule groups recorded, applied in order.
+    None stands for a missing invoice date, which resets confidence to
+    NO_INVOICE_DATE_CONFIDENCE; later penalties still apply on top of it.
     """
-    warnings = []
     confidence = 1.0
-    our_broker = 'OURBROKER'
-    pro = "null"
-    load_id = "null"
-    po = "null"
-    ship_from = "null"
-    ship_to = "null"    
-    bill_to = "null"
-    pickup = "null"
-    delivery = "null"
-    base_freight = 0.00
-    fuel_surcharge = 0.00
-    detention = 0.00
-    other = []
-    l1_rules = None
-    sac_rules = None
-    ship_from_rule = {}
-    ship_to_rule = {}
-    bill_to_rule = {}
-    pickup_date_rule = {}
-    delivery_date_rule = {}
-
-
-    header = profile['segments']['header']
-    print(f"Header Segment: {header}")
-    parties = profile['segments']['parties']
-    print(f"Parties Segment: {parties}")
-    dates = profile['segments']['dates']
-    print(f"Dates Segment: {dates}")
-    charges = profile['segments']['charges']
-    print(f"Charges Segment: {charges}")
-    total_rules = profile['segments']['total']
-    print(f"Totals Segment: {total_rules}")
-    currency_rules = profile['currency']
-    print(f"Currency Segment: {currency_rules}")
-    invoice_id_rule = header.get('invoice_id',{"seg":"inv_id_rule_in_profile"})
-    print(f"Invoice ID rule: {invoice_id_rule}")
-    invoice_date_rule = header.get('invoice_date',{"seg":"inv_date_rule_in_profile"})
-    print(f"Invoice Date rule: {invoice_date_rule}")
-    bol_rule = header.get('bol',{"seg":"bol_rule_in_profile"}).get("firstOf")
-    print(f"BOL rule: {bol_rule}")
-    pro_rule = header.get('pro',{"seg":"pro_rule_in_profile"})
-    print(f"PRO rule: {pro_rule}")
-    header['load_id'] = {'seg': 'REF', 'qual': 'LO', 'idx': 2}
-    load_id_rule = header.get('load_id',{"seg":"load_id_rule_in_profile"})
-    print(f"Load ID rule: {load_id_rule}")
-    for party in parties:
-        if party['mapTo'] == "parties.ship_from":
-            ship_from_rule = party
-            print(f"Ship From rule: {ship_from_rule}")
-        elif party['mapTo'] == "parties.ship_to":
-            ship_to_rule = party
-            print(f"Ship To rule: {ship_to_rule}")
-        elif party['mapTo'] == "parties.bill_to":
-            bill_to_rule = party
-            print(f"Bill To rule: {bill_to_rule}")
-    for date in dates:
-        if date['mapTo'] == "dates.pickup":
-            pickup_date_rule = date
-            print(f"Ship Date rule: {pickup_date_rule}")
-        elif date['mapTo'] == "dates.delivery":
-            delivery_date_rule = date
-            print(f"Delivery Date rule: {delivery_date_rule}")
-    if charges['strategy'] == "L1_only" or charges['strategy'] == "L1_then_SAC":
-        l1_rules = charges['l1_rules']
-        sac_rules = None
-        print(f"L1 Rules: {l1_rules}")
-        if charges['strategy'] == "L1_then_SAC":
-            sac_rules = charges['sac_rules']
-            print(f"SAC Rules: {sac_rules}")
-    elif charges['strategy'] == "SAC_only":
-        l1_rules = None
-        sac_rules = charges['sac_rules']
-        print(f"SAC Rules: {sac_rules}")
-    try:
-        invoice_id = segments[invoice_id_rule['seg']][0][invoice_id_rule['idx']].strip()
-        print(f"Invoice ID: {invoice_id}")
-    except KeyError:
-        invoice_id = None
-        print("Invoice ID not found.")
-        confidence = 0.1
+    for penalty in penalties:
+        confidence = NO_INVOICE_DATE_CONFIDENCE if penalty is None else confidence - penalty
+    return confidence
+
+
+def _add_charge(rule, code: str, desc: str, amount: float, charges, other: list, warnings: list, penalties: list):
+    """
+    Put one classified charge line into its bucket; unmatched lines land in charges.other.
+    charges is an InvoiceCharges, or the batch's ChargeColumns when reconciling columnar.
+    """
+    bucket = BUCKET_INDEX.get(rule.bucket) if rule is not None else None
+    if bucket is None:
+        other.append({"code": code, "desc": desc, "amount": amount})
+        warnings.append(f"Other charge added: {desc} - {amount}")
+        penalties.append(0.1)
+        bucket = OTHER
+    elif bucket == OTHER:
+        other.append({"code": rule.label or code, "desc": desc, "amount": amount})
+    charges.add(bucket, to_cents(amount))
+
+
+# --- Rule groups. Each appends its warnings and confidence penalties to the lists it is given. ---
+
+def _invoice_id(plan, segments):
+    invoice_id = _read(segments, plan.invoice_id) if plan.invoice_id else None
+    if invoice_id is None:
         raise ValueError("Invoice ID not found.")
-        
-    if our_broker == segments['GS'][0][3].strip():
-        side = 'Buy'
-    else:
-        side = 'Sell'
-    print(f"Side: {side}")
-    source = { "type": "edi210", "doc_uri": "null"}
-    print(f"Source: {source}")
-    carrier = {"name": "null", "scac": "null"}
-    print(f"Carrier: {carrier}")
-    customer = {"name": "null", "account_id": "null"}
-    print(f"Customer: {customer}")
-    bol = segments.get(bol_rule[0]['seg'], [])
-    if len(bol) > 0:
-        bol = bol[0][bol_rule[0]['idx']].strip()
-    else:
-        bol = segments.get(bol_rule[1]['seg'], [])
-        if len(bol) > 0:
-            for item in bol:
-                bol = bol[0][bol_rule[1]['idx']].strip()
-                if item[1].strip() == bol_rule[1]['qual']:
-                    bol = bol[0][bol_rule[1]['idx']].strip()
-        else:
-            bol = "null"
-            warnings.append(f"{bol_rule[1]['seg']} not found.")
-            confidence -= 0.05
-    print(f"BOL: {bol}")
-    if segments.get(pro_rule['seg']) != "pro_rule_in_profile":
-        if segments.get(pro_rule['seg']): 
-            for pro_seg in segments[pro_rule['seg']]:
-                if pro_seg[1].strip() == pro_rule.get('qual', 'CN'):
-                    pro = pro_seg[pro_rule['idx']].strip()
-                    print(f"PRO: {pro}")
+    return invoice_id
+
+
+def _refs(plan, segments, warnings: list, penalties: list):
+    bol = None
+    for bol_rule in plan.bol:
+        bol = _read(segments, bol_rule)
+        if bol is not None:
+            break
+    if bol is None:
+        bol = "null"
+        if plan.bol:
+            warnings.append(_not_found(segments, plan.bol[-1]))
         else:
-            warnings.append(f"{pro_rule['seg']} not found.")
-            confidence -= 0.05
+            warnings.append("No bol rule defined in profile.")
+        penalties.append(0.05)
+
+    pro = "null"
+    if plan.pro is None:
+        warnings.append("No pro rule defined in profile.")
+        penalties.append(0.05)
+    elif plan.pro.seg in segments:
+        pro = _read(segments, plan.pro) or "null"
     else:
-        warnings.append(f"{pro_rule['seg']} not found.")
-    print(f"PRO: {pro}")
-    print(f"PO: {po}")
-    if segments.get(load_id_rule['seg']) != "load_id_rule_in_profile":
-        if segments.get(load_id_rule['seg']):
-            for load_id_seg in segments[load_id_rule['seg']]:
-                if load_id_seg[1].strip() == load_id_rule.get('qual', 'LO'):
-                    load_id = load_id_seg[pro_rule['idx']].strip()
-        else:
-            warnings.append(f"{load_id_rule['seg']} not found.")
-            confidence -= 0.05
+        warnings.append(f"{plan.pro.seg} not found.")
+        penalties.append(0.05)
+
+    load_id = "null"
+    if plan.load_id.seg in segments:
+        load_id = _read(segments, plan.load_id) or "null"
     else:
-        warnings.append(f"{load_id_rule['seg']} not found.")
-    print(f"Load ID: {load_id}")
-    if len(parties) == 0:
+        warnings.append(f"{plan.load_id.seg} not found.")
+        penalties.append(0.05)
+    return { "bol": bol, "pro": pro, "po": 'null', "load_id": load_id }
+
+
+def _parties(plan, segments, warnings: list, penalties: list):
+    party_values = {"ship_from": "null", "ship_to": "null", "bill_to": "null"}
+    if not plan.parties:
         warnings.append("No parties rules defined in profile.")
+    elif plan.party_seg not in segments:
+        warnings.append(f"{plan.party_seg} segment not found.")
+        penalties.append(0.05)
     else:
-        if segments.get(parties[0]['seg']) is None:
-            warnings.append(f"{parties[0]['seg']} segment not found.")
-            confidence -= 0.05
+        for target, rule in plan.parties:
+            value = _read(segments, rule)
+            if value is not None:
+                party_values[target] = value
+    return party_values
 
-        else:
-            for N1_seg in segments[parties[0]['seg']]:
-                if N1_seg[1] == ship_from_rule.get('qual', 'SH'):
-                    ship_from = N1_seg[ship_from_rule['nameIdx']].strip()
-                elif N1_seg[1] == ship_to_rule.get('qual',"CN"):
-                    ship_to = N1_seg[ship_to_rule['nameIdx']].strip()
-                elif N1_seg[1] == bill_to_rule.get('qual',"BT"):
-                    bill_to = N1_seg[bill_to_rule['nameIdx']].strip()
-    print(f"Ship From: {ship_from}")
-    print(f"Ship To: {ship_to}")
-    print(f"Bill To: {bill_to}")
-    if len(dates) == 0:
+
+def _dates(plan, segments, warnings: list, penalties: list):
+    date_values = {"pickup": "null", "delivery": "null"}
+    if not plan.dates:
         warnings.append("No dates rules defined in profile.")
+    elif plan.date_seg not in segments:
+        warnings.append(f"{plan.date_seg} segment not found.")
+        penalties.append(0.05)
     else:
-        if segments.get(dates[0]['seg']) is None:
-            warnings.append(f"{dates[0]['seg']} segment not found.")
-            confidence -= 0.05
+        for target, rule in plan.dates:
+            value = _read_date(segments, rule, warnings, penalties)
+            if value is not None:
+                date_values[target] = value
 
-        else:
-            for date in segments[dates[0]['seg']]:
-                if date[1] == pickup_date_rule.get('qual',"11"):
-                    pickup = date[2].strip()
-                elif date[1] == delivery_date_rule.get('qual',"70"):
-                    delivery = date[2].strip()
-    print(f"Pickup Date: {pickup}")
-    print(f"Delivery Date: {delivery}") 
-    try:
-        invoice_date = segments[invoice_date_rule['seg']][0][invoice_date_rule['idx']].strip()
-        print(f"Invoice Date: {invoice_date}")
-    except KeyError:
+    invoice_date = _read_date(segments, plan.invoice_date, warnings, penalties) if plan.invoice_date else None
+    if invoice_date is None:
         invoice_date = "null"
-        warnings.append(f"{invoice_date_rule['seg']} not found.")
-        confidence = 0.1
-        print("Invoice Date segment not found.")
-    if l1_rules:
-        existing_codes = []
-        compute_l1 = True
-        # print(l1_rules)
-        # print(segments['L1'])
-        if charges['strategy'] == "L1_only": 
-            try:
-                segments['L1']
-            except KeyError:
-                raise KeyError("L1 segment not found.")
-        elif charges['strategy'] == "L1_then_SAC":
-            compute_l1 = segments.get('L1', False)
-        if compute_l1:
-            for l1_rule in l1_rules:
-                print(f"L1 Rule: {l1_rule}")
-                mapto = l1_rule.get('mapTo','charges.defaultother').split('.')[-1]
-                print(f"MapTo: {mapto}")
-                contains = l1_rule.get('contains', [])
-                print(f"Contains: {contains}")
-                for l1_charge in segments['L1']:
-                    print(f"L1 Charge: {l1_charge}")
-                    if any(c in l1_charge for c in contains):
-                        if mapto == "base_freight":
-                            base_freight += float(l1_charge[2].strip())
-                            existing_codes.append(l1_charge[5].strip())
-                            for i, d in enumerate(other):
-                                if d['code'] == l1_charge[5].strip():
-                                    other.pop(i)
-                            print(f"Base Freight updated: {base_freight}")
-                        elif mapto == "fuel_surcharge":
-                            fuel_surcharge += float(l1_charge[2].strip())
-                            existing_codes.append(l1_charge[5].strip())
-                            for i, d in enumerate(other):
-                                if d['code'] == l1_charge[5].strip():
-                                    other.pop(i)
-                            print(f"Fuel Surcharge updated: {fuel_surcharge}")
-                        elif mapto == "detention":
-                            detention += float(l1_charge[2].strip())
-                            existing_codes.append(l1_charge[5].strip())
-                            for i, d in enumerate(other):
-                                if d['code'] == l1_charge[5].strip():
-                                    other.pop(i)
-                            print(f"Detention updated: {detention}")
-                    else:
-                        if mapto == "defaultother":
-                            pass
-                        if l1_charge[5].strip() not in existing_codes:
-                            other.append({
-                                "code": l1_charge[5].strip(),
-                                "desc": l1_charge[-1].strip(),
-                                "amount": float(l1_charge[2].strip())
-                            })
-                            existing_codes.append(l1_charge[5].strip())
-                            warnings.append(f"Other charge added: {l1_charge[-1].strip()} - {l1_charge[2].strip()}")
-                            confidence -= 0.1
+        warnings.append(_not_found(segments, plan.invoice_date) if plan.invoice_date else "invoice_date not found.")
+        penalties.append(None)
+    return { "invoice": invoice_date, "pickup": date_values["pickup"], "delivery": date_values["delivery"] }
+
+
+def _charges(plan, segments, warnings: list, penalties: list, charge_columns=None, log=None):
+    """
+    Classify L1/SAC charge lines and check them against the L3 total.
+    Returns (charges, total, total_cents); log is the partner logger when debug tracing is on.
+    """
+    classifier = plan.charge_classifier
+    charges = charge_columns if charge_columns is not None else InvoiceCharges()
+    other = []
+    if plan.use_l1 and plan.l1_rules:
+        if plan.strategy == "L1_only" and 'L1' not in segments:
+            raise KeyError("L1 segment not found.")
+        if 'L1' in segments:
+            for l1_charge in segments['L1']:
+                desc = l1_charge[-1].strip()
+                code = l1_charge[5].strip() if len(l1_charge) > 5 else desc
+                amount = float(l1_charge[2].strip())
+                rule = classifier.classify_l1(desc)
+                if log is not None:
+                    log.debug("L1 charge %s -> %s", l1_charge, rule.bucket if rule else None)
+                _add_charge(rule, code, desc, amount, charges, other, warnings, penalties)
         else:
             warnings.append("L1 segment not found.")
-            confidence -= 0.1
-    if sac_rules:
-        existing_codes = []
-        compute_sac = True
-        if charges['strategy'] == "SAC_only": 
-            try:
-                segments['SAC']
-            except KeyError:
-                raise KeyError("SAC segment not found.")
-        elif charges['strategy'] == "L1_then_SAC":
-            compute_sac = segments.get('SAC', False)
-        if compute_sac:
-            for sac_rule in sac_rules:
-                print(f"SAC_Rule: {sac_rule}")
-                mapto = sac_rule.get('mapTo','charges.defaultother').split('.')[-1]
-                print(f"MapTo: {mapto}")
-                codeIn = sac_rule.get('codeIn', [])
-                print(f"codeIn: {codeIn}")
-                for sac_charge in segments['SAC']:
-                    # print(f"SAC Charge: {SAc_charge}")
-                    if any(c in sac_charge for c in codeIn):
-                        if mapto == "fuel_surcharge":
-                            fuel_surcharge += float(sac_charge[5].strip())
-                            existing_codes.append(sac_charge[2].strip())
-                            print(f"fuel_sur_code added: {existing_codes}")
-                            for i, d in enumerate(other):
-                                if d['code'] == sac_charge[2].strip():
-                                    other.pop(i)
-                            # print(f"Base Freight updated: {base_freight}")
-                        elif mapto == "detention":
-                            detention += float(sac_charge[5].strip())
-                            existing_codes.append(sac_charge[2].strip())
-                            print(f"detention_code added: {existing_codes}")
-                            for i, d in enumerate(other):
-                                if d['code'] == sac_charge[2].strip():
-                                    other.pop(i)
-                            # print(f"Fuel Surcharge updated: {fuel_surcharge}")
-                    else:
-                        if mapto == "defaultother":
-                            pass
-                        if sac_charge[2].strip() not in existing_codes:
-                            other.append({
-                                "code": sac_charge[2].strip(),
-                                "desc": sac_charge[-1].strip(),
-                                "amount": float(sac_charge[5].strip())
-                            })
-                            existing_codes.append(sac_charge[2].strip())
-                            print(f"sac_other_code added: {existing_codes}")
-                            warnings.append(f"Other charge added: {sac_charge[-1].strip()} - {sac_charge[2].strip()}")
-                            confidence -= 0.1
+            penalties.append(0.1)
+    if plan.use_sac and plan.sac_rules:
+        if plan.strategy == "SAC_only" and 'SAC' not in segments:
+            raise KeyError("SAC segment not found.")
+        if 'SAC' in segments:
+            for sac_charge in segments['SAC']:
+                code = sac_charge[2].strip()
+                desc = sac_charge[-1].strip()
+                amount = float(sac_charge[5].strip())
+                rule = classifier.classify_sac(code)
+                if log is not None:
+                    log.debug("SAC charge %s -> %s", sac_charge, rule.bucket if rule else None)
+                _add_charge(rule, code, desc, amount, charges, other, warnings, penalties)
         else:
             warnings.append("SAC segment not found.")
-            confidence -= 0.1
-
-    print(f"Base Freight: {base_freight}")
-    print(f"Fuel Surcharge: {fuel_surcharge}")
-    print(f"Detention: {detention}")
-    print(f"Other Charges: {other}")
-    sum_total = 0.00
-    sum_total += base_freight
-    sum_total += fuel_surcharge
-    sum_total += detention
-    for oth in other:
-        print(f"Adding Other Charge: {oth['desc']} - {oth['amount']}")
-        sum_total += oth['amount']
-    print(f"Sum Total from Charges: {sum_total}")
-
-    if segments.get(total_rules['seg']): 
-        total = segments[total_rules['seg']][0][total_rules['idx']].strip()
-        print(f"Total from EDI: {total}")
+            penalties.append(0.1)
+    total = _read(segments, plan.total) if plan.total else None
+    total_cents = None if total is None else to_cents(total)
+    if charge_columns is not None:
+        # Placeholders until ChargeColumns.reconcile() runs over the whole batch.
+        base_freight = fuel_surcharge = detention = 0.0
     else:
-        total = sum_total
+        # Sum and compare in integer cents: float sums flag valid invoices on rounding alone.
+        base_freight = charges.cents[0] / 100
+        fuel_surcharge = charges.cents[1] / 100
+        detention = charges.cents[2] / 100
+        sum_cents = charges.total()
+        sum_total = sum_cents / 100
+    if total is None:
+        if charge_columns is None:
+            total = sum_total
         warnings.append("Total segment not found.")
-        confidence -= 0.15
-
-    if sum_total != float(total):
+        penalties.append(0.15)
+    elif charge_columns is None and abs(sum_cents - total_cents) > get_total_tolerance():
         warnings.append(f"Total from EDI {total} does not match sum of charges {sum_total}.")
-        confidence -= 0.1
-    currency = currency_rules['default']
-    print(f"Currency: {currency}")
-    golden_invoice = {
+        penalties.append(0.1)
+    charges = {
+        "base_freight": base_freight,
+        "fuel_surcharge": fuel_surcharge,
+        "detention": detention,
+        "other": other
+    }
+    return charges, total, total_cents
+
+
+def run_rule_group(group: str, plan, segments):
+    """
+    Run one rule group on its own: (values, warnings, penalties), where values holds
+    the golden invoice keys the group fills. Used to re-extract only the groups
+    whose rules changed (see incremental.py); the order of RULE_GROUPS is the order
+    extract_elements_with_rules runs them in.
+        header   invoice_id, bol, pro, load_id   -> invoice_id, refs
+        parties  parties                         -> parties
+        dates    dates, invoice_date             -> dates
+        charges  charges, total, currency        -> charges, total, currency
+    """
+    warnings = []
+    penalties = []
+    if group == "header":
+        values = {"invoice_id": _invoice_id(plan, segments), "refs": _refs(plan, segments, warnings, penalties)}
+    elif group == "parties":
+        values = {"parties": _parties(plan, segments, warnings, penalties)}
+    elif group == "dates":
+        values = {"dates": _dates(plan, segments, warnings, penalties)}
+    elif group == "charges":
+        charges, total, _ = _charges(plan, segments, warnings, penalties)
+        values = {"charges": charges, "total": total, "currency": plan.currency}
+    else:
+        raise ValueError(f"Unknown rule group: {group}")
+    return values, warnings, penalties
+
+
+def golden_invoice(invoice_id, side: str, refs: dict, parties: dict, dates: dict, currency: str, charges: dict,
+                   total, partner: str, edi_version: str, confidence: float):
+    return {
         "invoice_id": invoice_id,
         "side": side,
         "source": { "type": "edi210", "doc_uri": 'null' },
         "carrier": { "name": 'null', "scac": 'null' },
         "customer": { "name": 'null', "account_id": 'null' },
-        "refs": { "bol": bol, "pro": pro, "po": 'null', "load_id": load_id },
-        "parties": { "ship_from": ship_from, "ship_to": ship_to, "bill_to": bill_to },
-        "dates": { "invoice": invoice_date, "pickup": pickup, "delivery": delivery },
+        "refs": refs,
+        "parties": parties,
+        "dates": dates,
         "currency": currency,
-        "charges": {
-        "base_freight": base_freight,
-        "fuel_surcharge": fuel_surcharge,
-        "detention": detention,
-        "other": other
-        },
+        "charges": charges,
         "total": total,
         "metadata": {
         "golden_schema_version": "0.1",
@@ -342,14 +275,87 @@ def extract_elements_with_rules(profile: dict, segments: dict, partner: str, edi
         },
         "evidence": { "doc_uri": 'null', "attachments": [] }
     }
-    print(json.dumps(golden_invoice, indent=2))
-    print("Warnings:")
-    for warn in warnings:
-        print(f"- {warn}")
-    return golden_invoice, warnings
 
 
+def _projected_invoice(fields, invoice_id, side: str, refs: dict, parties: dict, dates: dict, currency: str,
+                       charges: dict, total, partner: str, edi_version: str, confidence: float):
+    """ golden_invoice with only the keys in fields; the other sub-objects are never built. """
+    projected = {}
+    if "invoice_id" in fields:
+        projected["invoice_id"] = invoice_id
+    if "side" in fields:
+        projected["side"] = side
+    if "source" in fields:
+        projected["source"] = { "type": "edi210", "doc_uri": 'null' }
+    if "carrier" in fields:
+        projected["carrier"] = { "name": 'null', "scac": 'null' }
+    if "customer" in fields:
+        projected["customer"] = { "name": 'null', "account_id": 'null' }
+    if "refs" in fields:
+        projected["refs"] = refs
+    if "parties" in fields:
+        projected["parties"] = parties
+    if "dates" in fields:
+        projected["dates"] = dates
+    if "currency" in fields:
+        projected["currency"] = currency
+    if "charges" in fields:
+        projected["charges"] = charges
+    if "total" in fields:
+        projected["total"] = total
+    if "metadata" in fields:
+        projected["metadata"] = { "golden_schema_version": "0.1", "parser_version": "1.0.0",
+                                  "edi_version": edi_version, "trading_partner": partner,
+                                  "confidence": confidence }
+    if "evidence" in fields:
+        projected["evidence"] = { "doc_uri": 'null', "attachments": [] }
+    return projected
 
-        
-    
-    
+
+def invoice_side(segments, our_broker: str):
+    """ 'Buy' when the GS receiver is the tenant's broker identity, otherwise 'Sell'. """
+    return 'Buy' if our_broker == segments.first('GS')[3].strip() else 'Sell'
+
+
+def extract_elements_with_rules(plan, segments, partner: str, edi_version: str, charge_columns=None,
+                                projection=None, our_broker: str = DEFAULT_BROKER_ID):
+    """
+    Run a compiled extraction plan over one transaction set and build the golden invoice.
+    With charge_columns (a reconcile.ChargeColumns), charge lines are appended to the
+    batch's columns instead; bucket amounts and the total check are filled in when the
+    batch is reconciled.
+    With a projection (projection.compile_projection), only the rule groups behind the
+    requested fields run and the invoice holds just those top-level keys.
+    our_broker is the tenant's broker ID, which decides side.
+    """
+    log = get_plan_logger(plan)
+    debug = log.isEnabledFor(logging.DEBUG)
+    warnings = []
+    penalties = []
+
+    invoice_id = _invoice_id(plan, segments)
+    side = invoice_side(segments, our_broker)
+
+    refs = parties = dates = charges = total = total_cents = None
+    if projection is None or projection.refs:
+        refs = _refs(plan, segments, warnings, penalties)
+    if projection is None or projection.parties:
+        parties = _parties(plan, segments, warnings, penalties)
+    if projection is None or projection.dates:
+        dates = _dates(plan, segments, warnings, penalties)
+    if projection is None or projection.charges:
+        charges, total, total_cents = _charges(plan, segments, warnings, penalties, charge_columns,
+                                               log if debug else None)
+    confidence = fold_confidence(penalties)
+    if projection is None:
+        golden = golden_invoice(invoice_id, side, refs, parties, dates, plan.currency, charges, total,
+                                partner, edi_version, confidence)
+    else:
+        golden = _projected_invoice(projection.fields, invoice_id, side, refs, parties, dates, plan.currency,
+                                    charges, total, partner, edi_version, confidence)
+    if charge_columns is not None:
+        charge_columns.defer(golden, warnings, total_cents)
+    if debug:
+        log.debug("Golden invoice %s: %s", invoice_id, LazyJson(golden))
+        log.debug("Warnings for %s: %s", invoice_id, warnings)
+    return golden, warnings
@@ -0,0 +1,410 @@
+"""
+Incremental re-extraction after a partner profile changes.
+
+    python parser/incremental.py record ARCHIVE_DIR [MORE_DIRS_OR_FILES ...] --store extractions.sqlite
+    python parser/incremental.py reextract --store extractions.sqlite [--partner CARRIERX] --report changes.json
+
+record parses each file once and keeps, per transaction set, its segments together
+with their SegmentIndex offsets (so nothing is tokenized again), the fingerprint of
+the plan that extracted it, and for every rule group (header, parties, dates,
+charges; see extract_elements_with_rules.RULE_GROUPS) a fingerprint of the group's
+rules plus the values, warnings and confidence penalties it produced.
+
+reextract resolves each stored set against the current profiles. Sets whose plan is
+unchanged are skipped; otherwise only the rule groups whose fingerprint differs run
+again, on the stored segments, and the golden invoice is reassembled from the new and
+the kept group outputs. The store is updated in place and the change report lists,
+per invoice, the groups that ran and every field that changed.
+
+A store belongs to one tenant (--tenant, the default tenant otherwise; tenants come
+from TENANTS_CONFIG): its profile namespace and broker ID are used for both commands.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import sys
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from backfill import iter_input_files
+from edi_logging import LOGGER_NAME, configure_logging
+from extract_elements_with_rules import (DEFAULT_BROKER_ID, RULE_GROUPS, fold_confidence, golden_invoice,
+                                         invoice_side, run_rule_group)
+from loader import load_profiles
+from mapper import iter_prepared
+from segment_index import SegmentIndex
+from tenants import as_tenant, configure_tenants
+from tokenizer import ENCODING, as_buffer, sniff_delimiters
+
+logger = logging.getLogger(f"{LOGGER_NAME}.incremental")
+
+# ExtractionPlan fields each rule group reads. A group is re-run when any of them changes.
+GROUP_FIELDS = {
+    "header": ("invoice_id", "bol", "pro", "load_id"),
+    "parties": ("party_seg", "parties"),
+    "dates": ("date_seg", "dates", "invoice_date"),
+    "charges": ("strategy", "use_l1", "use_sac", "l1_rules", "sac_rules", "total", "fallback_to_sum", "currency"),
+}
+
+_GROUP_FINGERPRINTS = {}
+
+
+def group_fingerprints(plan):
+    """ {group: hash of the plan fields it reads}, memoized per plan fingerprint. """
+    fingerprints = _GROUP_FINGERPRINTS.get(plan.fingerprint)
+    if fingerprints is None:
+        fingerprints = {
+            group: hashlib.sha256(repr(tuple(getattr(plan, name) for name in fields)).encode("utf-8")).hexdigest()
+            for group, fields in GROUP_FIELDS.items()
+        }
+        _GROUP_FINGERPRINTS[plan.fingerprint] = fingerprints
+    return fingerprints
+
+
+def extract_groups(plan, segments):
+    """ Run every rule group: {group: {fingerprint, values, warnings, penalties}}. """
+    fingerprints = group_fingerprints(plan)
+    groups = {}
+    for group in RULE_GROUPS:
+        values, warnings, penalties = run_rule_group(group, plan, segments)
+        groups[group] = {"fingerprint": fingerprints[group], "values": values,
+                         "warnings": warnings, "penalties": penalties}
+    return groups
+
+
+def assemble(groups: dict, segments, partner: str, edi_version: str, our_broker: str = DEFAULT_BROKER_ID):
+    """
+    (golden_invoice, warnings) from stored group outputs, the same as
+    extract_elements_with_rules gives for a full extraction.
+    """
+    values = {}
+    warnings = []
+    penalties = []
+    for group in RULE_GROUPS:
+        output = groups[group]
+        values.update(output["values"])
+        warnings.extend(output["warnings"])
+        penalties.extend(output["penalties"])
+    invoice = golden_invoice(values["invoice_id"], invoice_side(segments, our_broker), values["refs"],
+                             values["parties"], values["dates"], values["currency"], values["charges"],
+                             values["total"], partner, edi_version, fold_confidence(penalties))
+    return invoice, warnings
+
+
+def diff_values(old, new, path: str = ""):
+    """ {dotted.path: {"old": ..., "new": ...}} for every leaf that differs; lists compare whole. """
+    changes = {}
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in list(old) + [key for key in new if key not in old]:
+            changes.update(diff_values(old.get(key), new.get(key), f"{path}.{key}" if path else key))
+    elif old != new:
+        changes[path] = {"old": old, "new": new}
+    return changes
+
+
+def _compact_segments(segments: SegmentIndex, segment_delim: str):
+    """
+    Copy one transaction set's segments out of the interchange, with what
+    SegmentIndex.restore needs to index them again without reading them:
+    (bytes, ids, offsets, qualifier entries).
+    """
+    buffer = segments.buffer
+    terminator = segment_delim.encode(ENCODING)
+    parts = []
+    offsets = array('Q')
+    position = 0
+    for row in range(len(segments)):
+        part = buffer[segments.offsets[2 * row]:segments.offsets[2 * row + 1]]
+        if isinstance(part, str):
+            part = part.encode(ENCODING)
+        parts.append(part)
+        offsets.append(position)
+        offsets.append(position + len(part))
+        position += len(part) + len(terminator)
+    qualified = [(seg_id, qual, row) for (seg_id, qual), row in segments.by_qual.items()]
+    return terminator.join(parts), ",".join(segments.ids), offsets.tobytes(), json.dumps(qualified)
+
+
+def _restore_segments(data: bytes, ids: str, offsets: bytes, qualified: str, element_delim: str):
+    spans = array('Q')
+    spans.frombytes(offsets)
+    return SegmentIndex.restore(data, element_delim, ids.split(","), spans, json.loads(qualified))
+
+
+class ExtractionStore:
+    """
+    SQLite (WAL) table of stored transaction sets, keyed by a hash of their segments,
+    so recording the same file twice keeps one row per set.
+    The store belongs to the tenant it was first opened for (a Tenant or tenant ID,
+    None for the default tenant); opening it for another raises ValueError.
+    """
+
+    def __init__(self, path: str, tenant=None):
+        self.path = path
+        self.tenant = as_tenant(tenant)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('tenant', ?)", (self.tenant.tenant_id,))
+        owner = self._db.execute("SELECT value FROM meta WHERE name = 'tenant'").fetchone()[0]
+        if owner != self.tenant.tenant_id:
+            self._db.close()
+            raise ValueError(f"{path} holds tenant '{owner}' transaction sets, not '{self.tenant.tenant_id}'")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transaction_sets ("
+            " key TEXT PRIMARY KEY, source TEXT, partner TEXT NOT NULL, edi_version TEXT NOT NULL,"
+            " isa_sender TEXT NOT NULL, element_delim TEXT NOT NULL, segments BLOB NOT NULL,"
+            " segment_ids TEXT NOT NULL, offsets BLOB NOT NULL, qualified TEXT NOT NULL,"
+            " plan_fingerprint TEXT NOT NULL, groups TEXT NOT NULL, invoice TEXT NOT NULL,"
+            " warnings TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS transaction_sets_envelope"
+            " ON transaction_sets (partner, edi_version, isa_sender, plan_fingerprint)"
+        )
+        self._db.commit()
+
+    def record(self, edi_text, source: str = None):
+        """ Extract every transaction set of an interchange and store it. Returns the number stored. """
+        rows = []
+        now = time.time()
+        edi_text = as_buffer(edi_text)
+        segment_delim = sniff_delimiters(edi_text).segment
+        for plan, segments, partner, edi_version in iter_prepared(edi_text, self.tenant):
+            groups = extract_groups(plan, segments)
+            invoice, warnings = assemble(groups, segments, partner, edi_version, self.tenant.broker_id)
+            data, ids, offsets, qualified = _compact_segments(segments, segment_delim)
+            isa = segments.first('ISA')
+            rows.append((
+                hashlib.sha256(data).hexdigest(), source, partner, edi_version,
+                isa[6].strip() if len(isa) > 6 else "", segments.element_delim, data, ids, offsets, qualified,
+                plan.fingerprint, json.dumps(groups), json.dumps(invoice), json.dumps(warnings), now,
+            ))
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO transaction_sets VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                                 rows)
+        return len(rows)
+
+    def envelopes(self, partner: str = None, edi_version: str = None):
+        """ (partner, edi_version, isa_sender, plan_fingerprint, count) for every stored combination. """
+        query = ("SELECT partner, edi_version, isa_sender, plan_fingerprint, COUNT(*) FROM transaction_sets"
+                 " WHERE (? IS NULL OR partner = ?) AND (? IS NULL OR edi_version = ?)"
+                 " GROUP BY partner, edi_version, isa_sender, plan_fingerprint")
+        return self._db.execute(query, (partner, partner, edi_version, edi_version)).fetchall()
+
+    def iter_rows(self, partner: str, edi_version: str, isa_sender: str, plan_fingerprint: str,
+                  page_size: int = 500):
+        """
+        Stored sets of one envelope extracted with plan_fingerprint, in rowid order,
+        a page at a time so updates can be written in between.
+        """
+        query = ("SELECT rowid, key, element_delim, segments, segment_ids, offsets, qualified, groups"
+                 " FROM transaction_sets WHERE partner = ? AND edi_version = ? AND isa_sender = ?"
+                 " AND plan_fingerprint = ? AND rowid > ? ORDER BY rowid LIMIT ?")
+        last = 0
+        while True:
+            page = self._db.execute(query, (partner, edi_version, isa_sender, plan_fingerprint,
+                                            last, page_size)).fetchall()
+            if not page:
+                return
+            yield from page
+            last = page[-1][0]
+
+    def update(self, updates: list):
+        """ Write (plan_fingerprint, groups, invoice, warnings, key) rows in one transaction. """
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "UPDATE transaction_sets SET plan_fingerprint = ?, groups = ?, invoice = ?, warnings = ?,"
+                " updated = ? WHERE key = ?",
+                [(fingerprint, groups, invoice, warnings, now, key)
+                 for fingerprint, groups, invoice, warnings, key in updates])
+
+    def refresh_fingerprint(self, partner: str, edi_version: str, isa_sender: str, old: str, new: str):
+        """ Mark an envelope's sets as extracted with plan new, when none of its rule groups changed. """
+        with self._db:
+            self._db.execute(
+                "UPDATE transaction_sets SET plan_fingerprint = ? WHERE partner = ? AND edi_version = ?"
+                " AND isa_sender = ? AND plan_fingerprint = ?", (new, partner, edi_version, isa_sender, old))
+
+    def invoice(self, key: str):
+        """ Stored (golden_invoice, warnings) for a set key, or None. """
+        row = self._db.execute("SELECT invoice, warnings FROM transaction_sets WHERE key = ?", (key,)).fetchone()
+        return None if row is None else (json.loads(row[0]), json.loads(row[1]))
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM transaction_sets").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+def record_files(store: ExtractionStore, inputs):
+    """ Record every EDI file under inputs. Returns a report dict. """
+    report = {"files": 0, "failed": 0, "transaction_sets": 0}
+    started = time.perf_counter()
+    for path in iter_input_files(inputs):
+        try:
+            with open(path, "rb") as handle:
+                if os.fstat(handle.fileno()).st_size == 0:
+                    raise ValueError("empty file")
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    report["transaction_sets"] += store.record(buffer, str(path))
+        except Exception as exc:
+            report["failed"] += 1
+            logger.warning("Failed to record %s: %s: %s", path, type(exc).__name__, exc)
+        report["files"] += 1
+    elapsed = time.perf_counter() - started
+    report["elapsed_sec"] = elapsed
+    report["sets_per_sec"] = report["transaction_sets"] / elapsed if elapsed else 0.0
+    return report
+
+
+def _reextract_envelope(store, report, plan, envelope, dry_run: bool, batch_size: int):
+    partner, edi_version, isa_sender, plan_fingerprint, _ = envelope
+    fingerprints = group_fingerprints(plan)
+    updates = []
+    for _, key, element_delim, data, ids, offsets, qualified, groups_json in store.iter_rows(
+            partner, edi_version, isa_sender, plan_fingerprint):
+        try:
+            groups = json.loads(groups_json)
+            stale = [group for group in RULE_GROUPS if groups[group]["fingerprint"] != fingerprints[group]]
+            segments = _restore_segments(data, ids, offsets, qualified, element_delim)
+            old_groups = {group: groups[group] for group in stale}
+            for group in stale:
+                values, warnings, penalties = run_rule_group(group, plan, segments)
+                groups[group] = {"fingerprint": fingerprints[group], "values": values,
+                                 "warnings": warnings, "penalties": penalties}
+                report["groups_run"][group] += 1
+            invoice, warnings = assemble(groups, segments, partner, edi_version, store.tenant.broker_id)
+        except Exception as exc:
+            report["failed"] += 1
+            report["errors"].append({"key": key, "partner": partner, "edi_version": edi_version,
+                                     "error": f"{type(exc).__name__}: {exc}"})
+            continue
+        report["reextracted"] += 1
+        # Unchanged groups keep their outputs, so only the re-run ones (and confidence) can differ.
+        changes = {}
+        old_warnings = []
+        old_penalties = []
+        new_penalties = []
+        for group in stale:
+            changes.update(diff_values(old_groups[group]["values"], groups[group]["values"]))
+            old_warnings.extend(old_groups[group]["warnings"])
+            old_penalties.extend(old_groups[group]["penalties"])
+            new_penalties.extend(groups[group]["penalties"])
+        if old_penalties != new_penalties:
+            old_confidence = fold_confidence(
+                [p for group in RULE_GROUPS
+                 for p in (old_groups[group] if group in old_groups else groups[group])["penalties"]])
+            changes["metadata.confidence"] = {"old": old_confidence, "new": invoice["metadata"]["confidence"]}
+        new_warnings = [w for group in stale for w in groups[group]["warnings"]]
+        if changes or old_warnings != new_warnings:
+            report["changed"] += 1
+            report["changes"].append({
+                "key": key,
+                "invoice_id": invoice["invoice_id"],
+                "partner": partner,
+                "edi_version": edi_version,
+                "groups": stale,
+                "fields": changes,
+                "warnings_added": [w for w in new_warnings if w not in old_warnings],
+                "warnings_removed": [w for w in old_warnings if w not in new_warnings],
+            })
+        updates.append((plan.fingerprint, json.dumps(groups), json.dumps(invoice), json.dumps(warnings), key))
+        if len(updates) >= batch_size:
+            if not dry_run:
+                store.update(updates)
+            updates = []
+    if updates and not dry_run:
+        store.update(updates)
+
+
+def reextract(store: ExtractionStore, partner: str = None, edi_version: str = None, dry_run: bool = False,
+              batch_size: int = 500):
+    """
+    Bring stored invoices up to date with the store tenant's current profiles,
+    re-running only the rule groups whose rules changed. Returns a report with counts,
+    the groups that ran and, per changed invoice, the fields that changed.
+    Sets are grouped by envelope (partner, version, ISA sender) and the plan that
+    extracted them, so sets whose plan is still current are never read.
+    """
+    resolver = store.tenant.resolver()
+    report = {"checked": 0, "current": 0, "refreshed": 0, "reextracted": 0, "changed": 0, "failed": 0,
+              "groups_run": Counter(), "changes": [], "errors": []}
+    started = time.perf_counter()
+    for envelope in store.envelopes(partner, edi_version):
+        env_partner, env_version, isa_sender, plan_fingerprint, count = envelope
+        report["checked"] += count
+        try:
+            plan, _ = resolver.resolve(isa_sender, env_partner, env_version)
+        except ValueError as exc:
+            report["failed"] += count
+            report["errors"].append({"partner": env_partner, "edi_version": env_version, "error": str(exc)})
+            continue
+        if plan.fingerprint == plan_fingerprint:
+            report["current"] += count
+            continue
+        # Sets of one envelope and plan share their group fingerprints; peek at one row for them.
+        first = next(store.iter_rows(env_partner, env_version, isa_sender, plan_fingerprint, page_size=1))
+        stored = {group: output["fingerprint"] for group, output in json.loads(first[-1]).items()}
+        if stored == group_fingerprints(plan):
+            # Only profile metadata changed (version, envelope detection): the outputs stand.
+            report["refreshed"] += count
+            if not dry_run:
+                store.refresh_fingerprint(env_partner, env_version, isa_sender, plan_fingerprint, plan.fingerprint)
+            continue
+        _reextract_envelope(store, report, plan, envelope, dry_run, batch_size)
+    elapsed = time.perf_counter() - started
+    report["groups_run"] = dict(report["groups_run"])
+    report["elapsed_sec"] = elapsed
+    report["sets_per_sec"] = report["checked"] / elapsed if elapsed else 0.0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="parse files and store their transaction sets")
+    record.add_argument("inputs", nargs="+", help="EDI files or directories to search recursively")
+    update = commands.add_parser("reextract", help="re-run changed rule groups on stored transaction sets")
+    update.add_argument("--partner", help="only this GS sender")
+    update.add_argument("--edi-version", help="only this GS08 version")
+    update.add_argument("--dry-run", action="store_true", help="report changes without writing them")
+    for command in (record, update):
+        command.add_argument("--store", required=True, help="SQLite file holding the stored transaction sets")
+        command.add_argument("--profiles", help="profiles directory (default: PROFILES_PATH or profiles)")
+        command.add_argument("--report", help="also write the report as JSON here")
+        command.add_argument("--tenant", help="tenant the store belongs to (default: the default tenant)")
+    args = parser.parse_args(argv)
+
+    configure_logging(os.environ.get("EDI_LOG_LEVEL", "INFO"))
+    load_profiles(args.profiles)
+    configure_tenants()
+    store = ExtractionStore(args.store, args.tenant)
+    try:
+        if args.command == "record":
+            report = record_files(store, args.inputs)
+            print(f"files {report['files']} (failed {report['failed']})  transaction sets "
+                  f"{report['transaction_sets']}  {report['elapsed_sec']:.1f} s", file=sys.stderr)
+        else:
+            report = reextract(store, args.partner, args.edi_version, args.dry_run)
+            print(f"checked {report['checked']}  current {report['current']}  re-extracted "
+                  f"{report['reextracted']} (changed {report['changed']}, groups {report['groups_run']})  "
+                  f"failed {report['failed']}  {report['elapsed_sec']:.1f} s", file=sys.stderr)
+    finally:
+        store.close()
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
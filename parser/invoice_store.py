@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from tenants import DEFAULT_TENANT
+
+# --- Embedded golden-invoice store (SQLite, WAL) ---
+# One row per stored invoice: the invoice and its warnings as JSON, plus indexed
+# columns for the fields matching looks up. "null" placeholders from the extractor
+# are stored as SQL NULL so they never match each other. Rows belong to a tenant,
+# and duplicates are only looked for among the same tenant's invoices.
+
+_INVOICE_STORE = None
+
+ON_DUPLICATE = ("skip", "replace", "keep")
+# Lookup keys -> indexed column.
+LOOKUP_COLUMNS = {
+    "invoice_id": "invoice_id",
+    "bol": "bol",
+    "pro": "pro",
+    "load_id": "load_id",
+    "trading_partner": "trading_partner",
+    "tenant": "tenant",
+}
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS invoices ("
+    " id INTEGER PRIMARY KEY, tenant TEXT NOT NULL DEFAULT 'default', invoice_id TEXT, trading_partner TEXT,"
+    " edi_version TEXT, side TEXT,"
+    " bol TEXT, pro TEXT, load_id TEXT, invoice_date TEXT, total TEXT, currency TEXT, confidence REAL,"
+    " content_hash TEXT NOT NULL, source TEXT, batch INTEGER, invoice TEXT NOT NULL, warnings TEXT NOT NULL,"
+    " created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS invoices_invoice_id ON invoices (invoice_id)",
+    "CREATE INDEX IF NOT EXISTS invoices_tenant_invoice ON invoices (tenant, trading_partner, invoice_id)",
+    "CREATE INDEX IF NOT EXISTS invoices_bol ON invoices (bol)",
+    "CREATE INDEX IF NOT EXISTS invoices_pro ON invoices (pro)",
+    "CREATE INDEX IF NOT EXISTS invoices_load_id ON invoices (load_id)",
+    "CREATE INDEX IF NOT EXISTS invoices_batch ON invoices (batch)",
+)
+_COLUMNS = ("tenant", "invoice_id", "trading_partner", "edi_version", "side", "bol", "pro", "load_id", "invoice_date",
+            "total", "currency", "confidence", "content_hash", "source", "batch", "invoice", "warnings", "created")
+_INSERT = f"INSERT INTO invoices ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+_RECORD = "SELECT id, tenant, source, created, invoice, warnings FROM invoices"
+# Stores created before tenants: every existing row belongs to the default tenant.
+_MIGRATIONS = (
+    "ALTER TABLE invoices ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'",
+    "DROP INDEX IF EXISTS invoices_partner_invoice",
+)
+
+
+def _value(value):
+    """ Indexed column value: extractor placeholders ("null", "") become NULL. """
+    if value is None or value == "null" or value == "":
+        return None
+    return str(value)
+
+
+def _record(row):
+    row_id, tenant, source, created, invoice, warnings = row
+    return {"id": row_id, "tenant": tenant, "source": source, "created": created,
+            "invoice": json.loads(invoice), "warnings": json.loads(warnings)}
+
+
+class InvoiceStore:
+    """
+    Golden invoices in SQLite (WAL), indexed on invoice_id, refs.bol, refs.pro,
+    refs.load_id and metadata.trading_partner, per tenant.
+
+    insert() writes a parse result in transactions of batch_size rows and checks each
+    invoice against the tenant's stored ones with the same trading partner and invoice_id:
+    an exact re-send has the same content hash, a revision does not. on_duplicate
+    decides what happens to them: "skip" drops exact re-sends and stores revisions,
+    "replace" stores the new invoice in place of the earlier ones, "keep" stores
+    everything. Duplicates are always reported.
+    """
+
+    def __init__(self, path: str, on_duplicate: str = "skip", batch_size: int = 1000):
+        if on_duplicate not in ON_DUPLICATE:
+            raise ValueError(f"Unknown on_duplicate policy: {on_duplicate}")
+        self.path = path
+        self.on_duplicate = on_duplicate
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(invoices)")}
+        if columns and "tenant" not in columns:
+            for statement in _MIGRATIONS:
+                self._db.execute(statement)
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+        self.inserted = 0
+        self.exact_duplicates = 0
+        self.revisions = 0
+
+    def insert(self, invoices: list, warnings: list = None, sources=None, on_duplicate: str = None,
+               batch: int = None, tenant: str = DEFAULT_TENANT):
+        """
+        Store a parse result for tenant: invoices and warnings as returned by parse_invoice,
+        sources either one string for all of them or one per invoice.
+        Returns {"inserted", "skipped", "replaced", "duplicates": [...]}.
+        """
+        on_duplicate = on_duplicate or self.on_duplicate
+        if on_duplicate not in ON_DUPLICATE:
+            raise ValueError(f"Unknown on_duplicate policy: {on_duplicate}")
+        if warnings is None:
+            warnings = [[] for _ in invoices]
+        if sources is None or isinstance(sources, str):
+            sources = [sources] * len(invoices)
+        report = {"inserted": 0, "skipped": 0, "replaced": 0, "duplicates": []}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(invoices), self.batch_size):
+                stop = start + self.batch_size
+                with self._db:
+                    for invoice, invoice_warnings, source in zip(invoices[start:stop], warnings[start:stop],
+                                                                 sources[start:stop]):
+                        self._insert_one(tenant, invoice, invoice_warnings, source, batch, now, on_duplicate,
+                                         report)
+        self.inserted += report["inserted"]
+        return report
+
+    def _insert_one(self, tenant: str, invoice: dict, warnings: list, source, batch, now: float, on_duplicate: str,
+                    report):
+        if "invoice_id" not in invoice or "metadata" not in invoice:
+            raise ValueError("Only full golden invoices can be stored, not field projections")
+        body = json.dumps(invoice, separators=(",", ":"))
+        content_hash = hashlib.sha256(json.dumps(invoice, sort_keys=True).encode("utf-8")).hexdigest()
+        metadata = invoice["metadata"]
+        invoice_id = _value(invoice["invoice_id"])
+        partner = _value(metadata.get("trading_partner"))
+        existing = self._db.execute(
+            "SELECT id, content_hash FROM invoices WHERE tenant = ? AND trading_partner IS ? AND invoice_id IS ?",
+            (tenant, partner, invoice_id)).fetchall()
+        if existing:
+            exact = any(row[1] == content_hash for row in existing)
+            duplicate = {"invoice_id": invoice_id, "trading_partner": partner,
+                         "kind": "exact" if exact else "revision", "existing": [row[0] for row in existing],
+                         "source": source}
+            report["duplicates"].append(duplicate)
+            if exact:
+                self.exact_duplicates += 1
+            else:
+                self.revisions += 1
+            if on_duplicate == "skip" and exact:
+                report["skipped"] += 1
+                return
+            if on_duplicate == "replace":
+                self._db.executemany("DELETE FROM invoices WHERE id = ?", [(row[0],) for row in existing])
+                report["replaced"] += len(existing)
+        refs = invoice.get("refs") or {}
+        self._db.execute(_INSERT, (
+            tenant, invoice_id, partner, _value(metadata.get("edi_version")), _value(invoice.get("side")),
+            _value(refs.get("bol")), _value(refs.get("pro")), _value(refs.get("load_id")),
+            _value((invoice.get("dates") or {}).get("invoice")), _value(invoice.get("total")),
+            _value(invoice.get("currency")), metadata.get("confidence"), content_hash, source, batch,
+            body, json.dumps(warnings, separators=(",", ":")), now,
+        ))
+        report["inserted"] += 1
+
+    def get(self, row_id: int, tenant: str = None):
+        """
+        One stored invoice by row id: {id, tenant, source, created, invoice, warnings},
+        or None; also None when tenant is given and the row is another tenant's.
+        """
+        with self._lock:
+            row = self._db.execute(f"{_RECORD} WHERE id = ?", (row_id,)).fetchone()
+        if row is not None and tenant is not None and row[1] != tenant:
+            return None
+        return None if row is None else _record(row)
+
+    def find(self, limit: int = 100, **criteria):
+        """
+        Stored invoices matching every given lookup key (see LOOKUP_COLUMNS), newest
+        first, e.g. find(bol="BOL778231") or find(invoice_id="INV1001", trading_partner="CARRIERX").
+        tenant narrows any lookup but is not one on its own.
+        """
+        unknown = set(criteria) - set(LOOKUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown lookup key(s): {', '.join(sorted(unknown))}")
+        criteria = {key: value for key, value in criteria.items() if value is not None}
+        if not set(criteria) - {"tenant"}:
+            raise ValueError(f"Give at least one of: {', '.join(key for key in LOOKUP_COLUMNS if key != 'tenant')}")
+        where = " AND ".join(f"{LOOKUP_COLUMNS[key]} = ?" for key in criteria)
+        with self._lock:
+            rows = self._db.execute(f"{_RECORD} WHERE {where} ORDER BY id DESC LIMIT ?",
+                                    (*(str(value) for value in criteria.values()), limit)).fetchall()
+        return [_record(row) for row in rows]
+
+    def duplicates_of(self, invoice: dict, tenant: str = DEFAULT_TENANT):
+        """ The tenant's stored invoices with the same trading partner and invoice_id as invoice. """
+        partner = _value((invoice.get("metadata") or {}).get("trading_partner"))
+        invoice_id = _value(invoice.get("invoice_id"))
+        with self._lock:
+            rows = self._db.execute(
+                f"{_RECORD} WHERE tenant = ? AND trading_partner IS ? AND invoice_id IS ? ORDER BY id",
+                (tenant, partner, invoice_id)).fetchall()
+        return [_record(row) for row in rows]
+
+    def delete_batches_after(self, batch: int, tenant: str = DEFAULT_TENANT):
+        """
+        Drop the tenant's rows written by batches after `batch`, e.g. ones a crashed
+        backfill never checkpointed.
+        """
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM invoices WHERE tenant = ? AND batch > ?", (tenant, batch)).rowcount
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+            partners = self._db.execute("SELECT COUNT(DISTINCT trading_partner) FROM invoices").fetchone()[0]
+            tenants = dict(self._db.execute("SELECT tenant, COUNT(*) FROM invoices GROUP BY tenant"))
+        return {
+            "path": self.path,
+            "invoices": count,
+            "tenants": tenants,
+            "trading_partners": partners,
+            "on_duplicate": self.on_duplicate,
+            "inserted": self.inserted,
+            "exact_duplicates": self.exact_duplicates,
+            "revisions": self.revisions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def configure_invoice_store(path: str = None, on_duplicate: str = None, batch_size: int = None):
+    """
+    Open the process-wide invoice store. Unset arguments come from INVOICE_STORE_PATH
+    (no path: no store), INVOICE_STORE_ON_DUPLICATE (skip) and INVOICE_STORE_BATCH (1000).
+    """
+    global _INVOICE_STORE
+    path = path or os.environ.get("INVOICE_STORE_PATH")
+    if not path:
+        _INVOICE_STORE = None
+        return None
+    _INVOICE_STORE = InvoiceStore(
+        path,
+        on_duplicate=on_duplicate or os.environ.get("INVOICE_STORE_ON_DUPLICATE", "skip"),
+        batch_size=batch_size or int(os.environ.get("INVOICE_STORE_BATCH", 1000)),
+    )
+    return _INVOICE_STORE
+
+
+def get_invoice_store():
+    return _INVOICE_STORE
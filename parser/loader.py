@@ -1,43 +1,49 @@
-import json
-from pathlib import Path
+import os
+from metrics import METRICS
+from profile_registry import GLOBAL_PROFILE_KEY, ProfileRegistry
 
-PROFILE_CACHE = {}
+REGISTRY = ProfileRegistry(os.environ.get("PROFILES_PATH", "profiles"))
 
-def load_profiles(base_path: str = "profiles"):
+def load_profiles(base_path: str = None):
     """
-    Load profiles/{partner}/{version}/profile.json into memory.
+    Load profiles/{partner}/{version}/profile.json into the registry, compiled into
+    extraction plans. Calling it again only reloads profiles that changed on disk.
     """
-    base = Path(base_path)
+    if base_path is not None:
+        REGISTRY.set_base_path(base_path)
+    REGISTRY.reload()
+    return REGISTRY.ready
 
-    for partner_dir in base.iterdir():
-        if partner_dir.is_dir():
-            partner = partner_dir.name
 
-            for version_dir in partner_dir.iterdir():
-                if version_dir.is_dir():
-                    edi_version = version_dir.name
-                    profile_file = version_dir / "profile.json"
-
-                    if profile_file.exists():
-                        key = (partner.upper(), edi_version)
-                        PROFILE_CACHE[key] = json.loads(profile_file.read_text())
+def profile_snapshot():
+    """
+    The current immutable (partner, version) -> plan mapping. Grab it once per request.
+    """
+    return REGISTRY.snapshot()
 
-    print(f"Loaded {len(PROFILE_CACHE)} partner profiles.")
 
-    if PROFILE_CACHE.get("global", 'default') is None:
-        return False
-    return True
+def profile_resolver():
+    """
+    Envelope -> plan resolver over the current snapshot (see ProfileResolver).
+    """
+    return REGISTRY.resolver()
 
 
-def get_profile(partner: str, version: str):
+def get_profile(partner: str, version: str, profiles=None):
     """
-    Retrieve a loaded profile from memory.
+    Retrieve a loaded profile's extraction plan from memory.
     """
-    profile =  PROFILE_CACHE.get((partner, version), None)
+    if profiles is None:
+        profiles = REGISTRY.snapshot()
+    profile =  profiles.get((partner, version), None)
     if profile is None:
-        profile = PROFILE_CACHE.get((partner, "default"), None)
+        fallback = "partner_default"
+        profile = profiles.get((partner, "default"), None)
         if profile is None:
-            profile = PROFILE_CACHE.get(("global", "default"), None)
+            fallback = "global"
+            profile = profiles.get(GLOBAL_PROFILE_KEY, None)
+        if profile is not None and METRICS.enabled:
+            METRICS.profile_fallbacks.inc(METRICS.profile_labels(profile, version) + (fallback,))
     if profile is None:
         raise ValueError(f"No profile found for partner '{partner}' with version '{version}'")
     return profile
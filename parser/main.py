@@ -1,9 +1,44 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from edi_logging import configure_logging
+from invoice_store import configure_invoice_store
+from loader import REGISTRY, load_profiles
+from metrics import configure_metrics
+from parse_profiler import configure_profiler
+from pipeline import configure_pipeline
+from result_cache import configure_result_cache
+from tenants import configure_tenants, start_tenant_watchers
 from router_parse import router as parse_router
 from router_health import router as health_router
+from router_admin import router as admin_router
+from router_invoices import router as invoices_router
 
-app = FastAPI(title="EDI 210 Parser", version="1.0.0")
+configure_logging()
+configure_metrics()
+configure_profiler()
+load_profiles()
+configure_tenants()
+configure_result_cache()
+configure_invoice_store()
+if os.environ.get("PROFILES_WATCH", "").lower() in ("1", "true", "yes"):
+    REGISTRY.start_watcher()
+    start_tenant_watchers()
+
+pipeline = configure_pipeline()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await pipeline.start()
+    yield
+    await pipeline.stop()
+
+
+app = FastAPI(title="EDI 210 Parser", version="1.0.0", lifespan=lifespan)
 
 # Register routes
 app.include_router(parse_router, prefix="/v1/edi210")
+app.include_router(invoices_router, prefix="/v1/edi210")
 app.include_router(health_router)
+app.include_router(admin_router, prefix="/admin")
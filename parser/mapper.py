@@ -1,38 +1,164 @@
-from loader import get_profile
+from functools import partial
+from time import perf_counter
+from metrics import METRICS
+from parse_profiler import get_profiler
 from extract_elements_with_rules import extract_elements_with_rules
+from tokenizer import as_buffer, iter_transaction_sets, sniff_delimiters
+from projection import as_projection
+from segment_index import SegmentIndex
+from result_cache import get_result_cache, transaction_key
+from tenants import as_tenant
 
-def parse_invoice(edi_text: str):
+def iter_prepared(edi_text, tenant=None, record: bool = True):
     """
-    Tokenize and Parse EDI 210 segments into a structured invoice dictionary.
+    Tokenize an interchange and resolve each transaction set's profile, yielding
+    (plan, segments, partner, edi_version) ready for extraction.
+    Profiles come from the tenant's namespace over the shared ones (see tenants.py);
+    tenant is a Tenant or tenant ID, None for the default tenant.
+    The profile is resolved once per functional group, from ISA06/GS02/GS08, the
+    first time its GS envelope is seen; every ST in the group reuses it.
+    edi_text may be str or raw bytes (bytes, bytearray, memoryview, mmap); bytes are
+    tokenized in place and only the segments the profile reads are decoded.
+    record=False leaves the stage metrics alone (see iter_invoices).
     """
-    element_delim = '*'
-    segment_delim = '~'
-    golden_invoice = []
-    warnings = []
-    try:
-        edi_text = edi_text.replace('\n', '')
-        segments = {}
-        multi_batch = edi_text.split('ST')
-    except Exception as exc:
-        raise RuntimeError(f"Failed to tokenize EDI: {exc}") from exc
-    for batch in multi_batch[1:]:
-        batch_edi = multi_batch[0] + 'ST' + batch
-        segments_data = batch_edi.strip().split(segment_delim)
-        for seg in segments_data:
-            elements = seg.split(element_delim)
-            key = elements[0].strip()
-            segments.setdefault(key, []).append(elements)
+    edi_text = as_buffer(edi_text)
+    delimiters = sniff_delimiters(edi_text)
+    raw_delimiters = delimiters if isinstance(edi_text, str) else delimiters.encoded()
+    element_delim = raw_delimiters.element
+    segment_delim = raw_delimiters.segment
+    resolver = as_tenant(tenant).resolver()
+    timed = record and METRICS.enabled
+    mark = perf_counter() if timed else 0.0
+    group_envelope = None
+    for envelope, transaction in iter_transaction_sets(edi_text, element_delim, segment_delim):
+        segments = SegmentIndex.build(edi_text, envelope + transaction, delimiters.element)
         required_segments = ['ISA', 'GS', 'ST', 'B3', 'SE']
         for req_seg in required_segments:
             if req_seg not in segments:
                 raise ValueError(f"Missing required segment: {req_seg}")
-        try:
-            partner = segments['GS'][0][2].strip()
-            edi_version = segments['GS'][0][8].strip()
-        except Exception:
-            raise ValueError("Failed to extract partner and EDI version from segments")
-        profile = get_profile(partner, edi_version)
-        golden_invoice_segment, warnings = extract_elements_with_rules(profile, segments, partner, edi_version)
+        if timed:
+            # Tokenize time runs from when the consumer asked for this set until it was indexed.
+            now = perf_counter()
+        # Envelope span tuples are shared by every ST of a group, so identity marks a new group.
+        if envelope[-1] is not group_envelope:
+            group_envelope = envelope[-1]
+            try:
+                gs = segments.first('GS')
+                partner = gs[2].strip()
+                edi_version = gs[8].strip()
+                isa = segments.first('ISA')
+                isa_sender = isa[6].strip() if len(isa) > 6 else ""
+            except Exception:
+                raise ValueError("Failed to extract partner and EDI version from segments")
+            plan, fallback = resolver.resolve(isa_sender, partner, edi_version)
+            if timed:
+                labels = METRICS.profile_labels(plan, edi_version)
+                METRICS.observe_stage("profile_lookup", *labels, perf_counter() - now)
+        if timed:
+            METRICS.observe_stage("tokenize", *labels, now - mark)
+            if fallback is not None:
+                METRICS.profile_fallbacks.inc(labels + (fallback,))
+        yield plan, segments, partner, edi_version
+        if timed:
+            mark = perf_counter()
+
+
+def extract_prepared(plan, segments, partner: str, edi_version: str, cache=None, charge_columns=None,
+                     projection=None, tenant=None, record: bool = True):
+    """
+    Extract one prepared transaction set into (golden_invoice, warnings) for tenant,
+    going through the result cache when one is given. With charge_columns
+    (reconcile.ChargeColumns), charge totals are left for the batch to reconcile and
+    the cache is bypassed, since the invoice is not final yet; a projection is ignored
+    then, the batch needs every field. record=False leaves the metrics alone.
+    """
+    tenant = as_tenant(tenant)
+    if charge_columns is not None:
+        projection = None
+    if record and METRICS.enabled:
+        start = perf_counter()
+        golden_invoice, warnings = _extract(plan, segments, partner, edi_version, cache, charge_columns, projection,
+                                            tenant)
+        labels = METRICS.profile_labels(plan, edi_version)
+        METRICS.observe_stage("extract", *labels, perf_counter() - start)
+        if charge_columns is None:
+            METRICS.observe_invoice(*labels, golden_invoice, warnings)
+        return golden_invoice, warnings
+    return _extract(plan, segments, partner, edi_version, cache, charge_columns, projection, tenant)
+
+
+def _extract(plan, segments, partner: str, edi_version: str, cache, charge_columns, projection, tenant):
+    if cache is None or charge_columns is not None:
+        return extract_elements_with_rules(plan, segments, partner, edi_version, charge_columns, projection,
+                                           tenant.broker_id)
+    key = transaction_key(segments, plan, projection, tenant)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+    golden_invoice, warnings = extract_elements_with_rules(plan, segments, partner, edi_version,
+                                                           projection=projection, our_broker=tenant.broker_id)
+    cache.put(key, golden_invoice, warnings)
+    return golden_invoice, warnings
+
+
+def iter_invoices(edi_text, charge_columns=None, use_cache: bool = True, fields=None, tenant=None,
+                  record: bool = True):
+    """
+    Parse EDI 210 transaction sets one at a time, yielding (golden_invoice, warnings)
+    as soon as each one has been extracted.
+    fields limits each invoice to those top-level keys ("invoice_id,total,charges" or a
+    list) and skips the rules nobody asked for; see projection.compile_projection.
+    See iter_prepared for accepted input and tenant, extract_prepared for charge_columns.
+    The parse counts toward the tenant's throughput, timed while this generator runs,
+    and toward the metrics; record=False turns both off, for parses that replay one
+    already counted (the parse profiler's slow-parse replays).
+    """
+    tenant = as_tenant(tenant)
+    projection = as_projection(fields)
+    cache = get_result_cache() if use_cache else None
+    count = 0
+    busy = 0.0
+    mark = perf_counter()
+    try:
+        for plan, segments, partner, edi_version in iter_prepared(edi_text, tenant, record):
+            result = extract_prepared(plan, segments, partner, edi_version, cache, charge_columns, projection, tenant,
+                                      record)
+            busy += perf_counter() - mark
+            count += 1
+            yield result
+            mark = perf_counter()
+        busy += perf_counter() - mark
+    finally:
+        if record:
+            tenant.record(count, len(edi_text), busy)
+
+
+def parse_invoice(edi_text, profile: bool = False, fields=None, tenant=None):
+    """
+    Tokenize and Parse EDI 210 segments into a structured invoice dictionary.
+    profile=True captures a profile of this parse when the parse profiler is enabled
+    (see parse_profiler); slow parses are captured automatically.
+    fields is a projection and tenant a Tenant or tenant ID, as in iter_invoices.
+    """
+    projection = as_projection(fields)
+    tenant = as_tenant(tenant)
+    profiler = get_profiler()
+    if profiler.enabled:
+        # Captures skip the result cache, otherwise a replayed slow parse would be a cache hit.
+        # A replay repeats a parse that was already counted, so it records nothing.
+        return profiler.run(partial(_parse_invoice, projection=projection, tenant=tenant), edi_text, force=profile,
+                            profiled_parse=partial(_parse_invoice, use_cache=False, projection=projection,
+                                                   tenant=tenant),
+                            replay_parse=partial(_parse_invoice, use_cache=False, projection=projection,
+                                                 tenant=tenant, record=False))
+    return _parse_invoice(edi_text, projection=projection, tenant=tenant)
+
+
+def _parse_invoice(edi_text, use_cache: bool = True, projection=None, tenant=None, record: bool = True):
+    golden_invoice = []
+    warnings = []
+    for golden_invoice_segment, invoice_warnings in iter_invoices(edi_text, use_cache=use_cache, fields=projection,
+                                                                  tenant=tenant, record=record):
         golden_invoice.append(golden_invoice_segment)
-        warnings.append(warnings)
-    return golden_invoice, warnings
\ No newline at end of file
+        warnings.append(invoice_warnings)
+    return golden_invoice, warnings
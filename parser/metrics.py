@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from profile_registry import GLOBAL_PROFILE_KEY
+
+# --- Minimal Prometheus instrumentation for the parse path ---
+# Call sites check METRICS.enabled once and only then read the clock, so with
+# metrics off the cost is one attribute lookup per transaction set.
+
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+# Label value when a field projection left out the metadata a label comes from, and
+# for partners and versions no profile is configured for.
+UNKNOWN_LABEL = "unknown"
+
+
+def _escape(value: str):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series_key(item):
+    """ Sort key for (label values, value) pairs; str() so a stray None label cannot break render. """
+    return tuple(str(value) for value in item[0])
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: tuple):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def drain(self):
+        """ Take and reset the values: label values -> amount. """
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict):
+        """ Add values taken by drain(), e.g. in another process. """
+        with self._lock:
+            for label_values, amount in values.items():
+                self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items(), key=_series_key):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def drain(self):
+        """ Take and reset the series: label values -> [bucket counts, sum, count]. """
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series: dict):
+        """ Add series taken by drain(), e.g. in another process. """
+        with self._lock:
+            for label_values, (counts, total, count) in series.items():
+                mine = self._series.get(label_values)
+                if mine is None:
+                    self._series[label_values] = [list(counts), total, count]
+                    continue
+                mine[0] = [a + b for a, b in zip(mine[0], counts)]
+                mine[1] += total
+                mine[2] += count
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items(), key=_series_key):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Metrics:
+    """
+    The parser's metric families. Stage timings are labelled by stage, partner and
+    edi_version; stages are tokenize, profile_lookup, extract and serialize.
+    Per-tenant throughput is counted per finished parse, labelled by tenant.
+
+    partner and edi_version label values come from the profile that served a
+    transaction set (see profile_labels), never straight from GS02/GS08, so the
+    number of series is bounded by the profiles tree whatever senders write.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "edi210_stage_seconds", "Time spent per transaction set in each parse stage.",
+            ("stage", "partner", "edi_version"), STAGE_BUCKETS)
+        self.invoices = Counter(
+            "edi210_invoices_total", "Golden invoices extracted.", ("partner", "edi_version"))
+        self.warnings = Counter(
+            "edi210_warnings_total", "Extraction warnings emitted.", ("partner", "edi_version"))
+        self.profile_fallbacks = Counter(
+            "edi210_profile_fallbacks_total",
+            "Transaction sets served by a fallback profile instead of an exact partner/version match.",
+            ("partner", "edi_version", "fallback"))
+        self.confidence = Histogram(
+            "edi210_invoice_confidence", "Confidence score of extracted invoices.",
+            ("partner", "edi_version"), CONFIDENCE_BUCKETS)
+        self.tenant_invoices = Counter(
+            "edi210_tenant_invoices_total", "Golden invoices parsed per tenant.", ("tenant",))
+        self.tenant_bytes = Counter(
+            "edi210_tenant_bytes_total", "Interchange bytes parsed per tenant.", ("tenant",))
+        self.tenant_seconds = Counter(
+            "edi210_tenant_parse_seconds_total", "Time spent parsing per tenant.", ("tenant",))
+        # (partner, edi_version) label pairs handed out by profile_labels.
+        self.known_labels = set()
+
+    def profile_labels(self, plan, edi_version: str):
+        """
+        (partner, edi_version) label values for a transaction set served by plan:
+        the profile's partner, and the envelope's version only when the profile is
+        for exactly that version. Sets served by the global profile are UNKNOWN_LABEL.
+        """
+        partner = plan.partner
+        if not partner or partner.upper() == GLOBAL_PROFILE_KEY[0]:
+            labels = (UNKNOWN_LABEL, UNKNOWN_LABEL)
+        else:
+            labels = (partner, edi_version if edi_version == plan.edi_version else UNKNOWN_LABEL)
+        if labels not in self.known_labels:
+            self.known_labels.add(labels)
+        return labels
+
+    def invoice_labels(self, golden_invoice: dict):
+        """
+        (partner, edi_version) label values for an extracted invoice, from its
+        metadata; values profile_labels has not vouched for become UNKNOWN_LABEL.
+        """
+        metadata = golden_invoice.get("metadata") or {}
+        labels = (metadata.get("trading_partner") or UNKNOWN_LABEL, metadata.get("edi_version") or UNKNOWN_LABEL)
+        if labels in self.known_labels:
+            return labels
+        if (labels[0], UNKNOWN_LABEL) in self.known_labels:
+            return labels[0], UNKNOWN_LABEL
+        return UNKNOWN_LABEL, UNKNOWN_LABEL
+
+    def _parse_families(self):
+        return (self.stage_seconds, self.invoices, self.warnings, self.profile_fallbacks, self.confidence)
+
+    def drain(self):
+        """
+        Take and reset the per-transaction-set families as a picklable delta for
+        merge(); process-pool workers send theirs back to the parent this way.
+        Tenant counters are left alone, the parent counts tenant throughput itself.
+        """
+        return {
+            "families": {family.name: family.drain() for family in self._parse_families()},
+            "labels": set(self.known_labels),
+        }
+
+    def merge(self, delta: dict):
+        """ Add a delta taken by drain() in another process. """
+        families = delta["families"]
+        for family in self._parse_families():
+            family.merge(families.get(family.name, {}))
+        self.known_labels.update(delta["labels"])
+
+    def observe_stage(self, stage: str, partner: str, edi_version: str, seconds: float):
+        self.stage_seconds.observe((stage, partner, edi_version), seconds)
+
+    def observe_invoice(self, partner: str, edi_version: str, golden_invoice: dict, warnings: list):
+        key = (partner, edi_version)
+        self.invoices.inc(key)
+        if warnings:
+            self.warnings.inc(key, len(warnings))
+        metadata = golden_invoice.get("metadata")
+        if metadata is not None:
+            # Absent when a field projection left metadata out.
+            self.confidence.observe(key, metadata["confidence"])
+
+    def observe_tenant(self, tenant: str, invoices: int, nbytes: int, seconds: float):
+        key = (tenant,)
+        self.tenant_invoices.inc(key, invoices)
+        self.tenant_bytes.inc(key, nbytes)
+        self.tenant_seconds.inc(key, seconds)
+
+    def render(self):
+        lines = []
+        for family in self._parse_families() + (self.tenant_invoices, self.tenant_bytes, self.tenant_seconds):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def configure_metrics(enabled: bool = None):
+    """
+    Turn stage instrumentation on or off. Defaults to EDI_METRICS (off).
+    """
+    if enabled is None:
+        enabled = os.environ.get("EDI_METRICS", "").lower() in ("1", "true", "yes")
+    METRICS.enabled = enabled
+    return METRICS
+
+
+def dumps_invoices(invoices: list, **kwargs):
+    """
+    json.dumps(invoices, **kwargs), timing each invoice under the serialize stage
+    when metrics are on. The output is identical either way.
+    """
+    if not METRICS.enabled:
+        return json.dumps(invoices, **kwargs)
+    separator = kwargs.get("separators", (", ", ": "))[0]
+    parts = []
+    for invoice in invoices:
+        start = perf_counter()
+        parts.append(json.dumps(invoice, **kwargs))
+        METRICS.observe_stage("serialize", *METRICS.invoice_labels(invoice), perf_counter() - start)
+    return "[" + separator.join(parts) + "]"
@@ -0,0 +1,140 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from loader import REGISTRY, load_profiles
+from mapper import parse_invoice
+from metrics import METRICS
+from projection import as_projection
+from tenants import (as_tenant, configure_tenants, get_tenant, namespace_versions, tenants_config,
+                     tenants_generation)
+from tokenizer import as_buffer, iter_transaction_set_texts, sniff_delimiters
+
+_POOL = None
+_POOL_WORKERS = 0
+# tenants_generation() the pool's workers were configured with.
+_POOL_TENANTS = None
+_POOL_LOCK = threading.Lock()
+# Registry version of the parent process that this worker last synced with.
+_SEEN_REGISTRY_VERSION = 0
+# Same for each tenant's profile namespace: tenant_id -> the parent's namespace version.
+_SEEN_TENANT_VERSIONS = {}
+
+
+def _warm_worker(profiles_dir: str, registry_version: int, tenants: dict = None, tenant_versions: dict = None):
+    """
+    Process-pool initializer: compile the shared profiles and every tenant's
+    namespace once per worker. The versions are the parent's at pool creation;
+    what the worker just read from disk is at least that new.
+    """
+    global _SEEN_REGISTRY_VERSION
+    # A forked worker starts with a copy of the parent's metrics; only its own go back.
+    METRICS.drain()
+    load_profiles(profiles_dir)
+    _SEEN_REGISTRY_VERSION = registry_version
+    configure_tenants(tenants or {})
+    _SEEN_TENANT_VERSIONS.clear()
+    _SEEN_TENANT_VERSIONS.update(tenant_versions or {})
+
+
+def _sync_profiles(registry_version: int, tenant_id: str, tenant_version: int):
+    """ Reload what the parent hot-reloaded since this worker last looked; nothing otherwise. """
+    global _SEEN_REGISTRY_VERSION
+    if registry_version != _SEEN_REGISTRY_VERSION:
+        REGISTRY.reload()
+        _SEEN_REGISTRY_VERSION = registry_version
+    tenant = get_tenant(tenant_id)
+    if _SEEN_TENANT_VERSIONS.get(tenant_id) != tenant_version:
+        tenant.reload()
+        _SEEN_TENANT_VERSIONS[tenant_id] = tenant_version
+    return tenant
+
+
+def _parse_chunk(task):
+    """
+    Parse a chunk of transaction sets into their (invoice, warnings) pairs. With
+    metrics on, also returns what the chunk added to this worker's metrics, for the
+    parent to merge into the /metrics it serves.
+    """
+    texts, registry_version, tenant_id, tenant_version, fields, metrics_enabled = task
+    tenant = _sync_profiles(registry_version, tenant_id, tenant_version)
+    METRICS.enabled = metrics_enabled
+    results = []
+    for edi_text in texts:
+        invoices, warnings = parse_invoice(edi_text, fields=fields, tenant=tenant)
+        results.append((invoices[0], warnings[0]))
+    return results, METRICS.drain() if metrics_enabled else None
+
+
+def get_pool(max_workers: int = None, profiles_dir: str = None):
+    """
+    Return the shared process pool, creating and warming it on first use.
+    After configure_tenants the pool is replaced, since its workers only know the
+    tenants they were started with; work already submitted to the old pool finishes.
+    """
+    global _POOL, _POOL_WORKERS, _POOL_TENANTS
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL_TENANTS != tenants_generation():
+            _POOL.shutdown(wait=False)
+            _POOL = None
+        if _POOL is None:
+            profiles_dir = profiles_dir or str(REGISTRY.base_path)
+            max_workers = max_workers or int(os.environ.get("PARSE_WORKERS", 0)) or os.cpu_count()
+            _POOL_TENANTS = tenants_generation()
+            _POOL = ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_worker,
+                                        initargs=(profiles_dir, REGISTRY.version, tenants_config(),
+                                                  namespace_versions()))
+            _POOL_WORKERS = max_workers
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown()
+            _POOL = None
+
+
+def parse_invoices_parallel(edi_text, max_workers: int = None, chunksize: int = None, fields=None, tenant=None):
+    """
+    Parse an interchange by fanning its ST/SE transaction sets out over the process pool.
+    Returns (golden_invoices, warnings) in the same order as parse_invoice.
+    fields and tenant are as in parse_invoice; the parse counts toward the tenant's
+    throughput here, since workers count in their own process. Stage timings and
+    invoice counters the workers take are merged into this process's metrics.
+    """
+    projection = as_projection(fields)
+    tenant = as_tenant(tenant)
+    start = perf_counter()
+    edi_text = as_buffer(edi_text)
+    delimiters = sniff_delimiters(edi_text)
+    if not isinstance(edi_text, str):
+        delimiters = delimiters.encoded()
+    element_delim = delimiters.element
+    segment_delim = delimiters.segment
+    transaction_sets = list(iter_transaction_set_texts(edi_text, element_delim, segment_delim))
+    if len(transaction_sets) < 2:
+        return parse_invoice(edi_text, fields=projection, tenant=tenant)
+
+    pool = get_pool(max_workers)
+    if chunksize is None:
+        # A few chunks per worker keeps them busy without paying IPC per invoice.
+        chunksize = max(1, len(transaction_sets) // (_POOL_WORKERS * 4))
+    golden_invoice = []
+    warnings = []
+    # Workers compile (and memoize) the projection from its spec string.
+    spec = projection.key if projection is not None else None
+    # Workers only need the namespace version; the shared registry is synced separately.
+    tenant_version = tenant.version[1]
+    metrics_enabled = METRICS.enabled
+    tasks = ((transaction_sets[i:i + chunksize], REGISTRY.version, tenant.tenant_id, tenant_version, spec,
+              metrics_enabled) for i in range(0, len(transaction_sets), chunksize))
+    for results, metrics_delta in pool.map(_parse_chunk, tasks):
+        if metrics_delta is not None:
+            METRICS.merge(metrics_delta)
+        for invoice, invoice_warnings in results:
+            golden_invoice.append(invoice)
+            warnings.append(invoice_warnings)
+    tenant.record(len(golden_invoice), len(edi_text), perf_counter() - start)
+    return golden_invoice, warnings
@@ -0,0 +1,310 @@
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+
+from edi_logging import LOGGER_NAME
+from tokenizer import as_buffer, iter_transaction_sets, sniff_delimiters
+
+logger = logging.getLogger(f"{LOGGER_NAME}.profiler")
+
+PROFILE_HEADER = "X-Profile-Parse"
+MODES = ("cprofile", "sampling")
+TOP_FUNCTIONS = 25
+
+
+class StackSampler:
+    """
+    Poor man's sampling profiler: a thread reads the target thread's stack every
+    `interval` seconds and counts collapsed stacks (flamegraph "folded" format).
+    Much lower overhead than cProfile on long parses, at the cost of precision.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, name="parse-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def top(self, limit: int = TOP_FUNCTIONS):
+        """ Functions by share of samples in which they were the innermost frame (self time). """
+        total = sum(self.stacks.values()) or 1
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [{"function": function, "samples": count, "share": count / total}
+                for function, count in leaves.most_common(limit)]
+
+    def dump(self, path: Path):
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+def describe_input(edi_text):
+    """
+    Partner, version and segment counts of an interchange, for labelling a capture.
+    """
+    buffer = as_buffer(edi_text)
+    delimiters = sniff_delimiters(buffer)
+    raw = delimiters if isinstance(buffer, str) else delimiters.encoded()
+    partners = Counter()
+    segment_counts = Counter()
+    transaction_sets = 0
+    for envelope, transaction in iter_transaction_sets(buffer, raw.element, raw.segment):
+        transaction_sets += 1
+        for seg_id, _, _ in transaction:
+            segment_counts[seg_id] += 1
+        for seg_id, start, end in envelope:
+            if seg_id == 'GS':
+                gs = buffer[start:end]
+                gs = (gs if isinstance(gs, str) else gs.decode('utf-8', 'replace')).split(delimiters.element)
+                if len(gs) > 8:
+                    partners[(gs[2].strip(), gs[8].strip())] += 1
+    return {
+        "partners": [{"partner": p, "edi_version": v, "transaction_sets": n} for (p, v), n in partners.most_common()],
+        "transaction_sets": transaction_sets,
+        "segments": sum(segment_counts.values()),
+        "segment_counts": dict(segment_counts.most_common()),
+        "bytes": len(buffer),
+    }
+
+
+class ParseProfiler:
+    """
+    Opt-in profiling of parse_invoice. A parse is profiled when the caller forces it
+    (the X-Profile-Parse header on /parse, which must carry force_token; without a
+    token forcing is off), and a parse that runs past slow_ms is replayed once under
+    the profiler in a background thread, so the capture shows exactly that input.
+    sample_rate is the fraction of slow parses that get replayed; at most
+    max_replays of them start per replay_window_seconds, and a slow parse that
+    comes in while a capture is running is not replayed at all, so a burst of slow
+    traffic never queues replay threads or input copies.
+
+    Each capture writes <id>.prof (pstats) or <id>.folded (sampling stacks) plus
+    <id>.json with partner, version, segment counts, timings and the functions with
+    the most self time.
+    Only the newest `keep` captures younger than max_age_hours are kept.
+    """
+
+    def __init__(self, enabled: bool = False, mode: str = "cprofile", slow_ms: float = 0.0,
+                 sample_rate: float = 0.05, interval_ms: float = 1.0, directory: str = "parse_profiles",
+                 keep: int = 200, max_age_hours: float = 72.0, max_replays: int = 6,
+                 replay_window_seconds: float = 3600.0, force_token: str = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        self.enabled = enabled
+        self.mode = mode
+        self.slow_seconds = slow_ms / 1000
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.directory = Path(directory)
+        self.keep = keep
+        self.max_age_seconds = max_age_hours * 3600
+        self.max_replays = max_replays
+        self.replay_window_seconds = replay_window_seconds
+        self.force_token = force_token or None
+        self.dropped_replays = 0
+        self._replay_starts = deque()
+        self._lock = threading.Lock()
+        # One capture at a time: profilers hook the interpreter and should not overlap.
+        self._capture_lock = threading.Lock()
+
+    def allows_force(self, header_value: str) -> bool:
+        """ True when an X-Profile-Parse header value carries the configured force token. """
+        if not self.force_token or not header_value:
+            return False
+        return hmac.compare_digest(header_value.encode("utf-8"), self.force_token.encode("utf-8"))
+
+    def run(self, parse, edi_text, force: bool = False, profiled_parse=None, replay_parse=None):
+        """
+        parse(edi_text), profiled if forced, replayed under the profiler if slow.
+        profiled_parse, when given, is what runs under the profiler instead of parse;
+        replay_parse is what a slow parse is replayed with, defaulting to profiled_parse.
+        """
+        profiled_parse = profiled_parse or parse
+        replay_parse = replay_parse or profiled_parse
+        if force:
+            return self._profiled(profiled_parse, edi_text, "forced")
+        start = time.perf_counter()
+        result = parse(edi_text)
+        elapsed = time.perf_counter() - start
+        if self.slow_seconds and elapsed >= self.slow_seconds and random.random() < self.sample_rate:
+            self._start_replay(replay_parse, edi_text, elapsed)
+        return result
+
+    def _start_replay(self, parse, edi_text, original_seconds: float):
+        """ Replay a slow parse unless the window's budget is spent or a capture is running. """
+        now = time.monotonic()
+        with self._lock:
+            while self._replay_starts and now - self._replay_starts[0] >= self.replay_window_seconds:
+                self._replay_starts.popleft()
+            if len(self._replay_starts) >= self.max_replays or not self._capture_lock.acquire(blocking=False):
+                self.dropped_replays += 1
+                return
+            self._replay_starts.append(now)
+        # The replay thread owns the capture lock from here on.
+        try:
+            # The caller may close an mmap once we return, so replay from a private copy.
+            replay_input = edi_text if isinstance(edi_text, (str, bytes)) else bytes(as_buffer(edi_text))
+            threading.Thread(target=self._replay, args=(parse, replay_input, original_seconds),
+                             name="parse-profile-replay", daemon=True).start()
+        except BaseException:
+            self._capture_lock.release()
+            raise
+
+    def _replay(self, parse, edi_text, original_seconds: float):
+        try:
+            self._capture(parse, edi_text, "slow", original_seconds)
+        except Exception:
+            logger.exception("Profiling replay of a slow parse failed")
+        finally:
+            self._capture_lock.release()
+
+    def _profiled(self, parse, edi_text, trigger: str, original_seconds: float = None):
+        with self._capture_lock:
+            return self._capture(parse, edi_text, trigger, original_seconds)
+
+    def _capture(self, parse, edi_text, trigger: str, original_seconds: float = None):
+        capture_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        error = None
+        result = None
+        start = time.perf_counter()
+        if self.mode == "sampling":
+            profiler = StackSampler(self.interval)
+            try:
+                with profiler:
+                    result = parse(edi_text)
+            except Exception as exc:
+                error = exc
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                result = parse(edi_text)
+            except Exception as exc:
+                error = exc
+            finally:
+                profiler.disable()
+        elapsed = time.perf_counter() - start
+        try:
+            self._save(capture_id, profiler, edi_text, trigger, elapsed, original_seconds, error)
+        except Exception:
+            logger.exception("Failed to save parse profile %s", capture_id)
+        if error is not None:
+            raise error
+        return result
+
+    def _save(self, capture_id, profiler, edi_text, trigger, elapsed, original_seconds, error):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if isinstance(profiler, StackSampler):
+            data_file = self.directory / f"{capture_id}.folded"
+            profiler.dump(data_file)
+            top = profiler.top()
+        else:
+            data_file = self.directory / f"{capture_id}.prof"
+            profiler.dump_stats(data_file)
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+            top = [
+                {"function": f"{Path(filename).name}:{line}({name})", "calls": calls,
+                 "tottime": tottime, "cumtime": cumtime}
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in
+                sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+            ]
+        meta = {
+            "id": capture_id,
+            "created": time.time(),
+            "trigger": trigger,
+            "mode": self.mode,
+            "profile_file": data_file.name,
+            "profiled_ms": elapsed * 1000,
+            "original_ms": original_seconds * 1000 if original_seconds is not None else None,
+            "error": str(error) if error is not None else None,
+            **describe_input(edi_text),
+            "top_functions": top,
+        }
+        (self.directory / f"{capture_id}.json").write_text(json.dumps(meta, indent=2))
+        logger.info("Saved parse profile %s (%s, %.1f ms)", capture_id, trigger, elapsed * 1000)
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            captures = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+            cutoff = time.time() - self.max_age_seconds
+            for index, meta_file in enumerate(captures):
+                if index >= self.keep or meta_file.stat().st_mtime < cutoff:
+                    for sibling in self.directory.glob(f"{meta_file.stem}.*"):
+                        sibling.unlink(missing_ok=True)
+
+    def captures(self, limit: int = 50):
+        """ Metadata of the newest saved captures, newest first. """
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+        return [json.loads(f.read_text()) for f in files]
+
+
+PROFILER = ParseProfiler()
+
+
+def configure_profiler(**overrides):
+    """
+    Replace the process-wide parse profiler. Unset options come from PROFILER_ENABLED,
+    PROFILER_MODE (cprofile|sampling), PROFILER_SLOW_MS, PROFILER_SAMPLE_RATE,
+    PROFILER_MAX_REPLAYS, PROFILER_REPLAY_WINDOW_SECONDS, PROFILER_FORCE_TOKEN,
+    PROFILER_INTERVAL_MS, PROFILER_DIR, PROFILER_KEEP and PROFILER_MAX_AGE_HOURS.
+    """
+    global PROFILER
+    env = os.environ.get
+    options = {
+        "enabled": env("PROFILER_ENABLED", "").lower() in ("1", "true", "yes"),
+        "mode": env("PROFILER_MODE", "cprofile"),
+        "slow_ms": float(env("PROFILER_SLOW_MS", 0)),
+        "sample_rate": float(env("PROFILER_SAMPLE_RATE", 0.05)),
+        "max_replays": int(env("PROFILER_MAX_REPLAYS", 6)),
+        "replay_window_seconds": float(env("PROFILER_REPLAY_WINDOW_SECONDS", 3600)),
+        "force_token": env("PROFILER_FORCE_TOKEN") or None,
+        "interval_ms": float(env("PROFILER_INTERVAL_MS", 1.0)),
+        "directory": env("PROFILER_DIR", "parse_profiles"),
+        "keep": int(env("PROFILER_KEEP", 200)),
+        "max_age_hours": float(env("PROFILER_MAX_AGE_HOURS", 72)),
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    PROFILER = ParseProfiler(**options)
+    return PROFILER
+
+
+def get_profiler():
+    return PROFILER
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from edi_logging import LOGGER_NAME
+from mapper import extract_prepared, iter_prepared
+from metrics import dumps_invoices
+from projection import as_projection
+from result_cache import get_result_cache
+from tenants import as_tenant
+
+logger = logging.getLogger(f"{LOGGER_NAME}.pipeline")
+
+STAGES = ("tokenize", "extract", "validate", "serialize")
+DEFAULT_CONCURRENCY = {"tokenize": 1, "extract": 2, "validate": 1, "serialize": 1}
+
+_PIPELINE = None
+# Where fast_validator lives unless VALIDATOR_PATH says otherwise.
+DEFAULT_VALIDATOR_PATH = Path(__file__).resolve().parents[1] / "Output_Validation"
+
+
+class PipelineBusy(RuntimeError):
+    """ Raised by Pipeline.submit when the intake queue is full; the caller should retry later. """
+
+
+class Job:
+    """ One submitted interchange and everything the stages produce for it. """
+    __slots__ = ('id', 'payload', 'projection', 'tenant', 'nbytes', 'parse_seconds', 'status', 'stage', 'prepared',
+                 'invoices', 'warnings', 'validation_errors', 'body', 'error', 'created', 'finished', 'done')
+
+    def __init__(self, payload, projection=None, tenant=None):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.projection = projection
+        self.tenant = as_tenant(tenant)
+        self.nbytes = len(payload)
+        # Tokenize + extract time, counted toward the tenant's throughput.
+        self.parse_seconds = 0.0
+        self.status = "queued"
+        self.stage = None
+        self.prepared = None
+        self.invoices = None
+        self.warnings = None
+        self.validation_errors = None
+        self.body = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = asyncio.Event()
+
+    def summary(self):
+        return {"job_id": self.id, "status": self.status, "stage": self.stage, "error": self.error}
+
+
+def _load_validator():
+    """
+    Import fast_validator from VALIDATOR_PATH (default Output_Validation/) and compile
+    the golden-invoice schema. Raises RuntimeError when either fails, so a pipeline
+    never starts with a validate stage that checks nothing.
+    """
+    path = os.environ.get("VALIDATOR_PATH") or str(DEFAULT_VALIDATOR_PATH)
+    if path not in sys.path:
+        sys.path.append(path)
+    try:
+        from fast_validator import load_fast_validator, validate_batch
+        load_fast_validator()
+    except (ImportError, OSError, ValueError) as exc:
+        raise RuntimeError(f"Cannot load fast_validator from {path} (VALIDATOR_PATH): {exc}") from exc
+    return validate_batch
+
+
+# --- Stage functions. They run in the executor, one job at a time per worker. ---
+
+def _tokenize(job: Job):
+    start = time.perf_counter()
+    job.prepared = list(iter_prepared(job.payload, job.tenant))
+    job.payload = None
+    job.parse_seconds += time.perf_counter() - start
+
+
+def _extract(job: Job):
+    start = time.perf_counter()
+    cache = get_result_cache()
+    invoices = []
+    warnings = []
+    for plan, segments, partner, edi_version in job.prepared:
+        golden_invoice, invoice_warnings = extract_prepared(plan, segments, partner, edi_version, cache,
+                                                            projection=job.projection, tenant=job.tenant)
+        invoices.append(golden_invoice)
+        warnings.append(invoice_warnings)
+    job.prepared = None
+    job.invoices = invoices
+    job.warnings = warnings
+    job.parse_seconds += time.perf_counter() - start
+    job.tenant.record(len(invoices), job.nbytes, job.parse_seconds)
+
+
+def _validate(job: Job, validate_batch):
+    # A projection is a partial invoice by request; checking it against the full schema would only flag that.
+    job.validation_errors = validate_batch(job.invoices) if job.projection is None else []
+
+
+def _serialize(job: Job):
+    body = (f'{{"job_id": {json.dumps(job.id)}, "invoices": {dumps_invoices(job.invoices)}, '
+            f'"warnings": {json.dumps(job.warnings)}, "validation_errors": {json.dumps(job.validation_errors)}}}')
+    job.body = body.encode("utf-8")
+
+
+class Pipeline:
+    """
+    Async ingestion pipeline: tokenize -> extract -> validate -> serialize.
+
+    Each stage has a bounded asyncio.Queue and its own number of worker tasks; the
+    work itself runs in an executor so the event loop never blocks on parsing.
+    A full downstream queue stalls the stage feeding it, which in turn fills the
+    intake queue, at which point submit() raises PipelineBusy (HTTP 429).
+    Finished jobs are kept for result_ttl seconds so clients can poll for them.
+    """
+
+    def __init__(self, queue_size: int = 64, concurrency: dict = None, executor=None,
+                 result_ttl: float = 300.0, max_jobs: int = 10000):
+        self.queue_size = queue_size
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._queues = {}
+        self._workers = []
+        self._jobs = {}
+        self._functions = {}
+        self.processed = dict.fromkeys(STAGES, 0)
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=sum(self.concurrency.values()),
+                                                thread_name_prefix="edi-pipeline")
+        validate_batch = _load_validator()
+        self._functions = {
+            "tokenize": _tokenize,
+            "extract": _extract,
+            "validate": lambda job: _validate(job, validate_batch),
+            "serialize": _serialize,
+        }
+        self._queues = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in STAGES}
+        for stage in STAGES:
+            for n in range(self.concurrency[stage]):
+                self._workers.append(asyncio.create_task(self._run_stage(stage), name=f"pipeline-{stage}-{n}"))
+
+    async def stop(self):
+        """
+        Cancel the stage workers and fail every job still queued or in flight, so
+        nobody polling for one waits forever. Finished jobs stay available.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for queue in self._queues.values():
+            while not queue.empty():
+                queue.get_nowait()
+                queue.task_done()
+        for job in self._jobs.values():
+            if not job.done.is_set():
+                job.error = "Pipeline stopped before the job finished"
+                self.failed += 1
+                self._finish(job, "failed")
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def submit(self, payload, fields=None, tenant=None) -> Job:
+        """
+        Queue an interchange (str or bytes) for processing; raises PipelineBusy when full.
+        fields and tenant are as in mapper.parse_invoice.
+        """
+        if not self.running:
+            raise RuntimeError("Pipeline is not running")
+        self._expire()
+        if len(self._jobs) >= self.max_jobs:
+            self.rejected += 1
+            raise PipelineBusy("Too many jobs awaiting pickup")
+        job = Job(payload, as_projection(fields), tenant)
+        try:
+            self._queues[STAGES[0]].put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise PipelineBusy("Ingestion queue is full")
+        self._jobs[job.id] = job
+        return job
+
+    async def wait(self, job: Job, timeout: float = None) -> Job:
+        await asyncio.wait_for(job.done.wait(), timeout)
+        return job
+
+    def get(self, job_id: str):
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "jobs": len(self._jobs),
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "stages": {
+                stage: {
+                    "queued": self._queues[stage].qsize() if self._queues else 0,
+                    "capacity": self.queue_size,
+                    "concurrency": self.concurrency[stage],
+                    "processed": self.processed[stage],
+                }
+                for stage in STAGES
+            },
+        }
+
+    async def _run_stage(self, stage: str):
+        loop = asyncio.get_running_loop()
+        queue = self._queues[stage]
+        position = STAGES.index(stage)
+        next_queue = self._queues[STAGES[position + 1]] if position + 1 < len(STAGES) else None
+        function = self._functions[stage]
+        while True:
+            job = await queue.get()
+            try:
+                job.status = "running"
+                job.stage = stage
+                await loop.run_in_executor(self._executor, function, job)
+                self.processed[stage] += 1
+            except Exception as exc:
+                job.error = str(exc)
+                self.failed += 1
+                self._finish(job, "failed")
+            else:
+                if next_queue is None:
+                    self._finish(job, "done")
+                else:
+                    job.status = "queued"
+                    # Blocks while the next stage is saturated: that is the backpressure.
+                    await next_queue.put(job)
+            finally:
+                queue.task_done()
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished = time.time()
+        job.done.set()
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _parse_concurrency(spec: str):
+    """ "extract=4,validate=2" -> {"extract": 4, "validate": 2} """
+    concurrency = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        stage, _, count = item.partition("=")
+        stage = stage.strip()
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        concurrency[stage] = max(1, int(count))
+    return concurrency
+
+
+def configure_pipeline(queue_size: int = None, concurrency: dict = None, executor=None, result_ttl: float = None):
+    """
+    Install the process-wide pipeline (not started). Unset arguments come from
+    PIPELINE_QUEUE_SIZE, PIPELINE_CONCURRENCY ("extract=4,validate=2") and
+    PIPELINE_RESULT_TTL.
+    """
+    global _PIPELINE
+    if concurrency is None:
+        concurrency = _parse_concurrency(os.environ.get("PIPELINE_CONCURRENCY", ""))
+    _PIPELINE = Pipeline(
+        queue_size=queue_size or int(os.environ.get("PIPELINE_QUEUE_SIZE", 64)),
+        concurrency=concurrency,
+        executor=executor,
+        result_ttl=result_ttl or float(os.environ.get("PIPELINE_RESULT_TTL", 300)),
+    )
+    return _PIPELINE
+
+
+def get_pipeline():
+    return _PIPELINE
@@ -0,0 +1,168 @@
+import hashlib
+import json
+from typing import NamedTuple, Optional, Tuple
+from charge_classifier import ChargeClassifier
+from date_format import DateFormat, compile_date_format
+
+DEFAULT_LOAD_ID_RULE = {'seg': 'REF', 'qual': 'LO', 'idx': 2}
+CHARGE_STRATEGIES = ('L1_only', 'L1_then_SAC', 'SAC_only')
+
+
+class FieldRule(NamedTuple):
+    """
+    Where a single value lives: element idx of seg, optionally picked by qualifier.
+    fmt is a date layout ("yyyyMMdd", "CCYYMMDD|YYMMDD"); date is its compiled converter.
+    """
+    seg: str
+    idx: int
+    qual: Optional[str] = None
+    fmt: Optional[str] = None
+    date: Optional[DateFormat] = None
+
+
+class ChargeRule(NamedTuple):
+    """ One l1_rules/sac_rules entry with its target bucket resolved. """
+    bucket: str
+    contains: Tuple[str, ...] = ()
+    code_in: Tuple[str, ...] = ()
+    label: Optional[str] = None
+
+
+class ExtractionPlan(NamedTuple):
+    """
+    Immutable, precompiled form of a partner profile.json.
+    Built once by loader.load_profiles; extract_elements_with_rules only runs it.
+    """
+    partner: str
+    edi_version: str
+    profile_version: Optional[str]
+    fingerprint: str
+    invoice_id: Optional[FieldRule]
+    invoice_date: Optional[FieldRule]
+    bol: Tuple[FieldRule, ...]
+    pro: Optional[FieldRule]
+    load_id: FieldRule
+    party_seg: Optional[str]
+    parties: Tuple[Tuple[str, FieldRule], ...]
+    date_seg: Optional[str]
+    dates: Tuple[Tuple[str, FieldRule], ...]
+    strategy: str
+    use_l1: bool
+    use_sac: bool
+    l1_rules: Tuple[ChargeRule, ...]
+    sac_rules: Tuple[ChargeRule, ...]
+    charge_classifier: ChargeClassifier
+    total: Optional[FieldRule]
+    fallback_to_sum: bool
+    currency: str
+    detect_gs: bool = True
+    detect_isa: bool = False
+
+
+def _field_rule(rule: dict, idx_key: str = 'idx', default_idx: Optional[int] = None):
+    if not rule:
+        return None
+    if 'seg' not in rule:
+        raise ValueError(f"Rule {rule} has no 'seg'")
+    try:
+        idx = int(rule.get(idx_key, default_idx))
+    except (TypeError, ValueError):
+        raise ValueError(f"Rule {rule} needs an integer '{idx_key}'") from None
+    fmt = rule.get('fmt')
+    return FieldRule(rule['seg'], idx, rule.get('qual'), fmt, compile_date_format(fmt) if fmt else None)
+
+
+def _charge_rules(rules: list):
+    compiled = []
+    for rule in rules or ():
+        compiled.append(ChargeRule(
+            bucket=rule.get('mapTo', 'charges.defaultother').split('.')[-1],
+            contains=tuple(rule.get('contains', ())),
+            code_in=tuple(rule.get('codeIn', ())),
+            label=rule.get('label'),
+        ))
+    return tuple(compiled)
+
+
+def _mapped(rules: list, prefix: str, idx_key: str, default_idx: Optional[int]):
+    """ Resolve parties/dates entries into (target, FieldRule) pairs, keeping profile order. """
+    seg = rules[0]['seg'] if rules else None
+    mapped = []
+    for rule in rules:
+        target = rule.get('mapTo', '')
+        if not target.startswith(prefix):
+            continue
+        mapped.append((target[len(prefix):], _field_rule(rule, idx_key, default_idx)))
+    return seg, tuple(mapped)
+
+
+def profile_fingerprint(profile: dict):
+    """ Stable hash of a profile's content, independent of key order and whitespace. """
+    canonical = json.dumps(profile, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def compile_profile(profile: dict):
+    """
+    Compile a raw profile.json dict into an ExtractionPlan.
+    """
+    try:
+        segments = profile['segments']
+        header = segments['header']
+        charges = segments['charges']
+    except KeyError as exc:
+        raise ValueError(f"Profile is missing required section: {exc}") from exc
+
+    strategy = charges.get('strategy')
+    if strategy not in CHARGE_STRATEGIES:
+        raise ValueError(f"Unknown charges strategy '{strategy}'")
+
+    bol = header.get('bol')
+    if bol is None:
+        bol_rules = ()
+    elif 'firstOf' in bol:
+        bol_rules = tuple(_field_rule(rule) for rule in bol['firstOf'])
+    else:
+        bol_rules = (_field_rule(bol),)
+
+    party_seg, parties = _mapped(segments.get('parties', []), 'parties.', 'nameIdx', 2)
+    date_seg, dates = _mapped(segments.get('dates', []), 'dates.', 'idx', 2)
+    total = segments.get('total')
+    l1_rules = _charge_rules(charges.get('l1_rules'))
+    sac_rules = _charge_rules(charges.get('sac_rules'))
+
+    # envelope.detect says which sender IDs identify this partner; without it, GS02 only.
+    detect = profile.get('envelope', {}).get('detect')
+    if detect is None:
+        detect_gs, detect_isa = True, False
+    else:
+        detect_gs, detect_isa = bool(detect.get('gs_sender')), bool(detect.get('isa_sender'))
+        if not (detect_gs or detect_isa):
+            raise ValueError("envelope.detect enables neither gs_sender nor isa_sender")
+
+    return ExtractionPlan(
+        partner=profile.get('partner'),
+        edi_version=profile.get('edi_version'),
+        profile_version=profile.get('profile_version'),
+        fingerprint=profile_fingerprint(profile),
+        invoice_id=_field_rule(header.get('invoice_id')),
+        invoice_date=_field_rule(header.get('invoice_date')),
+        bol=bol_rules,
+        pro=_field_rule(header.get('pro')),
+        load_id=_field_rule(header.get('load_id', DEFAULT_LOAD_ID_RULE)),
+        party_seg=party_seg,
+        parties=parties,
+        date_seg=date_seg,
+        dates=dates,
+        strategy=strategy,
+        use_l1=strategy in ('L1_only', 'L1_then_SAC'),
+        use_sac=strategy in ('SAC_only', 'L1_then_SAC'),
+        l1_rules=l1_rules,
+        sac_rules=sac_rules,
+        charge_classifier=ChargeClassifier(l1_rules, sac_rules),
+        total=_field_rule(total),
+        fallback_to_sum=bool(total and total.get('fallbackToSum', False)),
+        currency=profile.get('currency', {}).get('default', 'USD'),
+        detect_gs=detect_gs,
+        detect_isa=detect_isa,
+    )
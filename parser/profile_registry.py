@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from profile_plan import compile_profile
+
+logger = logging.getLogger("edi210.registry")
+
+GLOBAL_PROFILE_KEY = ("GLOBAL", "default")
+# Distinct (ISA sender, GS sender, version) envelopes remembered per resolver.
+RESOLVER_MEMO_SIZE = 4096
+
+
+class ProfileResolver:
+    """
+    Precomputed fallback table over one registry snapshot.
+
+    Plans are split by how their partner is detected (profile.json envelope.detect:
+    GS02 sender and/or ISA06 sender). resolve() tries, in order: exact version by GS
+    sender, exact version by ISA sender, the partner's "default" version by GS then
+    ISA sender, and finally the global profile. Each distinct envelope is resolved
+    once and memoized, so later groups from the same sender cost one dict hit.
+    """
+    __slots__ = ('plans', '_by_gs', '_by_isa', '_global', '_memo')
+
+    def __init__(self, plans):
+        self.plans = plans
+        self._by_gs = {}
+        self._by_isa = {}
+        for key, plan in plans.items():
+            if key == GLOBAL_PROFILE_KEY:
+                continue
+            if plan.detect_gs:
+                self._by_gs[key] = plan
+            if plan.detect_isa:
+                self._by_isa[key] = plan
+        self._global = plans.get(GLOBAL_PROFILE_KEY)
+        self._memo = {}
+
+    def resolve(self, isa_sender: str, gs_sender: str, version: str):
+        """
+        (plan, fallback) for an envelope; fallback is None for an exact match,
+        else "partner_default" or "global". Raises ValueError when nothing matches.
+        """
+        key = (isa_sender, gs_sender, version)
+        resolved = self._memo.get(key)
+        if resolved is not None:
+            return resolved
+        gs_key = (gs_sender.upper(), version)
+        isa_key = (isa_sender.upper(), version) if isa_sender else None
+        plan = self._by_gs.get(gs_key) or (self._by_isa.get(isa_key) if isa_key else None)
+        fallback = None
+        if plan is None:
+            fallback = "partner_default"
+            plan = self._by_gs.get((gs_key[0], "default"))
+            if plan is None and isa_key:
+                plan = self._by_isa.get((isa_key[0], "default"))
+        if plan is None:
+            fallback = "global"
+            plan = self._global
+        if plan is None:
+            raise ValueError(f"No profile found for partner '{gs_sender}' with version '{version}'")
+        if len(self._memo) >= RESOLVER_MEMO_SIZE:
+            self._memo.clear()
+        resolved = self._memo[key] = (plan, fallback)
+        return resolved
+
+
+class ProfileRegistry:
+    """
+    Compiled partner profiles with hot reload.
+
+    Readers get an immutable snapshot (partner, version) -> ExtractionPlan that is
+    swapped atomically on reload, so a request that grabbed a snapshot keeps
+    seeing the same profiles for its whole lifetime. Reloads only re-read files
+    whose mtime changed and only recompile those whose content hash changed.
+    """
+
+    def __init__(self, base_path: str = "profiles"):
+        self.base_path = Path(base_path)
+        self.ready = False
+        self.version = 0
+        self._snapshot = MappingProxyType({})
+        self._resolver = ProfileResolver(self._snapshot)
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        return self._snapshot
+
+    def resolver(self):
+        """ ProfileResolver over the current snapshot; grab it once per request. """
+        return self._resolver
+
+    def set_base_path(self, base_path: str):
+        base_path = Path(base_path)
+        with self._lock:
+            if base_path != self.base_path:
+                self.base_path = base_path
+                self._files = {}
+                self._snapshot = MappingProxyType({})
+                self._resolver = ProfileResolver(self._snapshot)
+                self.ready = False
+
+    def reload(self):
+        """
+        Pick up added, changed and removed profile.json files.
+        Returns a report of which (partner, version) keys changed.
+        """
+        report = {"loaded": [], "updated": [], "removed": [], "errors": []}
+        with self._lock:
+            plans = dict(self._snapshot)
+            files = {}
+            for profile_file in sorted(self.base_path.glob("*/*/profile.json")):
+                key = (profile_file.parent.parent.name.upper(), profile_file.parent.name)
+                stat = profile_file.stat()
+                previous = self._files.get(profile_file)
+                if previous is not None and previous[0] == stat.st_mtime_ns:
+                    files[profile_file] = previous
+                    continue
+                data = profile_file.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()
+                if previous is not None and previous[1] == digest:
+                    files[profile_file] = (stat.st_mtime_ns, digest, previous[2])
+                    continue
+                try:
+                    raw = json.loads(data)
+                    # Files without segments (e.g. Code/Charge_Dictionaries) are not extraction profiles.
+                    plan = compile_profile(raw) if 'segments' in raw else None
+                except Exception as exc:
+                    # Keep serving the last good plan for this key; one bad file never blocks the others.
+                    error = str(exc) if isinstance(exc, ValueError) else f"{type(exc).__name__}: {exc}"
+                    logger.error("Failed to compile %s: %s", profile_file, error)
+                    report["errors"].append({"file": str(profile_file), "error": error})
+                    files[profile_file] = previous or (stat.st_mtime_ns, None, None)
+                    continue
+                files[profile_file] = (stat.st_mtime_ns, digest, key if plan else None)
+                if plan is None:
+                    continue
+                report["updated" if key in plans else "loaded"].append(key)
+                plans[key] = plan
+
+            live_keys = {entry[2] for entry in files.values() if entry[2] is not None}
+            for key in list(plans):
+                if key not in live_keys:
+                    del plans[key]
+                    report["removed"].append(key)
+
+            self._files = files
+            if report["loaded"] or report["updated"] or report["removed"]:
+                self._snapshot = MappingProxyType(plans)
+                self._resolver = ProfileResolver(self._snapshot)
+                self.version += 1
+            self.ready = GLOBAL_PROFILE_KEY in plans
+
+        logger.info("Profiles reloaded: %d active, %d loaded, %d updated, %d removed.",
+                    len(plans), len(report["loaded"]), len(report["updated"]), len(report["removed"]))
+        return report
+
+    def start_watcher(self, interval: float = None):
+        """
+        Reload in a daemon thread whenever the profiles tree changes. Uses watchfiles
+        when it is installed and falls back to polling every `interval` seconds.
+        Returns the Event that stops it. Tenant namespaces are registries of their
+        own; tenants.start_tenant_watchers watches those.
+        """
+        interval = interval or float(os.environ.get("PROFILES_POLL_SECONDS", 5))
+        stop = threading.Event()
+
+        def reload():
+            # The watcher outlives any one failed reload (e.g. the tree being moved mid-scan).
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Profile reload of %s failed", self.base_path)
+
+        def watch():
+            try:
+                from watchfiles import watch as watch_changes
+            except ImportError:
+                while not stop.wait(interval):
+                    reload()
+                return
+            for _ in watch_changes(self.base_path, stop_event=stop):
+                reload()
+
+        thread = threading.Thread(target=watch, name="profile-watcher", daemon=True)
+        thread.start()
+        return stop
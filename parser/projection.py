@@ -0,0 +1,60 @@
+from functools import lru_cache
+from typing import FrozenSet, NamedTuple
+
+# Top-level keys of a golden invoice, in the order they are emitted.
+GOLDEN_FIELDS = ("invoice_id", "side", "source", "carrier", "customer", "refs", "parties", "dates",
+                 "currency", "charges", "total", "metadata", "evidence")
+
+
+class Projection(NamedTuple):
+    """
+    Which golden-invoice fields a caller wants, and which rule groups that requires.
+
+    total needs the charge lines (a missing L3 total falls back to their sum), and
+    metadata carries confidence, which every rule group contributes to, so asking
+    for metadata runs them all. Warnings only cover the rule groups that ran.
+    """
+    fields: FrozenSet[str]
+    key: str
+    refs: bool
+    parties: bool
+    dates: bool
+    charges: bool
+
+
+@lru_cache(maxsize=256)
+def compile_projection(spec: str):
+    """
+    "invoice_id,total,charges" -> Projection, or None for an empty spec (every field).
+    Raises ValueError on a field that is not a top-level golden invoice key.
+    """
+    if spec is None:
+        return None
+    fields = frozenset(filter(None, (name.strip() for name in spec.split(","))))
+    if not fields:
+        return None
+    unknown = fields.difference(GOLDEN_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s) in projection: {', '.join(sorted(unknown))}")
+    if fields.issuperset(GOLDEN_FIELDS):
+        return None
+    everything = "metadata" in fields
+    return Projection(
+        fields=fields,
+        key=",".join(name for name in GOLDEN_FIELDS if name in fields),
+        refs=everything or "refs" in fields,
+        parties=everything or "parties" in fields,
+        dates=everything or "dates" in fields,
+        charges=everything or "charges" in fields or "total" in fields,
+    )
+
+
+def as_projection(fields):
+    """
+    Accept a Projection, a comma-separated spec, an iterable of field names or None.
+    """
+    if fields is None or isinstance(fields, Projection):
+        return fields
+    if not isinstance(fields, str):
+        fields = ",".join(fields)
+    return compile_projection(fields)
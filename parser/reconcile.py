@@ -0,0 +1,100 @@
+from array import array
+
+import numpy as np
+
+from charge_totals import BUCKETS, get_total_tolerance
+from mapper import iter_invoices
+
+
+class ChargeColumns:
+    """
+    Charge lines of a whole batch in columnar form: parallel arrays of invoice
+    index, bucket (index into BUCKETS) and amount in integer cents, plus one L3
+    total per invoice. The extractor appends to these instead of summing per
+    invoice; reconcile() then sums and checks every invoice in one vectorized pass.
+    """
+    __slots__ = ('invoice', 'bucket', 'cents', 'total', 'has_total', 'pending')
+
+    def __init__(self):
+        self.invoice = array('q')
+        self.bucket = array('b')
+        self.cents = array('q')
+        self.total = array('q')
+        self.has_total = array('b')
+        self.pending = []
+
+    def add(self, bucket: int, cents: int):
+        """ One charge line of the invoice currently being extracted. """
+        self.invoice.append(len(self.pending))
+        self.bucket.append(bucket)
+        self.cents.append(cents)
+
+    def defer(self, golden_invoice: dict, warnings: list, total_cents: int = None):
+        """ Close the current invoice; its totals are filled in by reconcile(). """
+        self.pending.append((golden_invoice, warnings))
+        self.total.append(0 if total_cents is None else total_cents)
+        self.has_total.append(total_cents is not None)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def sums(self):
+        """ (invoices x buckets) int64 matrix of charge totals in cents. """
+        count = len(self.pending)
+        width = len(BUCKETS)
+        if not self.cents:
+            return np.zeros((count, width), dtype=np.int64)
+        invoice = np.frombuffer(self.invoice, dtype=np.int64)
+        bucket = np.frombuffer(self.bucket, dtype=np.int8)
+        cents = np.frombuffer(self.cents, dtype=np.int64)
+        # bincount accumulates in float64, which is exact for integers below 2**53 cents.
+        flat = np.bincount(invoice * width + bucket, weights=cents, minlength=count * width)
+        return np.rint(flat).astype(np.int64).reshape(count, width)
+
+    def reconcile(self, tolerance_cents: int = None):
+        """
+        Fill in bucket amounts and check every pending invoice against its L3 total,
+        then clear the batch. Returns the indexes (in defer order) that mismatched.
+        """
+        if tolerance_cents is None:
+            tolerance_cents = get_total_tolerance()
+        sums = self.sums()
+        sum_cents = sums.sum(axis=1)
+        totals = np.frombuffer(self.total, dtype=np.int64)
+        has_total = np.frombuffer(self.has_total, dtype=np.int8).astype(bool)
+        mismatched = np.flatnonzero(has_total & (np.abs(sum_cents - totals) > tolerance_cents))
+
+        amounts = (sums[:, :3] / 100).tolist()
+        sum_totals = (sum_cents / 100).tolist()
+        for (golden_invoice, _), (base_freight, fuel_surcharge, detention), sum_total, present in zip(
+                self.pending, amounts, sum_totals, has_total.tolist()):
+            charges = golden_invoice["charges"]
+            charges["base_freight"] = base_freight
+            charges["fuel_surcharge"] = fuel_surcharge
+            charges["detention"] = detention
+            if not present:
+                golden_invoice["total"] = sum_total
+        for index in mismatched.tolist():
+            golden_invoice, warnings = self.pending[index]
+            warnings.append(f"Total from EDI {golden_invoice['total']} does not match sum of charges {sum_totals[index]}.")
+            golden_invoice["metadata"]["confidence"] -= 0.1
+
+        mismatched = mismatched.tolist()
+        self.__init__()
+        return mismatched
+
+
+def parse_invoice_columnar(edi_text, tolerance_cents: int = None):
+    """
+    parse_invoice for reconciliation runs: extract every transaction set, then sum
+    charges and compare them with the L3 totals for the whole batch at once.
+    Returns the same (golden_invoices, warnings) as parse_invoice.
+    """
+    columns = ChargeColumns()
+    golden_invoice = []
+    warnings = []
+    for golden_invoice_segment, invoice_warnings in iter_invoices(edi_text, columns):
+        golden_invoice.append(golden_invoice_segment)
+        warnings.append(invoice_warnings)
+    columns.reconcile(tolerance_cents)
+    return golden_invoice, warnings
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_RESULT_CACHE = None
+# Bump when extraction output changes for the same input and profile, so entries
+# persisted in SQLite by an older build are not served.
+KEY_VERSION = 3
+
+
+def transaction_key(segments, plan, projection=None, tenant=None):
+    """
+    Cache key for one transaction set: a hash of its ST..SE segments, the GS
+    fields that feed the golden invoice, the fingerprint of the plan used, the
+    tenant and its broker ID (which decides side) and, for a projected parse,
+    the requested fields. Tenants never share entries, even for the same input.
+    Whitespace around segments is already trimmed by the tokenizer, so line
+    breaks and indentation in a resend do not change the key.
+    """
+    digest = hashlib.sha256()
+    gs = segments.first('GS')
+    digest.update(f"v{KEY_VERSION}|{plan.fingerprint}|{gs[2].strip()}|{gs[3].strip()}|{gs[8].strip()}".encode('utf-8'))
+    if tenant is not None:
+        digest.update(f"|tenant={tenant.tenant_id}|broker={tenant.broker_id}".encode('utf-8'))
+    if projection is not None:
+        digest.update(f"|fields={projection.key}".encode('utf-8'))
+    buffer = segments.buffer
+    offsets = segments.offsets
+    for row, seg_id in enumerate(segments.ids):
+        if seg_id in ('ISA', 'GS'):
+            continue
+        digest.update(b'~')
+        segment = buffer[offsets[2 * row]:offsets[2 * row + 1]]
+        digest.update(segment.encode('utf-8') if isinstance(segment, str) else segment)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of extraction results bounded by entry count, total bytes and TTL.
+
+    Values are stored as JSON so hits hand back fresh objects. With a sqlite_path,
+    entries are also written to SQLite and survive restarts; memory misses fall
+    through to disk and are promoted on a hit. Expired SQLite rows are never served
+    and are deleted every expire_every puts or expire_seconds, whichever comes first.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 24 * 3600, sqlite_path: str = None, expire_every: int = 1000,
+                 expire_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self.expire_every = expire_every
+        self.expire_seconds = expire_seconds
+        self._puts_since_expiry = 0
+        self._last_expiry = time.monotonic()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS result_cache_created ON result_cache (created)")
+            self._db.commit()
+
+    def get(self, key: str):
+        """ Cached (golden_invoice, warnings) for key, or None. """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                self._drop(key)
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM result_cache WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, key: str, golden_invoice: dict, warnings: list):
+        value = json.dumps([golden_invoice, warnings], separators=(',', ':'))
+        created = time.time()
+        with self._lock:
+            self._store(key, value, created)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, created),
+                )
+                self._puts_since_expiry += 1
+                if (self._puts_since_expiry >= self.expire_every
+                        or time.monotonic() - self._last_expiry >= self.expire_seconds):
+                    self._expire(created)
+                self._db.commit()
+
+    def _expire(self, now: float):
+        """ Delete SQLite rows past the TTL (an index range scan on created). Caller holds the lock. """
+        self._db.execute("DELETE FROM result_cache WHERE created < ?", (now - self.ttl_seconds,))
+        self._puts_since_expiry = 0
+        self._last_expiry = time.monotonic()
+
+    def _store(self, key: str, value: str, created: float):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (created, value)
+        self._bytes += len(value)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM result_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def configure_result_cache(max_entries: int = None, max_bytes: int = None, ttl_seconds: float = None,
+                           sqlite_path: str = None):
+    """
+    Install the process-wide result cache. max_entries=0 disables it.
+    Unset arguments come from RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES,
+    RESULT_CACHE_TTL and RESULT_CACHE_SQLITE.
+    """
+    global _RESULT_CACHE
+    if max_entries is None:
+        max_entries = int(os.environ.get("RESULT_CACHE_ENTRIES", 0))
+    if max_entries <= 0:
+        _RESULT_CACHE = None
+        return None
+    _RESULT_CACHE = ResultCache(
+        max_entries=max_entries,
+        max_bytes=max_bytes or int(os.environ.get("RESULT_CACHE_BYTES", 256 * 1024 * 1024)),
+        ttl_seconds=ttl_seconds or float(os.environ.get("RESULT_CACHE_TTL", 24 * 3600)),
+        sqlite_path=sqlite_path or os.environ.get("RESULT_CACHE_SQLITE") or None,
+    )
+    return _RESULT_CACHE
+
+
+def get_result_cache():
+    return _RESULT_CACHE
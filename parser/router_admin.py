@@ -0,0 +1,87 @@
+from fastapi import APIRouter
+from invoice_store import get_invoice_store
+from loader import REGISTRY
+from parse_profiler import get_profiler
+from pipeline import get_pipeline
+from result_cache import get_result_cache
+from tenants import all_tenants, reload_tenants
+
+router = APIRouter()
+
+@router.post("/profiles/reload")
+def reload_profiles():
+    """
+    Re-read profile.json files that changed on disk and swap in a new snapshot,
+    in the shared profiles and every tenant namespace.
+    """
+    report = REGISTRY.reload()
+    tenants = reload_tenants()
+    return {
+        "ready": REGISTRY.ready,
+        "version": REGISTRY.version,
+        "loaded": ["/".join(key) for key in report["loaded"]],
+        "updated": ["/".join(key) for key in report["updated"]],
+        "removed": ["/".join(key) for key in report["removed"]],
+        "errors": report["errors"],
+        "tenants": {
+            tenant_id: {
+                "loaded": ["/".join(key) for key in tenant_report["loaded"]],
+                "updated": ["/".join(key) for key in tenant_report["updated"]],
+                "removed": ["/".join(key) for key in tenant_report["removed"]],
+                "errors": tenant_report["errors"],
+            }
+            for tenant_id, tenant_report in tenants.items()
+        },
+    }
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    """
+    Hit-rate and size counters for the parse result cache.
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/invoice-store/stats")
+def invoice_store_stats():
+    """
+    Row counts and duplicate counters for the golden-invoice store.
+    """
+    store = get_invoice_store()
+    if store is None:
+        return {"enabled": False}
+    return {"enabled": True, **store.stats()}
+
+
+@router.get("/tenants")
+def tenant_stats():
+    """
+    Per-tenant broker ID, profile namespace and parse throughput.
+    """
+    return {"tenants": [tenant.stats() for tenant in all_tenants()]}
+
+
+@router.get("/pipeline/stats")
+def pipeline_stats():
+    """
+    Queue depth, concurrency and throughput counters for each async pipeline stage.
+    """
+    pipeline = get_pipeline()
+    if pipeline is None:
+        return {"enabled": False}
+    return {"enabled": True, **pipeline.stats()}
+
+
+@router.get("/parse-profiles")
+def parse_profiles(limit: int = 50):
+    """
+    Newest saved parse profiles: trigger, partner/version, segment counts and hot functions,
+    plus how many slow-parse replays were dropped by the replay limits.
+    """
+    profiler = get_profiler()
+    return {"enabled": profiler.enabled, "mode": profiler.mode, "dropped_replays": profiler.dropped_replays,
+            "captures": profiler.captures(limit)}
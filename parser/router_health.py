@@ -1,6 +1,7 @@
-from fastapi import APIRouter
-from loader import load_profiles
-import os
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse, Response
+from loader import REGISTRY
+from metrics import METRICS, PROMETHEUS_CONTENT_TYPE
 
 router = APIRouter()
 
@@ -11,10 +12,19 @@ def healthz():
 @router.get("/readyz")
 def readyz():
     """
-    Readiness probe: ensures profiles are loaded.
+    Readiness probe: reports whether the profile registry holds a usable profile set.
+    Profiles are loaded at startup and hot-reloaded; the probe never touches disk.
     """
-    profiles_dir = os.environ.get("PROFILES_PATH", "profiles")
-    
-    if load_profiles(profiles_dir):
-        return {"status": "ready"}
-    return {"status": "not_ready"}, 503
+    if REGISTRY.ready:
+        return {"status": "ready", "profiles": len(REGISTRY.snapshot()), "version": REGISTRY.version}
+    return JSONResponse({"status": "not_ready"}, status_code=503)
+
+@router.get("/metrics")
+def metrics():
+    """
+    Stage timings and invoice counters in Prometheus text format (EDI_METRICS=1 to enable).
+    /parse/batch workers send theirs back with each chunk, so they are included.
+    """
+    if not METRICS.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return Response(METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Header, HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from invoice_store import get_invoice_store
+from tenants import TENANT_HEADER, UnknownTenant, get_tenant
+
+router = APIRouter()
+
+
+def _store():
+    store = get_invoice_store()
+    if store is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Invoice store is not configured (INVOICE_STORE_PATH)")
+    return store
+
+
+def _tenant_id(tenant_id: str):
+    try:
+        return get_tenant(tenant_id).tenant_id
+    except UnknownTenant as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+@router.get("/invoices")
+async def find_invoices(invoice_id: str = None, bol: str = None, pro: str = None, load_id: str = None,
+                        partner: str = None, limit: int = 100,
+                        x_tenant_id: str = Header(None, alias=TENANT_HEADER)):
+    """
+    Stored invoices matching every given key (invoice_id, bol, pro, load_id, partner), newest first.
+    Only the X-Tenant-ID tenant's invoices are searched (the default tenant's without it).
+    """
+    tenant = _tenant_id(x_tenant_id)
+    store = _store()
+    if not any((invoice_id, bol, pro, load_id, partner)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Give at least one of: invoice_id, bol, pro, load_id, partner")
+    try:
+        records = await run_in_threadpool(store.find, limit=limit, invoice_id=invoice_id, bol=bol, pro=pro,
+                                          load_id=load_id, trading_partner=partner, tenant=tenant)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return {"invoices": records}
+
+
+@router.get("/invoices/{row_id}")
+async def get_invoice(row_id: int, x_tenant_id: str = Header(None, alias=TENANT_HEADER)):
+    """ One stored invoice by its store id, if it is the X-Tenant-ID tenant's. """
+    tenant = _tenant_id(x_tenant_id)
+    record = await run_in_threadpool(_store().get, row_id, tenant)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown invoice id")
+    return record
@@ -1,24 +1,212 @@
-from fastapi import APIRouter, Body, HTTPException, status
-from mapper import parse_invoice
+import asyncio
+import json
+from functools import partial
+from time import perf_counter
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from mapper import iter_invoices, parse_invoice
+from metrics import METRICS, dumps_invoices
+from parse_profiler import PROFILE_HEADER, get_profiler
+from parallel import parse_invoices_parallel
+from invoice_store import get_invoice_store
+from pipeline import PipelineBusy, get_pipeline
+from projection import compile_projection
+from tenants import TENANT_HEADER, UnknownTenant, get_tenant
 # from ..schema.validator import validate_against_schema
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The body is read as raw bytes and tokenized without decoding the whole interchange,
+# so it is declared here for the OpenAPI docs instead of through a Body() parameter.
+EDI_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"text/plain": {"schema": {"type": "string"}}},
+    }
+}
 
 router = APIRouter()
 
-@router.post("/parse")
-def parse_edi(edi_text: str = Body(..., media_type="text/plain")):
-    """ Parse EDI text and return structured invoice data. """
-    if not isinstance(edi_text, str):
+
+async def _read_edi(request: Request) -> bytes:
+    edi_bytes = await request.body()
+    if not edi_bytes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid request: edi_text must be a string"
+            detail="Invalid request: EDI body is empty"
         )
-    try:       
-        parsed,warnings = parse_invoice(edi_text)
-        # validate_against_schema(parsed) 
+    return edi_bytes
+
+
+def _projection(fields: str):
+    try:
+        return compile_projection(fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+def _tenant(tenant_id: str):
+    try:
+        return get_tenant(tenant_id)
+    except UnknownTenant as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+def _invoice_store(store: bool, projection):
+    if not store:
+        return None
+    invoice_store = get_invoice_store()
+    if invoice_store is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Invoice store is not configured (INVOICE_STORE_PATH)")
+    if projection is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="store=true needs full invoices; drop fields=")
+    return invoice_store
+
+
+async def _store_parsed(invoice_store, parsed, warnings, tenant):
+    """ Persist a parse result; returns the response headers reporting what was stored. """
+    if invoice_store is None:
+        return None
+    report = await run_in_threadpool(partial(invoice_store.insert, parsed, warnings, tenant=tenant.tenant_id))
+    return {"X-Invoices-Stored": str(report["inserted"]), "X-Duplicate-Invoices": str(len(report["duplicates"]))}
+
+
+def _ndjson_stream(edi_text, projection=None, tenant=None):
+    """
+    Emit one JSON line per transaction set as soon as it has been extracted.
+    Headers are already sent by the time a later set fails, so errors become a final line.
+    confidence is null when a projection leaves out metadata.
+    """
+    try:
+        for invoice, warnings in iter_invoices(edi_text, fields=projection, tenant=tenant):
+            metadata = invoice.get("metadata", {})
+            line = {"invoice": invoice, "warnings": warnings, "confidence": metadata.get("confidence")}
+            if METRICS.enabled:
+                start = perf_counter()
+                payload = json.dumps(line) + "\n"
+                METRICS.observe_stage("serialize", *METRICS.invoice_labels(invoice), perf_counter() - start)
+                yield payload
+            else:
+                yield json.dumps(line) + "\n"
+    except Exception as exc:
+        yield json.dumps({"error": str(exc)}) + "\n"
+
+
+@router.post("/parse", openapi_extra=EDI_REQUEST_BODY)
+async def parse_edi(request: Request, fields: str = None, store: bool = False, accept: str = Header(None),
+                    x_profile_parse: str = Header(None, alias=PROFILE_HEADER),
+                    x_tenant_id: str = Header(None, alias=TENANT_HEADER)):
+    """
+    Parse EDI text and return structured invoice data.
+    ?fields=invoice_id,total,charges returns only those top-level keys and skips the
+    extraction rules behind the others.
+    ?store=true also saves the invoices in the invoice store; the X-Invoices-Stored and
+    X-Duplicate-Invoices headers say how many were stored and how many were already known.
+    With the X-Profile-Parse header set to PROFILER_FORCE_TOKEN (and the parse profiler
+    enabled), the parse is profiled and the capture is saved; see /admin/parse-profiles.
+    Any other value is refused with 403.
+    X-Tenant-ID picks the tenant (broker identity and profile namespace); without it
+    the default tenant parses.
+    """
+    tenant = _tenant(x_tenant_id)
+    profile = bool(x_profile_parse) and x_profile_parse.lower() not in ("0", "false", "no")
+    if profile and not get_profiler().allows_force(x_profile_parse):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail=f"{PROFILE_HEADER} must carry the profiler's force token")
+    projection = _projection(fields)
+    invoice_store = _invoice_store(store, projection)
+    edi_bytes = await _read_edi(request)
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        if invoice_store is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="store=true is not supported for NDJSON streaming")
+        return StreamingResponse(_ndjson_stream(edi_bytes, projection, tenant), media_type=NDJSON_MEDIA_TYPE)
+    try:
+        parsed, warnings = await run_in_threadpool(parse_invoice, edi_bytes, profile, projection, tenant)
+        # validate_against_schema(parsed)
+        headers = await _store_parsed(invoice_store, parsed, warnings, tenant)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+
+    if METRICS.enabled:
+        # Same bytes JSONResponse would send, serialized per invoice so each is timed.
+        body = dumps_invoices(parsed, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+        return Response(body, media_type="application/json", headers=headers)
+    return JSONResponse(parsed, headers=headers)
+
+
+@router.post("/parse/batch", openapi_extra=EDI_REQUEST_BODY)
+async def parse_edi_batch(request: Request, fields: str = None, store: bool = False,
+                          x_tenant_id: str = Header(None, alias=TENANT_HEADER)):
+    """
+    Parse a multi-transaction-set interchange across the worker process pool.
+    store and X-Tenant-ID work as on /parse.
+    """
+    tenant = _tenant(x_tenant_id)
+    projection = _projection(fields)
+    invoice_store = _invoice_store(store, projection)
+    edi_bytes = await _read_edi(request)
+    try:
+        parsed, warnings = await run_in_threadpool(
+            partial(parse_invoices_parallel, edi_bytes, fields=projection, tenant=tenant))
+        headers = await _store_parsed(invoice_store, parsed, warnings, tenant)
     except HTTPException:
         raise
     except Exception as exc:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))     
-         
-    return JSONResponse(parsed)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+
+    return JSONResponse(parsed, headers=headers)
+
+
+def _job_response(job):
+    if job.status == "done":
+        return Response(job.body, media_type="application/json")
+    if job.status == "failed":
+        return JSONResponse(job.summary(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return JSONResponse(job.summary(), status_code=status.HTTP_202_ACCEPTED,
+                        headers={"Location": f"jobs/{job.id}"})
+
+
+@router.post("/jobs", openapi_extra=EDI_REQUEST_BODY)
+async def submit_job(request: Request, wait: bool = False, timeout: float = 30.0, fields: str = None,
+                     x_tenant_id: str = Header(None, alias=TENANT_HEADER)):
+    """
+    Queue an interchange on the async pipeline (tokenize, extract, validate, serialize).
+    Returns 202 with a job id to poll, or the finished result when wait=true.
+    Returns 429 while the pipeline's intake queue is full. fields and X-Tenant-ID work
+    as on /parse; a job can only be polled by the tenant that submitted it.
+    """
+    tenant = _tenant(x_tenant_id)
+    projection = _projection(fields)
+    pipeline = get_pipeline()
+    if pipeline is None or not pipeline.running:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Pipeline is not running")
+    edi_bytes = await _read_edi(request)
+    try:
+        job = pipeline.submit(edi_bytes, projection, tenant)
+    except PipelineBusy as exc:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(exc),
+                            headers={"Retry-After": "1"})
+    if wait:
+        try:
+            await pipeline.wait(job, timeout)
+        except asyncio.TimeoutError:
+            pass
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, x_tenant_id: str = Header(None, alias=TENANT_HEADER)):
+    """ Poll a pipeline job: 202 while it is in flight, then its result or error. """
+    tenant = _tenant(x_tenant_id)
+    pipeline = get_pipeline()
+    job = pipeline.get(job_id) if pipeline is not None else None
+    # Tenant objects are rebuilt by configure_tenants, so ownership goes by ID.
+    if job is None or job.tenant.tenant_id != tenant.tenant_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown or expired job")
+    return _job_response(job)
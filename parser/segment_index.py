@@ -0,0 +1,214 @@
+import mmap
+import os
+from array import array
+from tokenizer import ENCODING
+
+# Segments whose first element is a qualifier worth indexing for O(1) lookups.
+QUALIFIED_SEGMENTS = frozenset(('REF', 'N1', 'G62', 'DTM', 'SAC'))
+# SEGMENT_LAYOUT=compact reads segments through Segment views instead of split lists:
+# about a third of the memory per segment read, but each element read runs Python
+# code, so parsing is up to twice as slow (benchmarks/bench_segments.py). Worth it
+# where many indexed sets are held at once, e.g. a deep pipeline queue.
+COMPACT_SEGMENTS = os.environ.get("SEGMENT_LAYOUT", "list").lower() == "compact"
+
+
+class Segment:
+    """
+    One segment as a view on the shared buffer, in place of the list str.split
+    would give: just the buffer and the segment's (start, end) offsets. An element
+    is found, sliced, decoded and stripped only when read, so filler elements (the
+    empty positions in SAC*C*FSC***120.00***...) never become strings.
+
+    Supports len(), indexing (negative too), slicing and iteration like a list of
+    elements, except that values come back already stripped. Nothing is cached, so
+    an element read twice is found twice.
+    """
+    __slots__ = ('buffer', 'start', 'end', 'delim')
+
+    def __init__(self, buffer, start: int, end: int, delim):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.delim = delim
+
+    def __len__(self):
+        buffer = self.buffer
+        if not isinstance(buffer, mmap.mmap):
+            return buffer.count(self.delim, self.start, self.end) + 1
+        count = 1  # mmap has no count()
+        pos = buffer.find(self.delim, self.start, self.end)
+        while pos != -1:
+            count += 1
+            pos = buffer.find(self.delim, pos + 1, self.end)
+        return count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        buffer = self.buffer
+        delim = self.delim
+        end = self.end
+        if idx == -1:
+            pos = buffer.rfind(delim, self.start, end) + 1
+            stop = end
+        else:
+            if idx < 0:
+                idx += len(self)
+                if idx < 0:
+                    raise IndexError("segment element index out of range")
+            pos = self.start
+            for _ in range(idx):
+                pos = buffer.find(delim, pos, end)
+                if pos == -1:
+                    raise IndexError("segment element index out of range")
+                pos += 1
+            stop = buffer.find(delim, pos, end)
+            if stop == -1:
+                stop = end
+        value = buffer[pos:stop]
+        if not isinstance(value, str):
+            value = value.decode(ENCODING, 'replace')
+        return value.strip()
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class SegmentIndex:
+    """
+    Compact index over the segments of one transaction set.
+
+    Segments are kept as (start, end) offsets into the shared interchange
+    buffer and only split into elements when first read, or with compact=True
+    wrapped in a Segment view that never splits them. Rows are grouped by
+    segment ID, and qualified segments (REF/N1/G62/DTM/SAC) are also keyed on
+    (seg_id, qualifier) so lookups like REF*CN do not scan a list.
+
+    The buffer may be str or bytes-like (bytes, bytearray, mmap). For bytes,
+    a segment is decoded only when it is read, so segments the plan never
+    touches are never turned into Python strings.
+    """
+    __slots__ = ('buffer', 'element_delim', 'ids', 'offsets', 'by_id', 'by_qual', 'compact', '_elements', '_raw_delim')
+
+    def __init__(self, buffer, element_delim: str = '*', compact: bool = None):
+        if isinstance(element_delim, bytes):
+            element_delim = element_delim.decode('latin-1')
+        self.buffer = buffer
+        self.element_delim = element_delim
+        self._raw_delim = element_delim if isinstance(buffer, str) else element_delim.encode('latin-1')
+        self.ids = []
+        self.offsets = array('Q')
+        self.by_id = {}
+        self.by_qual = {}
+        self.compact = COMPACT_SEGMENTS if compact is None else compact
+        self._elements = {}
+
+    @classmethod
+    def build(cls, buffer, spans, element_delim: str = '*', compact: bool = None):
+        """
+        Build an index from (seg_id, start, end) spans produced by the tokenizer.
+        """
+        index = cls(buffer, element_delim, compact)
+        for seg_id, start, end in spans:
+            index.add(seg_id, start, end)
+        return index
+
+    @classmethod
+    def restore(cls, buffer, element_delim: str, ids: list, offsets: array, qualified):
+        """
+        Rebuild an index from a saved copy of its ids, offsets and (seg_id, qual, row)
+        qualifier entries, without reading the buffer.
+        """
+        index = cls(buffer, element_delim)
+        index.ids = ids
+        index.offsets = offsets
+        by_id = index.by_id
+        for row, seg_id in enumerate(ids):
+            by_id.setdefault(seg_id, []).append(row)
+        index.by_qual = {(seg_id, qual): row for seg_id, qual, row in qualified}
+        return index
+
+    def add(self, seg_id: str, start: int, end: int):
+        row = len(self.ids)
+        self.ids.append(seg_id)
+        self.offsets.append(start)
+        self.offsets.append(end)
+        self.by_id.setdefault(seg_id, []).append(row)
+        if seg_id in QUALIFIED_SEGMENTS:
+            qual = self._element_at(start, end, 1)
+            if qual is not None:
+                self.by_qual[(seg_id, qual)] = row
+        return row
+
+    def _element_at(self, start: int, end: int, idx: int):
+        """ Read a single element straight from the buffer without splitting the segment. """
+        delim = self._raw_delim
+        pos = start
+        for _ in range(idx):
+            pos = self.buffer.find(delim, pos, end)
+            if pos == -1:
+                return None
+            pos += 1
+        stop = self.buffer.find(delim, pos, end)
+        value = self.buffer[pos:end if stop == -1 else stop]
+        if not isinstance(value, str):
+            value = value.decode(ENCODING, 'replace')
+        value = value.strip()
+        if '\n' in value:
+            value = value.replace('\r', '').replace('\n', '')
+        return value
+
+    def segment(self, row: int):
+        """ Elements of the segment at row: a list split on first access, or a Segment view. """
+        elements = self._elements.get(row)
+        if elements is None:
+            start = self.offsets[2 * row]
+            end = self.offsets[2 * row + 1]
+            if self.compact and self.buffer.find('\n' if isinstance(self.buffer, str) else b'\n', start, end) == -1:
+                elements = Segment(self.buffer, start, end, self._raw_delim)
+            else:
+                text = self.buffer[start:end]
+                if not isinstance(text, str):
+                    text = text.decode(ENCODING, 'replace')
+                if '\n' in text:
+                    # Segment wrapped across lines by the sender.
+                    text = text.replace('\r', '').replace('\n', '')
+                elements = text.split(self.element_delim)
+            self._elements[row] = elements
+        return elements
+
+    def rows(self, seg_id: str):
+        return [self.segment(row) for row in self.by_id.get(seg_id, ())]
+
+    def first(self, seg_id: str):
+        rows = self.by_id.get(seg_id)
+        if not rows:
+            return None
+        return self.segment(rows[0])
+
+    def qualified(self, seg_id: str, qual: str):
+        """ Segment seg_id whose qualifier element equals qual, or None. """
+        row = self.by_qual.get((seg_id, qual))
+        if row is None:
+            return None
+        return self.segment(row)
+
+    def __contains__(self, seg_id):
+        return seg_id in self.by_id
+
+    def __getitem__(self, seg_id):
+        if seg_id not in self.by_id:
+            raise KeyError(seg_id)
+        return self.rows(seg_id)
+
+    def get(self, seg_id, default=None):
+        if seg_id not in self.by_id:
+            return default
+        return self.rows(seg_id)
+
+    def __len__(self):
+        return len(self.ids)
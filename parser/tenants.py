@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from extract_elements_with_rules import DEFAULT_BROKER_ID
+from loader import REGISTRY
+from metrics import METRICS
+from profile_registry import ProfileRegistry, ProfileResolver
+
+logger = logging.getLogger("edi210.tenants")
+
+# --- Tenants: broker entities sharing one parser fleet ---
+# A tenant has the broker ID that marks its invoices as "Buy" (GS03) and, optionally,
+# a profile namespace: a directory of partner/version profiles layered over the
+# shared profiles tree. Plans from the shared tree are compiled once and used by
+# every tenant that does not override them.
+
+DEFAULT_TENANT = "default"
+TENANT_HEADER = "X-Tenant-ID"
+
+_TENANTS = {}
+# Raw tenant config as last configured, handed to process-pool workers.
+_CONFIG = {}
+# Bumped by every configure_tenants, so the process pool knows its workers' tenants are stale.
+_GENERATION = 0
+# Stop events of the namespace watchers, or None when namespaces are not watched.
+_WATCHERS = None
+_WATCH_INTERVAL = None
+_LOCK = threading.Lock()
+
+
+class UnknownTenant(ValueError):
+    """ Raised by get_tenant for a tenant ID that is not configured. """
+
+
+class Tenant:
+    """
+    One broker entity: its broker ID, profile namespace and throughput counters.
+
+    snapshot() and resolver() give the shared plans overlaid with the namespace's,
+    rebuilt only when either registry reloads; the resolver memoizes envelopes per
+    tenant, since a namespace can change which plan an envelope gets.
+    """
+
+    def __init__(self, tenant_id: str, broker_id: str, shared: ProfileRegistry, namespace: str = None):
+        self.tenant_id = tenant_id
+        self.broker_id = broker_id
+        self.shared = shared
+        self.namespace = ProfileRegistry(namespace) if namespace else None
+        self._view = None
+        self._lock = threading.Lock()
+        self.parses = 0
+        self.invoices = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.started = time.time()
+
+    @property
+    def version(self):
+        """ (shared registry version, namespace version); changes whenever either reloads. """
+        return self.shared.version, self.namespace.version if self.namespace is not None else 0
+
+    def _current(self):
+        view = self._view
+        version = self.version
+        if view is None or view[0] != version:
+            with self._lock:
+                view = self._view
+                if view is None or view[0] != version:
+                    snapshot = MappingProxyType({**self.shared.snapshot(), **self.namespace.snapshot()})
+                    view = self._view = (version, snapshot, ProfileResolver(snapshot))
+        return view
+
+    def snapshot(self):
+        if self.namespace is None:
+            return self.shared.snapshot()
+        return self._current()[1]
+
+    def resolver(self):
+        """ ProfileResolver for this tenant; grab it once per request. """
+        if self.namespace is None:
+            return self.shared.resolver()
+        return self._current()[2]
+
+    def reload(self):
+        """ Re-read the namespace's changed profiles (the shared registry reloads on its own). """
+        if self.namespace is None:
+            return {"loaded": [], "updated": [], "removed": [], "errors": []}
+        return self.namespace.reload()
+
+    def record(self, invoices: int, nbytes: int, seconds: float):
+        """ Count one finished parse toward this tenant's throughput. """
+        with self._lock:
+            self.parses += 1
+            self.invoices += invoices
+            self.bytes += nbytes
+            self.busy_seconds += seconds
+        if METRICS.enabled:
+            METRICS.observe_tenant(self.tenant_id, invoices, nbytes, seconds)
+
+    def stats(self):
+        with self._lock:
+            busy = self.busy_seconds
+            return {
+                "tenant": self.tenant_id,
+                "broker_id": self.broker_id,
+                "namespace": str(self.namespace.base_path) if self.namespace is not None else None,
+                "profiles": len(self.snapshot()),
+                "parses": self.parses,
+                "invoices": self.invoices,
+                "bytes": self.bytes,
+                "busy_sec": busy,
+                "invoices_per_sec": self.invoices / busy if busy else 0.0,
+                "mb_per_sec": self.bytes / (1024 * 1024) / busy if busy else 0.0,
+                "uptime_sec": time.time() - self.started,
+            }
+
+
+def _default_tenants():
+    return {DEFAULT_TENANT: Tenant(DEFAULT_TENANT, DEFAULT_BROKER_ID, REGISTRY)}
+
+
+def configure_tenants(config=None):
+    """
+    Install the tenants from config: a dict or the path of a JSON file, by default
+    TENANTS_CONFIG. Without one only the default tenant exists. Shape:
+
+        {"acme": {"broker_id": "ACMEBROKER", "profiles": "tenants/acme"}, ...}
+
+    "profiles" is the tenant's namespace, relative to the shared profiles directory
+    unless absolute. A "default" entry overrides the default tenant's broker ID
+    (otherwise BROKER_ID). Namespaces are loaded here.
+    """
+    global _TENANTS, _CONFIG, _GENERATION
+    if config is None:
+        config = os.environ.get("TENANTS_CONFIG") or {}
+    if not isinstance(config, dict):
+        config = json.loads(Path(config).read_text())
+    tenants = _default_tenants()
+    for tenant_id, entry in config.items():
+        broker_id = entry.get("broker_id")
+        if not broker_id or not isinstance(broker_id, str):
+            raise ValueError(f"Tenant '{tenant_id}' needs a broker_id")
+        namespace = entry.get("profiles")
+        if namespace is not None:
+            namespace = Path(namespace) if Path(namespace).is_absolute() else REGISTRY.base_path / namespace
+        tenants[tenant_id] = tenant = Tenant(tenant_id, broker_id, REGISTRY, namespace)
+        tenant.reload()
+    with _LOCK:
+        _TENANTS = tenants
+        _CONFIG = config
+        _GENERATION += 1
+        if _WATCHERS is not None:
+            _restart_watchers()
+    return tenants
+
+
+def tenants_config():
+    return _CONFIG
+
+
+def tenants_generation():
+    """ Changes whenever configure_tenants installs a new set of tenants. """
+    return _GENERATION
+
+
+def namespace_versions():
+    """ {tenant_id: namespace version} of every tenant, as workers compare them. """
+    return {tenant.tenant_id: tenant.version[1] for tenant in all_tenants()}
+
+
+def start_tenant_watchers(interval: float = None):
+    """
+    Hot-reload every tenant namespace the way ProfileRegistry.start_watcher does the
+    shared tree; tenants configured later are watched too.
+    """
+    global _WATCHERS, _WATCH_INTERVAL
+    with _LOCK:
+        _WATCH_INTERVAL = interval
+        if _WATCHERS is None:
+            _WATCHERS = []
+            _restart_watchers()
+
+
+def stop_tenant_watchers():
+    global _WATCHERS
+    with _LOCK:
+        for stop in _WATCHERS or ():
+            stop.set()
+        _WATCHERS = None
+
+
+def _restart_watchers():
+    """ Swap the watchers over to the current tenants' namespaces. Caller holds _LOCK. """
+    for stop in _WATCHERS:
+        stop.set()
+    _WATCHERS.clear()
+    for tenant in _TENANTS.values():
+        if tenant.namespace is None:
+            continue
+        if not tenant.namespace.base_path.is_dir():
+            logger.warning("Not watching tenant %s: %s is not a directory", tenant.tenant_id,
+                           tenant.namespace.base_path)
+            continue
+        _WATCHERS.append(tenant.namespace.start_watcher(_WATCH_INTERVAL))
+
+
+def get_tenant(tenant_id: str = None) -> Tenant:
+    """ The tenant for tenant_id (the default tenant for None); raises UnknownTenant. """
+    tenant = _TENANTS.get(tenant_id or DEFAULT_TENANT)
+    if tenant is None:
+        raise UnknownTenant(f"Unknown tenant '{tenant_id}'")
+    return tenant
+
+
+def as_tenant(tenant) -> Tenant:
+    """ Accepts None (default tenant), a tenant ID or a Tenant. """
+    if isinstance(tenant, Tenant):
+        return tenant
+    return get_tenant(tenant)
+
+
+def all_tenants():
+    return list(_TENANTS.values())
+
+
+def reload_tenants():
+    """ Reload every tenant namespace; returns {tenant_id: report}. """
+    return {tenant.tenant_id: tenant.reload() for tenant in all_tenants() if tenant.namespace is not None}
+
+
+_TENANTS = _default_tenants()
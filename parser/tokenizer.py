@@ -1,14 +1,178 @@
+import mmap
+from typing import NamedTuple
+
+ENVELOPE_SEGMENTS = ('ISA', 'GS')
+# Segments that can only come after an SE; one of them ends an ST that never got its SE.
+_CLOSING_SEGMENTS = ('GE', 'IEA') + ENVELOPE_SEGMENTS
+ISA_ELEMENT_COUNT = 16
+ENCODING = 'utf-8'
+
+# Membership tests work for both str characters and bytes items (ints).
+_STR_WHITESPACE = ' \t\r\n\x0b\x0c'
+_BYTES_WHITESPACE = b' \t\r\n\x0b\x0c'
+
+
+class Delimiters(NamedTuple):
+    element: str
+    component: str
+    segment: str
+
+    def encoded(self):
+        """ The same delimiters as bytes, for tokenizing a bytes buffer. """
+        return Delimiters(*(d.encode('latin-1') for d in self))
+
+
+DEFAULT_DELIMITERS = Delimiters('*', '>', '~')
+
+
+def as_buffer(edi_text):
+    """
+    Normalise parser input to something the tokenizer can search and slice:
+    str, bytes, bytearray and mmap pass through; a memoryview is unwrapped to
+    its underlying object when it spans all of it, and copied otherwise.
+    """
+    if isinstance(edi_text, (str, bytes, bytearray, mmap.mmap)):
+        return edi_text
+    if isinstance(edi_text, memoryview):
+        obj = edi_text.obj
+        if isinstance(obj, (bytes, bytearray, mmap.mmap)) and edi_text.contiguous and edi_text.nbytes == len(obj):
+            return obj
+        return edi_text.tobytes()
+    raise RuntimeError(f"Failed to tokenize EDI: expected str or bytes, got {type(edi_text).__name__}")
+
+
+def sniff_delimiters(edi_text):
+    """
+    Read the delimiters an interchange declares in its ISA header: the element
+    separator right after 'ISA', the component separator as ISA16, and the segment
+    terminator immediately after it (byte 3, 104 and 105 of a fixed-width ISA).
+    The ISA is walked by separator count rather than fixed offsets, so headers
+    with mis-padded fields still sniff correctly. CR/LF terminators resolve to
+    newline; the CR is trimmed as whitespace while splitting.
+    Always returns str delimiters; use .encoded() for a bytes buffer.
+    """
+    is_text = isinstance(edi_text, str)
+    pos = edi_text.find('ISA' if is_text else b'ISA', 0, 1024)
+    if pos == -1 or pos + 4 > len(edi_text):
+        return DEFAULT_DELIMITERS
+    element = edi_text[pos + 3:pos + 4]
+    if element.isalnum() or element.isspace():
+        return DEFAULT_DELIMITERS
+    sep = pos + 3
+    for _ in range(ISA_ELEMENT_COUNT - 1):
+        sep = edi_text.find(element, sep + 1)
+        if sep == -1:
+            return DEFAULT_DELIMITERS
+    if sep + 2 >= len(edi_text):
+        return DEFAULT_DELIMITERS
+    component = edi_text[sep + 1:sep + 2]
+    segment = edi_text[sep + 2:sep + 3]
+    if not is_text:
+        element, component, segment = (d.decode('latin-1') for d in (element, component, segment))
+    if segment == '\r':
+        following = edi_text[sep + 3:sep + 4]
+        segment = '\n' if following in ('\n', b'\n') else '\r'
+    return Delimiters(element, component, segment)
+
+
+def iter_segment_spans(edi_text, segment_delim='~'):
+    """
+    Walk the EDI text once and yield (start, end) offsets of every non-blank
+    segment, with surrounding whitespace and the terminator excluded.
+    Works on str and on bytes-like buffers (with a bytes segment_delim).
+    """
+    whitespace = _STR_WHITESPACE if isinstance(edi_text, str) else _BYTES_WHITESPACE
+    pos = 0
+    length = len(edi_text)
+    while pos < length:
+        end = edi_text.find(segment_delim, pos)
+        if end == -1:
+            end = length
+        start, stop = pos, end
+        while start < stop and edi_text[start] in whitespace:
+            start += 1
+        while stop > start and edi_text[stop - 1] in whitespace:
+            stop -= 1
+        if start < stop:
+            yield start, stop
+        pos = end + 1
+
+
+def iter_segments(edi_text: str, element_delim: str = '*', segment_delim: str = '~'):
+    """
+    Walk the EDI text once and yield (start, end, elements) for every segment.
+    """
+    for start, end in iter_segment_spans(edi_text, segment_delim):
+        yield start, end, edi_text[start:end].split(element_delim)
+
+
+def iter_transaction_sets(edi_text, element_delim='*', segment_delim='~'):
+    """
+    Yield (envelope, transaction) pairs cut at real ST/SE segment boundaries.
+    Both are lists of (seg_id, start, end) spans into edi_text: envelope holds
+    the ISA/GS segments in force for the transaction set and transaction holds
+    the segments from ST through SE. Only one transaction set is held in memory
+    at a time. For bytes input the delimiters must be bytes; segment IDs are
+    always yielded as str.
+    """
+    is_text = isinstance(edi_text, str)
+    # bytearray slices are bytearrays, which cannot key the seg_ids memo.
+    hashable = is_text or not isinstance(edi_text, bytearray)
+    seg_ids = {}
+    envelope = {}
+    transaction = None
+    for start, end in iter_segment_spans(edi_text, segment_delim):
+        id_end = edi_text.find(element_delim, start, end)
+        raw_id = edi_text[start:end if id_end == -1 else id_end]
+        if not hashable:
+            raw_id = bytes(raw_id)
+        seg_id = seg_ids.get(raw_id)
+        if seg_id is None:
+            seg_id = raw_id if is_text else raw_id.decode(ENCODING, 'replace')
+            seg_id = seg_id.strip()
+            if '\n' in seg_id:
+                seg_id = seg_id.replace('\r', '').replace('\n', '')
+            seg_ids[raw_id] = seg_id
+        span = (seg_id, start, end)
+        if seg_id == 'ST':
+            if transaction:
+                # ST without a closing SE: hand it over as-is and let validation complain.
+                yield list(envelope.values()), transaction
+            transaction = [span]
+        elif transaction is not None and seg_id not in _CLOSING_SEGMENTS:
+            transaction.append(span)
+            if seg_id == 'SE':
+                yield list(envelope.values()), transaction
+                transaction = None
+        else:
+            if transaction:
+                # ST whose group ended before its SE: hand it over the same way.
+                yield list(envelope.values()), transaction
+                transaction = None
+            if seg_id in ENVELOPE_SEGMENTS:
+                if seg_id == 'ISA':
+                    envelope = {}
+                envelope[seg_id] = span
+    if transaction:
+        yield list(envelope.values()), transaction
+
+
+def iter_transaction_set_texts(edi_text, element_delim='*', segment_delim='~'):
+    """
+    Yield each transaction set as a standalone interchange string: its ISA/GS
+    envelope followed by the ST..SE segments, ready to hand to another process.
+    """
+    for envelope, transaction in iter_transaction_sets(edi_text, element_delim, segment_delim):
+        parts = [edi_text[start:end] for _, start, end in envelope]
+        parts.append(edi_text[transaction[0][1]:transaction[-1][2]])
+        yield segment_delim.join(parts) + segment_delim
+
+
 def tokenize_edi(edi_text: str):
     """ Tokenize EDI text into segments and elements. """
-    
-    element_delim = '*'
-    segment_delim = '~'
-    
-    edi_text = edi_text.replace('\n', '')
+    delimiters = sniff_delimiters(edi_text)
     segments = {}
-    segments_data = edi_text.strip().split(segment_delim)
-    for seg in segments_data:
-        elements = seg.split(element_delim)
+    for _, _, elements in iter_segments(edi_text, delimiters.element, delimiters.segment):
         key = elements[0].strip()
         segments.setdefault(key, []).append(elements)
     return segments
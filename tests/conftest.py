@@ -0,0 +1,59 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "parser"))
+sys.path.insert(0, str(ROOT / "Output_Validation"))
+
+FIXTURES = ROOT / "tests" / "fixtures"
+EXPECTED = ROOT / "tests" / "expected"
+PROFILES = ROOT / "profiles"
+
+
+def fixture_bytes(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+def expected(name: str) -> dict:
+    return json.loads((EXPECTED / name).read_text())
+
+
+def comparable(value):
+    """
+    A golden invoice in the notation of tests/expected: the extractor's "null"
+    placeholders as None, side lower-case and the total as a number.
+    """
+    if isinstance(value, dict):
+        value = {key: comparable(item) for key, item in value.items()}
+        if "side" in value and isinstance(value["side"], str):
+            value["side"] = value["side"].lower()
+        if isinstance(value.get("total"), str):
+            value["total"] = float(value["total"])
+        return value
+    if isinstance(value, list):
+        return [comparable(item) for item in value]
+    return None if value == "null" else value
+
+
+@pytest.fixture(scope="session", autouse=True)
+def profiles():
+    """ The shared profiles tree, loaded into the process-wide registry once. """
+    from loader import REGISTRY, load_profiles
+    assert load_profiles(str(PROFILES))
+    return REGISTRY
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as test_client:
+        yield test_client
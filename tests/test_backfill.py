@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+import backfill
+from conftest import FIXTURES, PROFILES
+from invoice_store import InvoiceStore
+from mapper import parse_invoice
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """ Three copies of every fixture, with their invoice IDs made distinct per copy. """
+    root = tmp_path / "archive"
+    expected = set()
+    for copy in range(3):
+        directory = root / f"day{copy}"
+        directory.mkdir(parents=True)
+        for path in sorted(FIXTURES.glob("*.edi")):
+            data = path.read_bytes().replace(b"*INV", f"*INV{copy}-".encode())
+            target = directory / path.name
+            target.write_bytes(data)
+            invoices, _ = parse_invoice(data)
+            expected.update((str(target.resolve()), set_index, invoice["invoice_id"])
+                            for set_index, invoice in enumerate(invoices))
+    return root, expected
+
+
+def _crash_on_second_checkpoint(monkeypatch):
+    """ Make the run die after its second flush reached the output but before the checkpoint. """
+    record = backfill.Checkpoint.record
+    calls = []
+
+    def crashing_record(self, files, position):
+        calls.append(files)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return record(self, files, position)
+
+    monkeypatch.setattr(backfill.Checkpoint, "record", crashing_record)
+    return calls
+
+
+def _ndjson_rows(output):
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    return [(row["file"], row["set_index"], row["invoice"]["invoice_id"]) for row in rows]
+
+
+def _sqlite_rows(output):
+    store = InvoiceStore(str(output))
+    try:
+        rows = store._db.execute("SELECT source, invoice_id FROM invoices ORDER BY id").fetchall()
+    finally:
+        store.close()
+    return rows
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "sqlite"])
+def test_resumed_backfill_neither_repeats_nor_skips(archive, tmp_path, monkeypatch, fmt):
+    root, expected = archive
+    output = tmp_path / f"out.{fmt}"
+    options = dict(fmt=fmt, workers=2, flush_every=2, profiles_dir=str(PROFILES))
+
+    calls = _crash_on_second_checkpoint(monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        backfill.run_backfill([root], str(output), **options)
+    monkeypatch.undo()
+    checkpointed = len(calls[0])
+
+    report = backfill.run_backfill([root], str(output), **options)
+
+    files = len(list(root.rglob("*.edi")))
+    assert report["skipped"] == checkpointed
+    assert report["files"] == files - checkpointed
+    if fmt == "ndjson":
+        rows = _ndjson_rows(output)
+        assert len(rows) == len(set(rows))
+        assert set(rows) == expected
+    else:
+        rows = _sqlite_rows(output)
+        assert len(rows) == len(set(rows))
+        assert set(rows) == {(file, invoice_id) for file, _, invoice_id in expected}
+
+
+def test_finished_backfill_is_not_redone(archive, tmp_path):
+    root, expected = archive
+    output = tmp_path / "out.ndjson"
+
+    first = backfill.run_backfill([root], str(output), workers=2, profiles_dir=str(PROFILES))
+    second = backfill.run_backfill([root], str(output), workers=2, profiles_dir=str(PROFILES))
+
+    assert first["transaction_sets"] == len(expected)
+    assert second["files"] == 0 and second["skipped"] == first["files"]
+    assert sorted(_ndjson_rows(output)) == sorted(expected)
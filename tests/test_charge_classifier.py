@@ -0,0 +1,96 @@
+import pytest
+
+from charge_classifier import ChargeClassifier, KeywordAutomaton
+from conftest import FIXTURES
+from mapper import iter_prepared
+from profile_plan import ChargeRule
+
+# Bucket every L1 description of every fixture classifies into, per the plan it resolves to.
+# Keywords match anywhere in the description, and the first matching rule in the profile wins.
+# "DETENTION 2 HRS" is the one line this changed: it used to need a whole-element match,
+# so it fell through to charges.other.
+EXPECTED_L1 = {
+    "malformed_missing_total.edi": [("BASE FREIGHT", "base_freight")],
+    "sample_5010_sac.edi": [("BASE FREIGHT", "base_freight")],
+    "sample_batch_multi_st.edi": [("BASE FREIGHT", "base_freight"), ("BASE FREIGHT", "base_freight")],
+    "sample_hybrid.edi": [("BASE FREIGHT", "base_freight"), ("DETENTION 2 HRS", "detention")],
+    "sample_l1.edi": [("BASE FREIGHT", "base_freight"), ("FUEL SURCHARGE", "fuel_surcharge"),
+                      ("DETENTION", "detention")],
+    # CARRIERY is SAC_only: its L1 lines are never classified.
+    "sample_sac.edi": [],
+}
+
+
+def _first_rule_containing(rules, description):
+    """ The classification spelled out: the first rule with a keyword inside the description. """
+    for rule in rules:
+        if any(keyword in description for keyword in rule.contains):
+            return rule
+    return None
+
+
+def _l1_lines(name):
+    for plan, segments, _, _ in iter_prepared((FIXTURES / name).read_bytes()):
+        if not (plan.use_l1 and plan.l1_rules):
+            continue
+        for l1 in segments['L1'] if 'L1' in segments else ():
+            yield plan, l1[-1].strip()
+
+
+def test_every_fixture_is_pinned():
+    assert sorted(EXPECTED_L1) == sorted(path.name for path in FIXTURES.glob("*.edi"))
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED_L1))
+def test_fixture_l1_descriptions(name):
+    classified = []
+    for plan, description in _l1_lines(name):
+        rule = plan.charge_classifier.classify_l1(description)
+        assert rule is _first_rule_containing(plan.l1_rules, description)
+        classified.append((description, rule.bucket if rule else None))
+    assert classified == EXPECTED_L1[name]
+
+
+RULES = [
+    ChargeRule("base_freight", contains=("BASE", "LINEHAUL", "LINE HAUL")),
+    ChargeRule("fuel_surcharge", contains=("FSC", "FUEL")),
+    ChargeRule("detention", contains=("DETENTION", "WAIT")),
+    ChargeRule("other", contains=("LUMPER",), label="LUM"),
+]
+
+
+@pytest.mark.parametrize("description, bucket", [
+    ("BASE FREIGHT", "base_freight"),
+    ("LINE HAUL", "base_freight"),
+    ("FUEL SURCHARGE", "fuel_surcharge"),
+    ("DETENTION 2 HRS", "detention"),
+    ("DRIVER WAIT TIME", "detention"),
+    # Substring matches, including inside longer words.
+    ("BASEMENT DELIVERY", "base_freight"),
+    ("FSC2", "fuel_surcharge"),
+    # Several rules match: the one listed first wins, wherever its keyword sits.
+    ("DETENTION WAIT FUEL", "fuel_surcharge"),
+    ("LUMPER FEE BASE RATE", "base_freight"),
+    ("LUMPER FEE", "other"),
+    ("HAZMAT", None),
+    ("", None),
+])
+def test_first_listed_rule_wins(description, bucket):
+    rule = ChargeClassifier(RULES, []).classify_l1(description)
+    assert (rule.bucket if rule else None) == bucket
+    assert rule is _first_rule_containing(RULES, description)
+
+
+def test_automaton_overlapping_keywords():
+    automaton = KeywordAutomaton([("SURCHARGE", 2), ("CHARGE", 1), ("FUEL SURCHARGE", 3), ("", 0)])
+    assert automaton.best("FUEL SURCHARGE") == 1
+    assert automaton.best("SURCHARG") is None
+    assert automaton.best("XXCHARGEXX") == 1
+    assert automaton.best("FUEL SURCHARG") is None
+
+
+def test_sac_codes_first_rule_wins():
+    rules = [ChargeRule("fuel_surcharge", code_in=("FUE", "D24")), ChargeRule("detention", code_in=("D24",))]
+    classifier = ChargeClassifier([], rules)
+    assert classifier.classify_sac("D24") is rules[0]
+    assert classifier.classify_sac("FUEL") is None
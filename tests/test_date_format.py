@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import fixture_bytes
+from date_format import CENTURY_PIVOT, compile_date_format
+from mapper import parse_invoice
+
+
+@pytest.mark.parametrize("fmt, value, iso", [
+    ("yyyyMMdd", "20251101", "2025-11-01"),
+    ("CCYYMMDD", "19991231", "1999-12-31"),
+    ("yyMMdd", "251101", "2025-11-01"),
+    ("YYMMDD", "991231", "1999-12-31"),
+    ("yyyy-MM-dd", "2025-11-01", "2025-11-01"),
+    ("MMddyyyy", "11012025", "2025-11-01"),
+    ("CCYYMMDD|YYMMDD", "20240229", "2024-02-29"),
+    ("CCYYMMDD|YYMMDD", "240229", "2024-02-29"),
+])
+def test_converts_to_iso(fmt, value, iso):
+    assert compile_date_format(fmt)(value) == iso
+
+
+@pytest.mark.parametrize("value, iso", [
+    ("000101", "2000-01-01"),
+    (f"{CENTURY_PIVOT - 1}0101", f"20{CENTURY_PIVOT - 1}-01-01"),
+    (f"{CENTURY_PIVOT}0101", f"19{CENTURY_PIVOT}-01-01"),
+    ("991231", "1999-12-31"),
+])
+def test_two_digit_years_pivot_at_70(value, iso):
+    assert CENTURY_PIVOT == 70
+    assert compile_date_format("YYMMDD")(value) == iso
+
+
+@pytest.mark.parametrize("value", [
+    "20250230",  # not a calendar date
+    "20251301",
+    "20231229 ",  # wrong width
+    "2025110",
+    "2025AB01",
+    "",
+    "230229",  # 2023 is not a leap year
+])
+def test_invalid_dates_are_none(value):
+    assert compile_date_format("CCYYMMDD|YYMMDD")(value) is None
+
+
+@pytest.mark.parametrize("fmt", ["yyyyMM", "yyyyMMddyy", "CCYYMMDD|yyyyMMdd", "yyyyMMdq", ""])
+def test_bad_formats_are_rejected(fmt):
+    with pytest.raises(ValueError):
+        compile_date_format(fmt)
+
+
+def test_invalid_invoice_date_is_kept_with_a_warning():
+    edi = fixture_bytes("sample_l1.edi").replace(b"*20251101*PP*", b"*20251341*PP*")
+    [valid], _ = parse_invoice(fixture_bytes("sample_l1.edi"))
+    [invoice], [warnings] = parse_invoice(edi)
+
+    assert invoice["dates"]["invoice"] == "20251341"
+    assert "B3 date '20251341' does not match format yyyyMMdd." in warnings
+    assert invoice["metadata"]["confidence"] == pytest.approx(valid["metadata"]["confidence"] - 0.05)
+    assert invoice["dates"]["pickup"] == "2025-10-30"
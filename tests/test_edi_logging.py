@@ -0,0 +1,36 @@
+import logging
+
+from conftest import fixture_bytes
+from edi_logging import EXTRACT_LOGGER_NAME, set_partner_debug
+from mapper import parse_invoice
+
+
+def test_made_up_senders_share_one_logger():
+    edi = fixture_bytes("sample_hybrid.edi")
+    for n in range(20):
+        parse_invoice(edi.replace(b"CARRIERZ", f"FAKE{n:04d}".encode()))
+
+    names = logging.Logger.manager.loggerDict
+    assert not [name for name in names if "FAKE" in name or "CARRIERZ" in name]
+
+
+def test_unconfigured_partner_traces_go_to_the_shared_logger(caplog):
+    with caplog.at_level(logging.DEBUG, logger=EXTRACT_LOGGER_NAME):
+        parse_invoice(fixture_bytes("sample_hybrid.edi"))
+
+    assert {record.name for record in caplog.records} == {EXTRACT_LOGGER_NAME}
+
+
+def test_partner_debug_traces_only_that_partner(caplog):
+    set_partner_debug("CARRIERX")
+    try:
+        with caplog.at_level(logging.DEBUG, logger="edi210"):
+            logging.getLogger(EXTRACT_LOGGER_NAME).setLevel(logging.WARNING)
+            parse_invoice(fixture_bytes("sample_l1.edi"))
+            parse_invoice(fixture_bytes("sample_sac.edi"))
+    finally:
+        set_partner_debug("CARRIERX", False)
+        logging.getLogger(EXTRACT_LOGGER_NAME).setLevel(logging.NOTSET)
+
+    assert caplog.records
+    assert {record.name for record in caplog.records} == {f"{EXTRACT_LOGGER_NAME}.CARRIERX"}
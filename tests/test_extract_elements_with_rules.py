@@ -0,0 +1,20 @@
+from conftest import fixture_bytes
+from extract_elements_with_rules import _not_found
+from mapper import iter_prepared, parse_invoice
+
+
+def test_short_segment_is_not_reported_as_missing():
+    # CARRIER5010 reads the BOL from B3 element 7; this B3 has six elements.
+    [invoice], [warnings] = parse_invoice(fixture_bytes("sample_5010_sac.edi"))
+
+    assert invoice["refs"]["bol"] == "null"
+    assert "B3 element 7 missing." in warnings
+    assert "B3 not found." not in warnings
+
+
+def test_absent_segment_is_reported_as_not_found():
+    [(plan, segments, _, _)] = iter_prepared(fixture_bytes("sample_5010_sac.edi"))
+
+    assert _not_found(segments, plan.bol[0]) == "B3 element 7 missing."
+    assert _not_found(segments, plan.bol[0]._replace(seg="N9")) == "N9 not found."
+    assert _not_found(segments, plan.bol[0]._replace(seg="REF", qual="BM", idx=2)) == "REF not found."
@@ -0,0 +1,78 @@
+import copy
+
+import pytest
+
+from conftest import FIXTURES, expected
+from JSON_Schema_Validator import validate_invoice
+from fast_validator import invoice_errors, validate_batch
+from mapper import parse_invoice
+
+
+def _locs(result):
+    return sorted(tuple(error["loc"]) for error in result["errors"])
+
+
+def _both(invoice):
+    return _locs(validate_invoice(invoice)), _locs(validate_invoice(invoice, fast=True))
+
+
+@pytest.mark.parametrize("name", sorted(path.name for path in FIXTURES.glob("*.edi")))
+def test_fast_path_reports_what_the_model_reports_on_every_fixture(name):
+    invoices, _ = parse_invoice((FIXTURES / name).read_bytes())
+    assert invoices
+    for invoice in invoices:
+        model, fast = _both(invoice)
+        assert fast == model
+
+
+def test_numeric_string_total_is_accepted():
+    invoice = expected("sample_l1.json")
+    invoice["total"] = "2543.80"
+    assert validate_invoice(invoice)["is_valid"]
+    assert invoice_errors(invoice) == []
+
+    invoice["total"] = "n/a"
+    model, fast = _both(invoice)
+    assert fast == model == [("total",)]
+
+
+@pytest.mark.parametrize("path, value", [
+    (("side",), "Buy"),
+    (("dates", "pickup"), "null"),
+    (("metadata", "confidence"), "1.5"),
+    (("currency",), "US"),
+    (("source", "type"), "fax"),
+])
+def test_violations_match(path, value):
+    invoice = expected("sample_l1.json")
+    target = invoice
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+
+    model, fast = _both(invoice)
+    assert fast == model == [path]
+
+
+def test_optional_properties_may_be_null_and_defaults_are_not_required():
+    invoice = expected("sample_l1.json")
+    for key in ("carrier", "customer", "refs", "parties", "evidence"):
+        invoice[key] = None
+    invoice["metadata"]["confidence"] = None
+    del invoice["side"]
+    del invoice["charges"]["fuel_surcharge"]
+    assert _both(invoice) == ([], [])
+
+    invoice["charges"]["detention"] = None
+    assert _both(invoice) == ([("charges", "detention")], [("charges", "detention")])
+
+
+def test_validate_batch_lists_only_failures():
+    good = expected("sample_l1.json")
+    bad = copy.deepcopy(good)
+    bad["side"] = "Buy"
+
+    [failure] = validate_batch([good, bad])
+    assert failure["index"] == 1
+    assert failure["invoice_id"] == "INV1001"
+    assert [tuple(error["loc"]) for error in failure["errors"]] == [("side",)]
@@ -0,0 +1,131 @@
+import json
+import os
+
+import pytest
+
+import incremental
+from conftest import FIXTURES, PROFILES, fixture_bytes
+from incremental import ExtractionStore, reextract
+from mapper import parse_invoice
+from tenants import configure_tenants, get_tenant
+
+
+def _write_override(namespace, change):
+    """ Write CARRIERX's profile into the namespace with change(profile) applied. """
+    path = namespace / "CARRIERX" / "004010" / "profile.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile = json.loads((PROFILES / "CARRIERX" / "004010" / "profile.json").read_text())
+    change(profile)
+    path.write_text(json.dumps(profile))
+    # Reloads compare mtimes; make sure a rewrite within the same tick still counts.
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    get_tenant("acme").reload()
+
+
+def _set_currency(profile):
+    profile["currency"] = {"default": "EUR"}
+
+
+def _ship_from_city(profile):
+    profile["segments"]["parties"][0]["nameIdx"] = 4
+
+
+def _pickup_as_delivery(profile):
+    profile["segments"]["dates"][0]["qual"] = "70"
+
+
+def _bump_version(profile):
+    profile["profile_version"] = "1.0.1"
+
+
+@pytest.fixture
+def namespace(tmp_path):
+    namespace = tmp_path / "acme"
+    namespace.mkdir()
+    configure_tenants({"acme": {"broker_id": "OURBROKER", "profiles": str(namespace)}})
+    yield namespace
+    configure_tenants({})
+
+
+@pytest.fixture
+def store(tmp_path, namespace):
+    store = ExtractionStore(str(tmp_path / "sets.sqlite"), tenant="acme")
+    for path in sorted(FIXTURES.glob("*.edi")):
+        store.record(path.read_bytes(), path.name)
+    yield store
+    store.close()
+
+
+def _stored(store, source):
+    keys = [key for key, in store._db.execute("SELECT key FROM transaction_sets WHERE source = ? ORDER BY rowid",
+                                              (source,))]
+    return [store.invoice(key) for key in keys]
+
+
+def test_recorded_invoices_match_a_full_parse(store):
+    for path in sorted(FIXTURES.glob("*.edi")):
+        invoices, warnings = parse_invoice(path.read_bytes(), tenant="acme")
+        assert _stored(store, path.name) == list(zip(invoices, warnings))
+
+
+def test_nothing_runs_while_the_profiles_are_unchanged(store):
+    report = reextract(store)
+    assert report["checked"] == report["current"] == len(store)
+    assert report["groups_run"] == {}
+    assert report["reextracted"] == report["changed"] == 0
+
+
+@pytest.mark.parametrize("change, group, field", [
+    (_set_currency, "charges", "currency"),
+    (_ship_from_city, "parties", "parties.ship_from"),
+    (_pickup_as_delivery, "dates", "dates.pickup"),
+])
+def test_only_the_changed_rule_group_reruns(store, namespace, monkeypatch, change, group, field):
+    ran = []
+    run_rule_group = incremental.run_rule_group
+    monkeypatch.setattr(incremental, "run_rule_group",
+                        lambda name, *args: ran.append(name) or run_rule_group(name, *args))
+    _write_override(namespace, change)
+
+    report = reextract(store)
+
+    # sample_l1 is the only CARRIERX set; every other envelope keeps its plan.
+    assert ran == [group]
+    assert report["groups_run"] == {group: 1}
+    assert report["reextracted"] == report["changed"] == 1
+    assert report["current"] == len(store) - 1
+    [changed] = report["changes"]
+    assert changed["groups"] == [group]
+    assert field in changed["fields"]
+    expected = parse_invoice(fixture_bytes("sample_l1.edi"), tenant="acme")
+    assert _stored(store, "sample_l1.edi") == list(zip(*expected))
+
+    # The store is up to date now, so a second pass has nothing to do.
+    again = reextract(store)
+    assert again["groups_run"] == {}
+    assert again["current"] == len(store)
+
+
+def test_metadata_only_change_refreshes_without_rerunning(store, namespace):
+    before = _stored(store, "sample_l1.edi")
+    _write_override(namespace, _bump_version)
+
+    report = reextract(store)
+
+    assert report["refreshed"] == 1
+    assert report["groups_run"] == {}
+    assert _stored(store, "sample_l1.edi") == before
+    assert reextract(store)["current"] == len(store)
+
+
+def test_dry_run_leaves_the_store_alone(store, namespace):
+    before = _stored(store, "sample_l1.edi")
+    _write_override(namespace, _set_currency)
+
+    report = reextract(store, dry_run=True)
+
+    assert report["groups_run"] == {"charges": 1}
+    assert report["changes"][0]["fields"]["currency"] == {"old": "USD", "new": "EUR"}
+    assert _stored(store, "sample_l1.edi") == before
+    assert reextract(store)["groups_run"] == {"charges": 1}
@@ -0,0 +1,112 @@
+import copy
+import json
+import sqlite3
+from hashlib import sha256
+
+import pytest
+
+from conftest import fixture_bytes
+from invoice_store import InvoiceStore
+from mapper import parse_invoice
+
+# The invoices table as stores created before tenants had it.
+_PRE_TENANT_SCHEMA = (
+    "CREATE TABLE invoices ("
+    " id INTEGER PRIMARY KEY, invoice_id TEXT, trading_partner TEXT, edi_version TEXT, side TEXT,"
+    " bol TEXT, pro TEXT, load_id TEXT, invoice_date TEXT, total TEXT, currency TEXT, confidence REAL,"
+    " content_hash TEXT NOT NULL, source TEXT, batch INTEGER, invoice TEXT NOT NULL, warnings TEXT NOT NULL,"
+    " created REAL NOT NULL)",
+    "CREATE INDEX invoices_invoice_id ON invoices (invoice_id)",
+    "CREATE INDEX invoices_partner_invoice ON invoices (trading_partner, invoice_id)",
+)
+
+
+@pytest.fixture
+def parsed():
+    return parse_invoice(fixture_bytes("sample_batch_multi_st.edi"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = InvoiceStore(str(tmp_path / "invoices.sqlite"))
+    yield store
+    store.close()
+
+
+def _rows(store):
+    return store._db.execute("SELECT tenant, invoice_id FROM invoices ORDER BY id").fetchall()
+
+
+def test_same_invoice_twice_keeps_one_row(store, parsed):
+    invoices, warnings = parsed
+    first = store.insert(invoices, warnings, "first.edi")
+    again = store.insert(invoices, warnings, "again.edi")
+
+    assert first["inserted"] == 2 and not first["duplicates"]
+    assert again["inserted"] == 0 and again["skipped"] == 2
+    assert [duplicate["kind"] for duplicate in again["duplicates"]] == ["exact", "exact"]
+    assert _rows(store) == [("default", "INV6001"), ("default", "INV6002")]
+
+
+def test_each_tenant_keeps_its_own_row(store, parsed):
+    invoices, warnings = parsed
+    for tenant in ("default", "acme", "default", "acme"):
+        store.insert(invoices, warnings, tenant=tenant)
+
+    assert sorted(_rows(store)) == [("acme", "INV6001"), ("acme", "INV6002"),
+                                    ("default", "INV6001"), ("default", "INV6002")]
+    assert store.stats()["tenants"] == {"acme": 2, "default": 2}
+    [row] = store.duplicates_of(invoices[0], tenant="acme")
+    assert row["tenant"] == "acme"
+
+
+def test_revision_is_stored_and_replace_keeps_one(store, parsed):
+    invoices, warnings = parsed
+    store.insert(invoices[:1], warnings[:1])
+    revised = copy.deepcopy(invoices[0])
+    revised["total"] = "999.00"
+
+    report = store.insert([revised], on_duplicate="replace")
+
+    assert report["duplicates"][0]["kind"] == "revision"
+    assert report["replaced"] == 1 and report["inserted"] == 1
+    [row] = store.duplicates_of(invoices[0])
+    assert row["invoice"]["total"] == "999.00"
+
+
+def test_migrates_a_pre_tenant_store(tmp_path, parsed):
+    invoices, warnings = parsed
+    path = str(tmp_path / "old.sqlite")
+    db = sqlite3.connect(path)
+    for statement in _PRE_TENANT_SCHEMA:
+        db.execute(statement)
+    invoice = invoices[0]
+    # Same content hash the store computes, so a re-send of it counts as exact.
+    content_hash = sha256(json.dumps(invoice, sort_keys=True).encode("utf-8")).hexdigest()
+    db.execute("INSERT INTO invoices (invoice_id, trading_partner, content_hash, source, invoice, warnings, created)"
+               " VALUES (?, ?, ?, 'old.edi', ?, '[]', 0)",
+               (invoice["invoice_id"], invoice["metadata"]["trading_partner"], content_hash, json.dumps(invoice)))
+    db.commit()
+    db.close()
+
+    store = InvoiceStore(path)
+    try:
+        indexes = {row[1] for row in store._db.execute("PRAGMA index_list(invoices)")}
+        assert "invoices_partner_invoice" not in indexes
+        assert "invoices_tenant_invoice" in indexes
+        [old] = store.find(invoice_id=invoice["invoice_id"])
+        assert (old["tenant"], old["source"], old["invoice"]) == ("default", "old.edi", invoice)
+
+        report = store.insert(invoices, warnings, "new.edi")
+        assert report["skipped"] == 1 and report["inserted"] == 1
+        assert _rows(store) == [("default", "INV6001"), ("default", "INV6002")]
+        assert store.insert(invoices[:1], tenant="acme")["inserted"] == 1
+    finally:
+        store.close()
+
+    # Opening the migrated store again is a no-op.
+    reopened = InvoiceStore(path)
+    try:
+        assert reopened.stats()["tenants"] == {"acme": 1, "default": 2}
+    finally:
+        reopened.close()
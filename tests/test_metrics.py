@@ -0,0 +1,78 @@
+import pytest
+
+from conftest import fixture_bytes
+from metrics import METRICS, Histogram, configure_metrics
+
+
+@pytest.fixture
+def metrics_on():
+    configure_metrics(True)
+    yield METRICS
+    configure_metrics(False)
+
+
+def test_metrics_scrape_after_projected_parse(client, metrics_on):
+    edi = fixture_bytes("sample_l1.edi")
+
+    assert client.post("/v1/edi210/parse?fields=invoice_id,total", content=edi).status_code == 200
+    assert client.post("/v1/edi210/parse?fields=invoice_id", content=edi,
+                       headers={"Accept": "application/x-ndjson"}).status_code == 200
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'stage="serialize",partner="unknown",edi_version="unknown"' in response.text
+    assert 'stage="extract",partner="CARRIERX",edi_version="004010"' in response.text
+
+
+def test_render_tolerates_mixed_label_types():
+    histogram = Histogram("h", "doc", ("partner",), (1.0,))
+    histogram.observe(("CARRIERX",), 0.5)
+    histogram.observe((None,), 0.5)
+
+    assert len(histogram.render()) == 2 + 2 * 4
+
+
+def _count(counter, labels):
+    return counter._values.get(labels, 0)
+
+
+def test_batch_workers_report_to_metrics(metrics_on):
+    from parallel import parse_invoices_parallel, shutdown_pool
+
+    edi = fixture_bytes("sample_batch_multi_st.edi")
+    key = ("unknown", "unknown")
+    before = _count(METRICS.invoices, key)
+    try:
+        invoices, _ = parse_invoices_parallel(edi, max_workers=2)
+    finally:
+        shutdown_pool()
+
+    assert len(invoices) == 2
+    assert _count(METRICS.invoices, key) == before + 2
+    assert 'edi210_stage_seconds_count{stage="extract",partner="unknown",edi_version="unknown"}' in METRICS.render()
+
+
+def test_unconfigured_partners_are_labelled_unknown(client, metrics_on):
+    edi = fixture_bytes("sample_l1.edi").replace(b"CARRIERX", b"MADEUP0001")
+    assert client.post("/v1/edi210/parse", content=edi).status_code == 200
+    edi = fixture_bytes("sample_hybrid.edi")
+    assert client.post("/v1/edi210/parse", content=edi).status_code == 200
+
+    text = client.get("/metrics").text
+    assert "MADEUP0001" not in text
+    assert "CARRIERZ" not in text
+    assert 'stage="serialize",partner="unknown",edi_version="unknown"' in text
+    assert 'edi210_profile_fallbacks_total{partner="unknown",edi_version="unknown",fallback="global"}' in text
+
+
+def test_delta_merge_adds_up():
+    source = Histogram("h", "doc", ("partner",), (1.0,))
+    target = Histogram("h", "doc", ("partner",), (1.0,))
+    source.observe(("CARRIERX",), 0.5)
+    target.observe(("CARRIERX",), 2.0)
+
+    target.merge(source.drain())
+
+    assert source.render() == ["# HELP h doc", "# TYPE h histogram"]
+    assert 'h_count{partner="CARRIERX"} 2' in target.render()
+    assert 'h_bucket{partner="CARRIERX",le="1.0"} 1' in target.render()
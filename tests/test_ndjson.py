@@ -0,0 +1,44 @@
+import json
+
+from conftest import FIXTURES, fixture_bytes
+from mapper import parse_invoice
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+def _lines(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_one_line_per_invoice(client):
+    archive = b"".join(path.read_bytes() for path in sorted(FIXTURES.glob("*.edi"))) * 3
+    invoices, warnings = parse_invoice(archive)
+
+    lines = _lines(client.post("/v1/edi210/parse", content=archive, headers=NDJSON))
+
+    assert len(lines) == len(invoices) == 21
+    assert [line["invoice"] for line in lines] == invoices
+    assert [line["warnings"] for line in lines] == warnings
+    assert [line["confidence"] for line in lines] == [invoice["metadata"]["confidence"] for invoice in invoices]
+
+
+def test_projected_lines(client):
+    lines = _lines(client.post("/v1/edi210/parse?fields=invoice_id", content=fixture_bytes("sample_batch_multi_st.edi"),
+                               headers=NDJSON))
+
+    assert [line["invoice"] for line in lines] == [{"invoice_id": "INV6001"}, {"invoice_id": "INV6002"}]
+    assert [line["confidence"] for line in lines] == [None, None]
+
+
+def test_failure_after_the_first_set_ends_with_an_error_line(client):
+    good = fixture_bytes("sample_l1.edi")
+    bad = fixture_bytes("sample_sac.edi").replace(b"B3*", b"ZZ*")
+
+    lines = _lines(client.post("/v1/edi210/parse", content=good + bad, headers=NDJSON))
+
+    assert len(lines) == 2
+    assert lines[0]["invoice"]["invoice_id"] == "INV1001"
+    assert "B3" in lines[1]["error"]
@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import FIXTURES
+from mapper import parse_invoice
+from parallel import parse_invoices_parallel, shutdown_pool
+
+
+@pytest.fixture(scope="module")
+def archive():
+    """ Every fixture interchange back to back, a few times over: many sets, partners and envelopes. """
+    data = b"".join(path.read_bytes() for path in sorted(FIXTURES.glob("*.edi")))
+    return data * 5
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    shutdown_pool()
+
+
+@pytest.mark.parametrize("chunksize", [None, 1, 3])
+def test_parallel_results_come_back_in_serial_order(archive, chunksize):
+    serial = parse_invoice(archive)
+
+    parallel = parse_invoices_parallel(archive, max_workers=2, chunksize=chunksize)
+
+    assert len(serial[0]) == 35
+    assert parallel == serial
+
+
+def test_str_and_projected_input(archive):
+    text = archive.decode()
+
+    assert parse_invoices_parallel(text, max_workers=2) == parse_invoice(text)
+    assert (parse_invoices_parallel(archive, max_workers=2, fields="invoice_id,total")
+            == parse_invoice(archive, fields="invoice_id,total"))
+
+
+def test_batch_route_keeps_order(client, archive):
+    response = client.post("/v1/edi210/parse/batch", content=archive)
+
+    assert response.status_code == 200
+    assert [invoice["invoice_id"] for invoice in response.json()] == [
+        invoice["invoice_id"] for invoice in parse_invoice(archive)[0]]
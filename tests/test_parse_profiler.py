@@ -0,0 +1,98 @@
+import threading
+import time
+
+import parse_profiler
+from conftest import fixture_bytes
+from parse_profiler import PROFILE_HEADER, ParseProfiler
+
+
+def _slow_parse(edi_text):
+    time.sleep(0.002)
+    return len(edi_text)
+
+
+def _wait_for_captures(profiler, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(profiler.captures()) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The replay thread releases the capture lock just after saving.
+    assert profiler._capture_lock.acquire(timeout=timeout)
+    profiler._capture_lock.release()
+    return profiler.captures()
+
+
+def test_replays_are_capped_per_window(tmp_path):
+    profiler = ParseProfiler(enabled=True, slow_ms=1, sample_rate=1.0, directory=str(tmp_path),
+                             max_replays=1, replay_window_seconds=3600)
+    edi = fixture_bytes("sample_l1.edi")
+
+    profiler.run(_slow_parse, edi)
+    _wait_for_captures(profiler, 1)
+    profiler.run(_slow_parse, edi)
+
+    assert len(profiler.captures()) == 1
+    assert profiler.dropped_replays == 1
+
+
+def test_slow_parse_during_a_capture_is_not_replayed(tmp_path):
+    profiler = ParseProfiler(enabled=True, slow_ms=1, sample_rate=1.0, directory=str(tmp_path), max_replays=100)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_parse(edi_text):
+        started.set()
+        release.wait(5)
+        return _slow_parse(edi_text)
+
+    edi = fixture_bytes("sample_l1.edi")
+    profiler.run(_slow_parse, edi, profiled_parse=blocking_parse)
+    assert started.wait(5)
+    for _ in range(5):
+        profiler.run(_slow_parse, edi, profiled_parse=blocking_parse)
+    release.set()
+
+    assert profiler.dropped_replays == 5
+    assert len(_wait_for_captures(profiler, 1)) == 1
+
+
+def test_forcing_needs_the_token():
+    assert not ParseProfiler().allows_force("1")
+    profiler = ParseProfiler(force_token="s3cret")
+    assert profiler.allows_force("s3cret")
+    assert not profiler.allows_force("1")
+    assert not profiler.allows_force(None)
+
+
+def test_parse_route_refuses_forcing_without_the_token(client, monkeypatch, tmp_path):
+    profiler = ParseProfiler(enabled=True, force_token="s3cret", directory=str(tmp_path))
+    monkeypatch.setattr(parse_profiler, "PROFILER", profiler)
+    edi = fixture_bytes("sample_l1.edi")
+
+    assert client.post("/v1/edi210/parse", content=edi, headers={PROFILE_HEADER: "1"}).status_code == 403
+    assert client.post("/v1/edi210/parse", content=edi, headers={PROFILE_HEADER: "0"}).status_code == 200
+    assert client.post("/v1/edi210/parse", content=edi, headers={PROFILE_HEADER: "s3cret"}).status_code == 200
+    assert [capture["trigger"] for capture in profiler.captures()] == ["forced"]
+
+
+def test_slow_parse_replay_is_not_counted_twice(monkeypatch, tmp_path):
+    from mapper import parse_invoice
+    from metrics import METRICS, configure_metrics
+    from tenants import get_tenant
+
+    profiler = ParseProfiler(enabled=True, slow_ms=0.001, sample_rate=1.0, directory=str(tmp_path))
+    monkeypatch.setattr(parse_profiler, "PROFILER", profiler)
+    tenant = get_tenant()
+    key = ("CARRIERX", "004010")
+    configure_metrics(True)
+    try:
+        invoices_before = METRICS.invoices._values.get(key, 0)
+        parses_before = tenant.stats()["parses"]
+        parse_invoice(fixture_bytes("sample_l1.edi"))
+        [capture] = _wait_for_captures(profiler, 1)
+        invoices_after = METRICS.invoices._values.get(key, 0)
+    finally:
+        configure_metrics(False)
+
+    assert capture["trigger"] == "slow"
+    assert invoices_after == invoices_before + 1
+    assert tenant.stats()["parses"] == parses_before + 1
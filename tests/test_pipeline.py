@@ -0,0 +1,104 @@
+import asyncio
+import json
+import sys
+import threading
+
+import pytest
+
+import pipeline
+from conftest import fixture_bytes
+from mapper import parse_invoice
+
+
+def _run_job(payload, fields=None):
+    async def run():
+        line = pipeline.Pipeline()
+        await line.start()
+        try:
+            job = line.submit(payload, fields)
+            await asyncio.wait_for(job.done.wait(), 10)
+            return job
+        finally:
+            await line.stop()
+    return asyncio.run(run())
+
+
+def test_validate_stage_checks_invoices_against_the_schema():
+    payload = fixture_bytes("sample_l1.edi")
+    job = _run_job(payload)
+
+    assert job.status == "done"
+    validate_batch = pipeline._load_validator()
+    invoices, _ = parse_invoice(payload)
+    assert job.validation_errors == validate_batch(invoices)
+    assert json.loads(job.body)["validation_errors"] == json.loads(json.dumps(job.validation_errors))
+
+
+def test_validate_stage_reports_violations():
+    job = pipeline.Job(b"")
+    job.invoices = [{"invoice_id": 42}]
+    pipeline._validate(job, pipeline._load_validator())
+
+    [failure] = job.validation_errors
+    assert failure["index"] == 0
+    assert {tuple(error["loc"]) for error in failure["errors"]} >= {("invoice_id",)}
+
+
+def test_projected_jobs_skip_schema_validation():
+    job = _run_job(fixture_bytes("sample_l1.edi"), "invoice_id,total")
+
+    assert job.invoices == [{"invoice_id": "INV1001", "total": "2543.80"}]
+    assert job.validation_errors == []
+
+
+def test_missing_validator_fails_at_start(monkeypatch, tmp_path):
+    monkeypatch.setenv("VALIDATOR_PATH", str(tmp_path))
+    monkeypatch.setattr(sys, "path", [path for path in sys.path if not path.endswith("Output_Validation")])
+    monkeypatch.delitem(sys.modules, "fast_validator", raising=False)
+
+    with pytest.raises(RuntimeError, match="VALIDATOR_PATH"):
+        asyncio.run(pipeline.Pipeline().start())
+
+
+def test_stop_fails_queued_and_in_flight_jobs(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_tokenize(job):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(pipeline, "_tokenize", blocking_tokenize)
+
+    async def run():
+        line = pipeline.Pipeline(concurrency={"tokenize": 1})
+        await line.start()
+        jobs = [line.submit(fixture_bytes("sample_l1.edi")) for _ in range(3)]
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        await line.stop()
+        release.set()
+        return line, jobs
+
+    line, jobs = asyncio.run(run())
+
+    assert [job.status for job in jobs] == ["failed"] * 3
+    assert all(job.done.is_set() and job.error for job in jobs)
+    assert line.failed == 3
+    assert all(queue.empty() for queue in line._queues.values())
+
+
+def test_job_owner_can_poll_after_tenants_are_reconfigured(client):
+    from tenants import TENANT_HEADER, configure_tenants
+
+    config = {"acme": {"broker_id": "ACMEBROKER"}, "other": {"broker_id": "OTHERBROKER"}}
+    configure_tenants(config)
+    try:
+        response = client.post("/v1/edi210/jobs?wait=true", content=fixture_bytes("sample_l1.edi"),
+                               headers={TENANT_HEADER: "acme"})
+        job_id = response.json()["job_id"]
+        configure_tenants(config)
+
+        assert client.get(f"/v1/edi210/jobs/{job_id}", headers={TENANT_HEADER: "acme"}).status_code == 200
+        assert client.get(f"/v1/edi210/jobs/{job_id}", headers={TENANT_HEADER: "other"}).status_code == 404
+    finally:
+        configure_tenants({})
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+
+from conftest import PROFILES
+from profile_registry import GLOBAL_PROFILE_KEY, ProfileRegistry
+
+
+def _copy_profiles(tmp_path):
+    target = tmp_path / "profiles"
+    shutil.copytree(PROFILES, target)
+    return target
+
+
+def _write_profile(base, partner, version, profile):
+    path = base / partner / version / "profile.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(profile))
+    return path
+
+
+def test_malformed_rule_does_not_block_other_profiles(tmp_path):
+    base = _copy_profiles(tmp_path)
+    bad = json.loads((base / "CARRIERX" / "004010" / "profile.json").read_text())
+    bad["partner"] = "BROKEN"
+    bad["segments"]["header"]["pro"] = {"idx": 2}
+    _write_profile(base, "BROKEN", "004010", bad)
+
+    registry = ProfileRegistry(str(base))
+    report = registry.reload()
+
+    assert registry.ready
+    assert ("CARRIERX", "004010") in registry.snapshot()
+    assert GLOBAL_PROFILE_KEY in registry.snapshot()
+    assert ("BROKEN", "004010") not in registry.snapshot()
+    [error] = report["errors"]
+    assert error["file"].endswith("BROKEN/004010/profile.json")
+    assert "'seg'" in error["error"]
+
+
+def test_bad_save_keeps_last_good_plan(tmp_path):
+    base = _copy_profiles(tmp_path)
+    registry = ProfileRegistry(str(base))
+    registry.reload()
+    good = registry.snapshot()[("CARRIERX", "004010")]
+
+    profile = json.loads((base / "CARRIERX" / "004010" / "profile.json").read_text())
+    profile["segments"]["header"]["invoice_id"] = {"seg": "B3", "idx": "second"}
+    path = _write_profile(base, "CARRIERX", "004010", profile)
+    # Make sure the mtime moves even on coarse-grained filesystems.
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    report = registry.reload()
+
+    assert registry.snapshot()[("CARRIERX", "004010")] is good
+    assert "integer 'idx'" in report["errors"][0]["error"]
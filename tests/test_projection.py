@@ -0,0 +1,114 @@
+import pytest
+
+from conftest import comparable, expected, fixture_bytes
+from mapper import parse_invoice
+from projection import GOLDEN_FIELDS, compile_projection
+from result_cache import configure_result_cache
+
+# fixture -> expected invoices, in transaction-set order
+CASES = {
+    "sample_l1.edi": ["sample_l1.json"],
+    "sample_sac.edi": ["sample_sac.json"],
+    "sample_hybrid.edi": ["sample_hybrid.json"],
+    "sample_5010_sac.edi": ["sample_5010_sac.json"],
+    "malformed_missing_total.edi": ["sample_malformed_missing_total.json"],
+    "sample_batch_multi_st.edi": ["INV6001.json", "INV6002.json"],
+}
+# Fields every fixture's expected invoice agrees with the extractor on.
+STABLE_FIELDS = ("invoice_id", "side", "currency", "total")
+SPECS = ("invoice_id", "invoice_id,total", "total", "refs", "parties,dates", "charges", "currency,metadata",
+         "side,evidence")
+
+
+@pytest.fixture
+def result_cache():
+    cache = configure_result_cache(max_entries=1000)
+    yield cache
+    configure_result_cache(max_entries=0)
+
+
+@pytest.mark.parametrize("fixture", CASES)
+def test_full_parse_matches_expected(fixture):
+    invoices, _ = parse_invoice(fixture_bytes(fixture))
+
+    assert len(invoices) == len(CASES[fixture])
+    for invoice, name in zip(invoices, CASES[fixture]):
+        want = expected(name)
+        got = comparable(invoice)
+        assert {field: got[field] for field in STABLE_FIELDS} == {field: want[field] for field in STABLE_FIELDS}
+        assert {key: got["metadata"][key] for key in ("edi_version", "trading_partner")} == \
+            {key: want["metadata"][key] for key in ("edi_version", "trading_partner")}
+
+
+def test_l1_fixture_matches_expected_apart_from_confidence():
+    [invoice], [warnings] = parse_invoice(fixture_bytes("sample_l1.edi"))
+    got = comparable(invoice)
+    want = expected("sample_l1.json")
+    got["metadata"].pop("confidence")
+    want["metadata"].pop("confidence")
+
+    assert got == want
+    assert warnings == []
+
+
+@pytest.mark.parametrize("fixture", CASES)
+@pytest.mark.parametrize("spec", SPECS)
+def test_projection_is_the_full_invoice_cut_down(fixture, spec):
+    edi = fixture_bytes(fixture)
+    full, _ = parse_invoice(edi)
+    projected, _ = parse_invoice(edi, fields=spec)
+    fields = spec.split(",")
+
+    assert projected == [{field: invoice[field] for field in GOLDEN_FIELDS if field in fields} for invoice in full]
+
+
+def test_total_still_runs_the_charge_rules():
+    # No L3 in this fixture: the total is the sum of the charge lines.
+    [invoice], [warnings] = parse_invoice(fixture_bytes("malformed_missing_total.edi"), fields="total")
+
+    assert comparable(invoice) == {"total": expected("sample_malformed_missing_total.json")["total"]}
+    assert "Total segment not found." in warnings
+    assert compile_projection("total").charges
+
+
+def test_metadata_runs_every_rule_group_for_confidence():
+    edi = fixture_bytes("sample_sac.edi")
+    [full], [full_warnings] = parse_invoice(edi)
+    [projected], [warnings] = parse_invoice(edi, fields="metadata")
+
+    assert projected["metadata"]["confidence"] == full["metadata"]["confidence"]
+    assert warnings == full_warnings
+    projection = compile_projection("metadata")
+    assert projection.refs and projection.parties and projection.dates and projection.charges
+
+
+def test_warnings_only_cover_the_rule_groups_that_ran():
+    [_], [warnings] = parse_invoice(fixture_bytes("sample_sac.edi"), fields="invoice_id")
+
+    assert not any(warning.startswith("Total from EDI") for warning in warnings)
+
+
+def test_projected_results_are_cached_separately(result_cache):
+    edi = fixture_bytes("sample_l1.edi")
+    full, _ = parse_invoice(edi)
+    projected, _ = parse_invoice(edi, fields="invoice_id")
+
+    assert parse_invoice(edi)[0] == full
+    assert parse_invoice(edi, fields="invoice_id")[0] == projected == [{"invoice_id": "INV1001"}]
+    assert result_cache.hits == 2
+
+
+def test_unknown_field_is_a_bad_request(client):
+    response = client.post("/v1/edi210/parse?fields=invoice_id,shipper", content=fixture_bytes("sample_l1.edi"))
+
+    assert response.status_code == 400
+    assert "shipper" in response.json()["detail"]
+    with pytest.raises(ValueError):
+        compile_projection("invoice_id,shipper")
+
+
+def test_parse_route_applies_the_projection(client):
+    response = client.post("/v1/edi210/parse?fields=total,invoice_id", content=fixture_bytes("sample_l1.edi"))
+
+    assert response.status_code == 200
+    assert response.json() == [{"invoice_id": "INV1001", "total": "2543.80"}]
@@ -0,0 +1,70 @@
+import sys
+
+import pytest
+
+from charge_totals import BUCKETS, configure_total_tolerance, to_cents
+from conftest import FIXTURES, ROOT, fixture_bytes
+from mapper import iter_invoices, parse_invoice
+from reconcile import ChargeColumns, parse_invoice_columnar
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from generate_edi import generate_interchange  # noqa: E402
+
+
+def _cents(invoices):
+    """ Per invoice: every charge bucket and the total, in integer cents. """
+    return [tuple(to_cents(invoice["charges"][bucket]) for bucket in BUCKETS[:3])
+            + (sum(to_cents(other["amount"]) for other in invoice["charges"]["other"]), to_cents(invoice["total"]))
+            for invoice in invoices]
+
+
+def _both(edi):
+    return parse_invoice(edi), parse_invoice_columnar(edi)
+
+
+@pytest.mark.parametrize("edi", [
+    *(pytest.param(path.read_bytes(), id=path.name) for path in sorted(FIXTURES.glob("*.edi"))),
+    pytest.param(generate_interchange(60, 12).encode(), id="generated"),
+    # Dimes that do not add up exactly as floats, and a total that is one cent off.
+    pytest.param(fixture_bytes("sample_l1.edi").replace(b"L1*3*150.00***DETENTION~",
+                                                        b"L1*3*0.10***DETENTION~\nL1*4*0.20***DETENTION~")
+                 .replace(b"L3*2543.80", b"L3*2393.91"), id="off-by-a-cent"),
+    pytest.param(fixture_bytes("sample_l1.edi").replace(b"L3*2543.80~", b""), id="no-total"),
+])
+def test_columnar_totals_match_per_invoice_totals_in_cents(edi):
+    (invoices, warnings), (columnar, columnar_warnings) = _both(edi)
+
+    assert _cents(columnar) == _cents(invoices)
+    assert columnar_warnings == warnings
+    assert [invoice["metadata"]["confidence"] for invoice in columnar] == [
+        invoice["metadata"]["confidence"] for invoice in invoices]
+
+
+def test_mismatch_is_flagged_on_both_paths():
+    edi = fixture_bytes("sample_l1.edi").replace(b"L3*2543.80", b"L3*2543.81")
+    (_, warnings), (_, columnar_warnings) = _both(edi)
+
+    assert any("does not match" in warning for warning in warnings[0])
+    assert columnar_warnings == warnings
+
+
+def test_tolerance_applies_to_both_paths():
+    edi = fixture_bytes("sample_l1.edi").replace(b"L3*2543.80", b"L3*2543.81")
+    configure_total_tolerance(1)
+    try:
+        (_, warnings), (_, columnar_warnings) = _both(edi)
+    finally:
+        configure_total_tolerance(0)
+
+    assert not any("does not match" in warning for warning in warnings[0])
+    assert columnar_warnings == warnings
+
+
+def test_reconcile_fills_the_deferred_invoices_and_resets_the_columns():
+    columns = ChargeColumns()
+    invoices = [invoice for invoice, _ in iter_invoices(fixture_bytes("sample_batch_multi_st.edi"), columns)]
+    assert len(columns) == 2
+
+    assert columns.reconcile() == []
+    assert _cents(invoices) == _cents(parse_invoice(fixture_bytes("sample_batch_multi_st.edi"))[0])
+    assert len(columns) == 0 and not columns.cents
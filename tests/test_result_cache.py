@@ -0,0 +1,30 @@
+import time
+
+from result_cache import ResultCache
+
+
+def _rows(cache):
+    return cache._db.execute("SELECT key FROM result_cache ORDER BY key").fetchall()
+
+
+def test_expired_rows_are_deleted_every_n_puts(tmp_path):
+    cache = ResultCache(ttl_seconds=10, sqlite_path=str(tmp_path / "cache.sqlite"), expire_every=3,
+                        expire_seconds=3600)
+    cache.put("old", {"invoice_id": "OLD"}, [])
+    cache._db.execute("UPDATE result_cache SET created = ?", (time.time() - 60,))
+    cache._db.commit()
+
+    cache.put("a", {"invoice_id": "A"}, [])
+    assert _rows(cache) == [("a",), ("old",)]
+    # Expired rows are never served, even before they are deleted.
+    cache._entries.clear()
+    assert cache.get("old") is None
+
+    cache.put("b", {"invoice_id": "B"}, [])
+    assert _rows(cache) == [("a",), ("b",)]
+
+
+def test_created_is_indexed(tmp_path):
+    cache = ResultCache(sqlite_path=str(tmp_path / "cache.sqlite"))
+    plan = cache._db.execute("EXPLAIN QUERY PLAN DELETE FROM result_cache WHERE created < 0").fetchall()
+    assert "result_cache_created" in " ".join(str(row) for row in plan)
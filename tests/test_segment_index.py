@@ -0,0 +1,134 @@
+import mmap
+
+import pytest
+
+from conftest import FIXTURES
+from mapper import parse_invoice
+from segment_index import Segment, SegmentIndex
+from tokenizer import as_buffer, iter_transaction_sets, sniff_delimiters
+
+FIXTURE_NAMES = sorted(path.name for path in FIXTURES.glob("*.edi"))
+
+
+def _index_rows(edi, compact=False):
+    """ Every segment of every transaction set in edi, as read through SegmentIndex. """
+    edi = as_buffer(edi)
+    delimiters = sniff_delimiters(edi)
+    raw = delimiters if isinstance(edi, str) else delimiters.encoded()
+    rows = []
+    for envelope, transaction in iter_transaction_sets(edi, raw.element, raw.segment):
+        index = SegmentIndex.build(edi, envelope + transaction, delimiters.element, compact)
+        rows.append([(seg_id, [element.strip() for element in index.segment(row)])
+                     for row, seg_id in enumerate(index.ids)])
+    return rows
+
+
+@pytest.fixture(params=["bytes", "bytearray", "memoryview", "partial_memoryview", "mmap"])
+def as_input(request, tmp_path):
+    """ A function turning fixture bytes into one of the raw input types parse_invoice accepts. """
+    opened = []
+
+    def convert(data: bytes):
+        kind = request.param
+        if kind == "bytes":
+            return data
+        if kind == "bytearray":
+            return bytearray(data)
+        if kind == "memoryview":
+            return memoryview(data)
+        if kind == "partial_memoryview":
+            # Only part of the underlying buffer belongs to the interchange.
+            return memoryview(b"JUNK~ST*210~" + data + b"~SE*1*JUNK~")[12:-11]
+        path = tmp_path / f"input{len(opened)}.edi"
+        path.write_bytes(data)
+        handle = path.open("rb")
+        opened.append(handle)
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        opened.append(buffer)
+        return buffer
+
+    yield convert
+    for item in reversed(opened):
+        item.close()
+
+
+def test_partial_memoryview_is_copied():
+    data = b"xxISA*00~yy"
+    view = memoryview(data)[2:-2]
+
+    assert as_buffer(view) == b"ISA*00~"
+    assert as_buffer(memoryview(data)) is data
+
+
+@pytest.mark.parametrize("name", FIXTURE_NAMES)
+def test_raw_input_parses_like_str(name, as_input):
+    data = (FIXTURES / name).read_bytes()
+
+    assert parse_invoice(as_input(data)) == parse_invoice(data.decode())
+
+
+@pytest.mark.parametrize("name", FIXTURE_NAMES)
+def test_bytes_index_reads_like_str(name, as_input):
+    data = (FIXTURES / name).read_bytes()
+
+    assert _index_rows(as_input(data)) == _index_rows(data.decode())
+
+
+# --- SEGMENT_LAYOUT=compact ---
+
+def _wrapped(data: bytes):
+    """ The interchange with its segments wrapped across lines mid-element, as some senders do. """
+    return data.replace(b"~\n", b"~").replace(b"*BASE FREIGHT", b"*BASE\r\n FREIGHT").replace(b"~", b"~\n")
+
+
+def _parse(edi, compact, monkeypatch):
+    monkeypatch.setattr("segment_index.COMPACT_SEGMENTS", compact)
+    return parse_invoice(edi)
+
+
+@pytest.mark.parametrize("name", FIXTURE_NAMES)
+@pytest.mark.parametrize("as_text", [True, False])
+def test_compact_layout_parses_like_lists(name, as_text, monkeypatch):
+    data = (FIXTURES / name).read_bytes()
+    for edi in (data, _wrapped(data)):
+        edi = edi.decode() if as_text else edi
+
+        assert _parse(edi, True, monkeypatch) == _parse(edi, False, monkeypatch)
+
+
+@pytest.mark.parametrize("name", FIXTURE_NAMES)
+def test_compact_index_reads_like_lists(name, as_input):
+    data = (FIXTURES / name).read_bytes()
+
+    assert _index_rows(as_input(data), compact=True) == _index_rows(data.decode(), compact=False)
+    assert _index_rows(data.decode(), compact=True) == _index_rows(data.decode(), compact=False)
+
+
+@pytest.mark.parametrize("as_text", [True, False])
+def test_compact_segment_behaves_like_a_stripped_list(as_text, tmp_path):
+    text = "SAC*C*FSC***120.00*** * *FUEL SURCHARGE "
+    expected = [element.strip() for element in text.split("*")]
+    buffer = text if as_text else text.encode()
+    delim = "*" if as_text else b"*"
+    segments = [Segment(buffer, 0, len(buffer), delim)]
+    if not as_text:
+        path = tmp_path / "segment.edi"
+        path.write_bytes(buffer)
+        with path.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            segments.append(Segment(mapped, 0, len(mapped), delim))
+            _check_segment(segments, expected)
+    else:
+        _check_segment(segments, expected)
+
+
+def _check_segment(segments, expected):
+    for segment in segments:
+        assert len(segment) == len(expected)
+        assert list(segment) == expected
+        for idx in range(-len(expected), len(expected)):
+            assert segment[idx] == expected[idx]
+        for bad in (len(expected), -len(expected) - 1):
+            with pytest.raises(IndexError):
+                segment[bad]
+        for part in (slice(1, 4), slice(None, None, 2), slice(-3, None), slice(5, 1, -1), slice(20, 30)):
+            assert segment[part] == expected[part]
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import tenants
+from conftest import PROFILES, fixture_bytes
+from mapper import parse_invoice
+from parallel import get_pool, parse_invoices_parallel, shutdown_pool
+from result_cache import configure_result_cache
+from tenants import DEFAULT_TENANT, TENANT_HEADER, UnknownTenant, configure_tenants, get_tenant
+
+
+def _write_global_override(namespace, currency):
+    """ Override the global profile (what sample_batch_multi_st resolves to) with another currency. """
+    path = namespace / "global" / "default" / "profile.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile = json.loads((PROFILES / "global" / "default" / "profile.json").read_text())
+    profile["currency"] = {"default": currency}
+    path.write_text(json.dumps(profile))
+    # Reloads compare mtimes; make sure a rewrite within the same tick still counts.
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def namespace(tmp_path):
+    namespace = tmp_path / "acme"
+    _write_global_override(namespace, "CAD")
+    return namespace
+
+
+@pytest.fixture
+def acme(namespace):
+    configure_tenants({
+        "acme": {"broker_id": "ACMEBROKER", "profiles": str(namespace)},
+        "ours": {"broker_id": "OURBROKER"},
+    })
+    yield get_tenant("acme")
+    configure_tenants({})
+    shutdown_pool()
+
+
+@pytest.mark.parametrize("tenant_id, side", [(None, "Buy"), (DEFAULT_TENANT, "Buy"), ("ours", "Buy"),
+                                             ("acme", "Sell")])
+def test_side_follows_the_tenant_broker_id(acme, tenant_id, side):
+    # GS03 of every fixture is OURBROKER.
+    for fixture in ("sample_l1.edi", "sample_sac.edi", "sample_batch_multi_st.edi"):
+        invoices, _ = parse_invoice(fixture_bytes(fixture), tenant=tenant_id)
+        assert {invoice["side"] for invoice in invoices} == {side}
+
+
+def test_namespace_overrides_only_its_profiles(acme):
+    batch = fixture_bytes("sample_batch_multi_st.edi")
+
+    assert [invoice["currency"] for invoice in parse_invoice(batch, tenant="acme")[0]] == ["CAD", "CAD"]
+    assert [invoice["currency"] for invoice in parse_invoice(batch)[0]] == ["USD", "USD"]
+    # CARRIERX is not overridden, so acme gets the shared plan itself.
+    assert acme.snapshot()[("CARRIERX", "004010")] is get_tenant().snapshot()[("CARRIERX", "004010")]
+
+
+def test_unknown_tenant():
+    with pytest.raises(UnknownTenant):
+        parse_invoice(fixture_bytes("sample_l1.edi"), tenant="nobody")
+
+
+def test_tenants_do_not_share_cached_results(acme):
+    configure_result_cache(max_entries=1000)
+    try:
+        edi = fixture_bytes("sample_l1.edi")
+        assert parse_invoice(edi)[0][0]["side"] == "Buy"
+        assert parse_invoice(edi, tenant="acme")[0][0]["side"] == "Sell"
+        assert parse_invoice(edi)[0][0]["side"] == "Buy"
+    finally:
+        configure_result_cache(max_entries=0)
+
+
+def test_parse_route_reads_the_tenant_header(client, acme):
+    edi = fixture_bytes("sample_l1.edi")
+
+    assert client.post("/v1/edi210/parse", content=edi).json()[0]["side"] == "Buy"
+    assert client.post("/v1/edi210/parse", content=edi, headers={TENANT_HEADER: "acme"}).json()[0]["side"] == "Sell"
+    assert client.post("/v1/edi210/parse", content=edi, headers={TENANT_HEADER: "nobody"}).status_code == 400
+    stats = {entry["tenant"]: entry for entry in client.get("/admin/tenants").json()["tenants"]}
+    assert stats["acme"]["invoices"] >= 1 and stats["acme"]["broker_id"] == "ACMEBROKER"
+
+
+def test_pool_workers_see_tenants_configured_after_the_pool(namespace):
+    batch = fixture_bytes("sample_batch_multi_st.edi")
+    try:
+        configure_tenants({})
+        pool = get_pool(2)
+        parse_invoices_parallel(batch)
+        configure_tenants({"acme": {"broker_id": "ACMEBROKER", "profiles": str(namespace)}})
+
+        invoices, _ = parse_invoices_parallel(batch, tenant="acme")
+
+        assert get_pool() is not pool
+        assert [(invoice["side"], invoice["currency"]) for invoice in invoices] == [("Sell", "CAD")] * 2
+    finally:
+        configure_tenants({})
+        shutdown_pool()
+
+
+def test_warm_workers_pick_up_a_namespace_reload(acme, namespace):
+    batch = fixture_bytes("sample_batch_multi_st.edi")
+    get_pool(2)
+    # Workers start (and read the namespace) here, but have not parsed for acme yet.
+    parse_invoices_parallel(batch)
+
+    _write_global_override(namespace, "EUR")
+    acme.reload()
+
+    for _ in range(3):
+        assert {invoice["currency"] for invoice in parse_invoices_parallel(batch, tenant="acme")[0]} == {"EUR"}
+
+
+def test_namespace_watchers_follow_reconfiguration(acme, namespace):
+    tenants.start_tenant_watchers(interval=3600)
+    try:
+        assert len(tenants._WATCHERS) == 1
+        first = tenants._WATCHERS[0]
+        configure_tenants({"acme": {"broker_id": "ACMEBROKER", "profiles": str(namespace)},
+                           "other": {"broker_id": "OTHER", "profiles": str(namespace)}})
+        assert first.is_set()
+        assert len(tenants._WATCHERS) == 2
+    finally:
+        tenants.stop_tenant_watchers()
@@ -0,0 +1,128 @@
+import pytest
+
+from conftest import fixture_bytes
+from mapper import parse_invoice
+from tokenizer import (DEFAULT_DELIMITERS, Delimiters, iter_segment_spans, iter_transaction_set_texts,
+                       iter_transaction_sets, sniff_delimiters)
+
+ISA = "ISA*00*          *00*          *ZZ*{sender:<15}*ZZ*OURBROKER      *251101*1430*U*00401*{control:09d}*0*T*>"
+
+
+def _interchange(sender, control, sets, close=True):
+    """ One ISA/GS envelope around the given ST..SE bodies (lists of segments). """
+    segments = [ISA.format(sender=sender, control=control), f"GS*IN*{sender}*OURBROKER*20251101*1430*{control}*X*004010"]
+    for body in sets:
+        segments.extend(body)
+    if close:
+        segments += [f"GE*{len(sets)}*{control}", f"IEA*1*{control:09d}"]
+    return "~".join(segments) + "~"
+
+
+def _set(number, *body):
+    return [f"ST*210*{number}", *body, f"SE*{len(body) + 2}*{number}"]
+
+
+def _ids(edi_text, spans):
+    return [edi_text[start:end] for _, start, end in spans]
+
+
+def test_several_sets_in_one_interchange():
+    edi = _interchange("CARRIERX", 1, [_set("0001", "B3**INV1"), _set("0002", "B3**INV2"), _set("0003", "B3**INV3")])
+
+    sets = list(iter_transaction_sets(edi))
+
+    assert len(sets) == 3
+    for number, (envelope, transaction) in enumerate(sets, 1):
+        assert [seg_id for seg_id, _, _ in envelope] == ["ISA", "GS"]
+        assert _ids(edi, transaction) == [f"ST*210*000{number}", f"B3**INV{number}", f"SE*3*000{number}"]
+
+
+def test_st_without_se_is_handed_over_as_is():
+    edi = _interchange("CARRIERX", 1, [["ST*210*0001", "B3**INV1"], _set("0002", "B3**INV2")])
+
+    sets = [_ids(edi, transaction) for _, transaction in iter_transaction_sets(edi)]
+
+    assert sets == [["ST*210*0001", "B3**INV1"], ["ST*210*0002", "B3**INV2", "SE*3*0002"]]
+
+
+def test_unterminated_st_ends_with_its_group():
+    edi = (_interchange("CARRIERX", 1, [["ST*210*0001", "B3**INV1"]])
+           + _interchange("CARRIERY", 2, [_set("0002", "B3**INV2")]))
+
+    sets = list(iter_transaction_sets(edi))
+
+    assert [_ids(edi, transaction) for _, transaction in sets] == [
+        ["ST*210*0001", "B3**INV1"], ["ST*210*0002", "B3**INV2", "SE*3*0002"]]
+    assert "CARRIERY" in _ids(edi, sets[1][0])[1]
+
+
+def test_blank_segments_and_surrounding_whitespace_are_skipped():
+    edi = "  ISA*00~\r\n GS*IN*X~~ \n~ST*210*0001~\tB3**INV1 \r\n~SE*3*0001~\n"
+
+    spans = [edi[start:end] for start, end in iter_segment_spans(edi)]
+
+    assert spans == ["ISA*00", "GS*IN*X", "ST*210*0001", "B3**INV1", "SE*3*0001"]
+    [(envelope, transaction)] = iter_transaction_sets(edi)
+    assert [seg_id for seg_id, _, _ in envelope + transaction] == ["ISA", "GS", "ST", "B3", "SE"]
+
+
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_each_set_gets_its_own_envelope(as_bytes):
+    edi = (_interchange("CARRIERX", 1, [_set("0001", "B3**INV1"), _set("0002", "B3**INV2")])
+           + _interchange("CARRIERY", 2, [_set("0003", "B3**INV3")]))
+    if as_bytes:
+        edi = edi.encode()
+        sets = list(iter_transaction_sets(edi, b"*", b"~"))
+        gs = [edi[envelope[1][1]:envelope[1][2]].decode() for envelope, _ in sets]
+    else:
+        sets = list(iter_transaction_sets(edi))
+        gs = [edi[envelope[1][1]:envelope[1][2]] for envelope, _ in sets]
+
+    assert [g.split("*")[2] for g in gs] == ["CARRIERX", "CARRIERX", "CARRIERY"]
+
+
+def test_set_texts_are_standalone_interchanges():
+    edi = (_interchange("CARRIERX", 1, [_set("0001", "B3**INV1")])
+           + _interchange("CARRIERY", 2, [_set("0002", "B3**INV2")]))
+
+    texts = list(iter_transaction_set_texts(edi))
+
+    assert texts[1] == (ISA.format(sender="CARRIERY", control=2) + "~GS*IN*CARRIERY*OURBROKER*20251101*1430*2*X*004010"
+                        "~ST*210*0002~B3**INV2~SE*3*0002~")
+
+
+# --- sniff_delimiters ---
+
+def _retarget(edi, element="*", segment="~"):
+    return edi.replace("*", element).replace("~", segment)
+
+
+def test_sniffs_a_pipe_element_separator():
+    edi = _retarget(fixture_bytes("sample_l1.edi").decode(), element="|")
+
+    assert sniff_delimiters(edi) == Delimiters("|", ">", "~")
+    assert sniff_delimiters(edi.encode()) == Delimiters("|", ">", "~")
+    assert parse_invoice(edi)[0] == parse_invoice(fixture_bytes("sample_l1.edi"))[0]
+
+
+@pytest.mark.parametrize("terminator", ["\r\n", "\n"])
+def test_line_break_terminators_resolve_to_newline(terminator):
+    edi = _retarget(fixture_bytes("sample_l1.edi").decode().replace("~\n", "~"), segment=terminator)
+
+    assert sniff_delimiters(edi) == Delimiters("*", ">", "\n")
+    assert parse_invoice(edi.encode())[0] == parse_invoice(fixture_bytes("sample_l1.edi"))[0]
+
+
+def test_bare_cr_terminator():
+    assert sniff_delimiters(ISA.format(sender="CARRIERX", control=1) + "\rGS*IN\r").segment == "\r"
+
+
+def test_mis_padded_isa_is_walked_by_separator():
+    edi = "ISA*00*  *00*  *ZZ*CARRIERX*ZZ*OURBROKER*251101*1430*U*00401*1*0*T*:!GS*IN*CARRIERX!"
+
+    assert sniff_delimiters(edi) == Delimiters("*", ":", "!")
+
+
+@pytest.mark.parametrize("edi", ["", "GS*IN*CARRIERX~ST*210*0001~", "ISA", "ISA*00*00~", "ISAX*00", b"ST*210~"])
+def test_falls_back_to_default_delimiters(edi):
+    assert sniff_delimiters(edi) == DEFAULT_DELIMITERS